@@ -0,0 +1,172 @@
+# ANSWER
+# natural-language answers from KG query results, via a token-bounded digest
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .config import KG_ANSWER_TOKEN_BUDGET
+from .constants import ANSWER_INSTRUCTION
+from .digest import _fork_conversation
+from .results import records_to_table
+from .serialize import _estimate_tokens, compact_records
+
+# number of most frequent values listed per column
+TOP_VALUES = 5
+
+# maximum length of a listed value
+VALUE_LENGTH = 40
+
+
+def _short(value):
+    text = str(value)
+    if len(text) > VALUE_LENGTH:
+        return text[: VALUE_LENGTH - 3] + "..."
+    return text
+
+
+def _is_numeric(data_type):
+    return (
+        pa.types.is_integer(data_type)
+        or pa.types.is_floating(data_type)
+        or pa.types.is_decimal(data_type)
+    )
+
+
+def _column_profile(name, column):
+    """
+    Describe the values of a column with vectorised aggregations: the number
+    of values, and the range and mean of numeric columns or the number of
+    distinct values and the most frequent ones of the other columns.
+    """
+    values = pc.drop_null(column)
+    parts = [f"{len(values)} values"]
+    if column.null_count:
+        parts.append(f"{column.null_count} null")
+    if not len(values):
+        return f"{name}: " + ", ".join(parts)
+
+    if _is_numeric(column.type):
+        min_max = pc.min_max(values)
+        parts.append(
+            f"min {min_max['min'].as_py()}, max {min_max['max'].as_py()}, "
+            f"mean {pc.mean(values).as_py():.4g}"
+        )
+    elif pa.types.is_boolean(column.type):
+        parts.append(f"{pc.sum(values).as_py()} true")
+    else:
+        try:
+            counts = pc.value_counts(values)
+        except (pa.ArrowNotImplementedError, pa.ArrowInvalid):
+            # nested values (lists, maps) are not counted
+            return f"{name}: " + ", ".join(parts)
+        parts.append(f"{len(counts)} distinct")
+        if len(counts) < len(values):
+            order = pc.array_sort_indices(
+                counts.field("counts"), order="descending"
+            )
+            top = counts.take(order[:TOP_VALUES])
+            parts.append(
+                "most frequent: "
+                + ", ".join(
+                    f"{_short(item['values'])} ({item['counts']})"
+                    for item in top.to_pylist()
+                )
+            )
+
+    return f"{name}: " + ", ".join(parts)
+
+
+def _spread(n, k):
+    """
+    Pick `k` of `n` row indices spread evenly over the result, including the
+    first row.
+    """
+    return [i * n // k for i in range(k)]
+
+
+def _sample_rows(table, token_budget):
+    """
+    Sample as many rows, spread evenly over the result, as fit in the token
+    budget in their compact serialisation.
+
+    Returns:
+        Tuple of the compact serialisation of the sample and the number of
+        sampled rows.
+    """
+
+    def serialise(k):
+        rows = table.take(_spread(table.num_rows, k)).to_pylist()
+        return compact_records(rows)
+
+    low, high = 0, table.num_rows
+    while low < high:
+        k = (low + high + 1) // 2
+        if _estimate_tokens(serialise(k)) <= token_budget:
+            low = k
+        else:
+            high = k - 1
+
+    return (serialise(low) if low else ""), low
+
+
+def result_digest(records, capped=False, token_budget=None):
+    """
+    Summarise a query result for the LLM within a token budget: the number of
+    rows, statistics of each column, and a sample of the rows filling the
+    rest of the budget (all rows, if they fit).
+
+    Args:
+        records: The records of the result (Neo4j records or dictionaries).
+
+        capped: Whether the records are only the first rows of a larger
+            result.
+
+        token_budget: The approximate number of tokens of the digest
+            (`KG_ANSWER_TOKEN_BUDGET` by default).
+
+    Returns:
+        Tuple of the digest and a dictionary with the number of "rows"
+        analysed and the number of "sampled" rows.
+    """
+    token_budget = token_budget or KG_ANSWER_TOKEN_BUDGET
+    table = records_to_table(records)
+
+    header = f"The query returned {table.num_rows} rows"
+    if capped:
+        header = (
+            f"The query returned more than {table.num_rows} rows; only the "
+            f"first {table.num_rows} were analysed"
+        )
+    profile = "\n".join(
+        _column_profile(name, table.column(name))
+        for name in table.column_names
+    )
+    text = f"{header}.\n\nColumns:\n{profile}"
+
+    sample, sampled = _sample_rows(
+        table, token_budget - _estimate_tokens(text) - 20
+    )
+    if sampled == table.num_rows:
+        text += f"\n\nAll {'analysed ' if capped else ''}rows:\n{sample}"
+    elif sampled:
+        text += (
+            f"\n\nSample of {sampled} rows, spread over the result:\n"
+            f"{sample}"
+        )
+
+    return text, {"rows": table.num_rows, "sampled": sampled}
+
+
+def synthesise_answer(conversation, question, query, digest):
+    """
+    Answer a question from the digest of the result of the query that was
+    generated for it, using a copy of the session conversation.
+
+    Returns:
+        The answer.
+    """
+    conv = _fork_conversation(conversation)
+    conv.append_system_message(ANSWER_INSTRUCTION)
+    msg, _, _ = conv.query(
+        f"Question: {question}\n\nQuery:\n{query}\n\nResult:\n{digest}"
+    )
+    return msg
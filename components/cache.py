@@ -0,0 +1,57 @@
+# CACHE
+# thread-safe, size-bounded in-memory caches shared by all sessions
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Least-recently-used cache whose entries expire after `ttl` seconds. Keys
+    are tuples; `namespace` and `version` allow invalidating all entries of a
+    namespace at once (e.g., of one database when its schema changes).
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _invalidate(self, namespace, version):
+        """
+        Drop the entries of a namespace if its version changed.
+        """
+        if self._versions.get(namespace, version) != version:
+            for key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[key]
+        self._versions[namespace] = version
+
+    def get(self, namespace, version, key, default=None):
+        """
+        Get the value of a key of a namespace, if present and not expired.
+        """
+        with self._lock:
+            self._invalidate(namespace, version)
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return default
+            stored, value = entry
+            if time.monotonic() - stored > self.ttl:
+                del self._entries[(namespace, key)]
+                return default
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def put(self, namespace, version, key, value):
+        """
+        Store the value of a key of a namespace, evicting the least recently
+        used entries beyond the maximum size.
+        """
+        with self._lock:
+            self._invalidate(namespace, version)
+            self._entries[(namespace, key)] = (time.monotonic(), value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,261 @@
+# COHORT
+# sparse gene x sample alteration matrix of the whole cohort, exported once
+# from the graph and persisted as memory-mapped arrays
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from .config import KG_CACHE_DIR, KG_EXPORT_TIMEOUT
+from .constants import COHORT_CNA_QUERY, COHORT_VARIANT_QUERY
+from .jobs import discard_job, run_query_job
+from .kg import _stream_neo4j_query
+
+ss = st.session_state
+
+# alteration flags of a gene in a sample, combined bitwise
+VARIANT = 1
+GAIN = 2
+LOSS = 4
+LOH = 8
+
+ALTERATIONS = {
+    VARIANT: "variant",
+    GAIN: "gain",
+    LOSS: "loss",
+    LOH: "LOH",
+}
+
+COHORT_DIR = os.path.join(KG_CACHE_DIR, "cohort")
+
+
+class CohortMatrix:
+    """
+    Gene x sample matrix of alteration flags in compressed sparse row form:
+    the samples altered in the gene at row `i` (sorted genes) are
+    `indices[indptr[i]:indptr[i + 1]]` (positions in the sorted samples),
+    with their flags in `values`. Only altered gene-sample pairs are stored.
+    """
+
+    def __init__(self, genes, samples, indptr, indices, values):
+        self.genes = genes
+        self.samples = samples
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self._gene_rows = {gene: i for i, gene in enumerate(genes)}
+        self._sample_columns = {sample: i for i, sample in enumerate(samples)}
+
+    @classmethod
+    def from_pairs(cls, genes, samples, gene_ids, sample_ids, flags):
+        """
+        Build the matrix from (gene, sample, flag) triples, given as arrays of
+        positions in `genes` and `samples`; flags of the same pair are
+        combined.
+        """
+        gene_order = np.argsort(genes)
+        sample_order = np.argsort(samples)
+        # positions in the sorted genes and samples
+        gene_rank = np.empty(len(genes), dtype=np.int64)
+        gene_rank[gene_order] = np.arange(len(genes))
+        sample_rank = np.empty(len(samples), dtype=np.int32)
+        sample_rank[sample_order] = np.arange(len(samples))
+
+        keys = gene_rank[gene_ids] * len(samples) + sample_rank[sample_ids]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        values = np.zeros(len(keys), dtype=np.int8)
+        np.bitwise_or.at(values, inverse, flags.astype(np.int8))
+
+        rows = keys // max(len(samples), 1)
+        indptr = np.zeros(len(genes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(genes)), out=indptr[1:])
+        return cls(
+            [genes[i] for i in gene_order],
+            [samples[i] for i in sample_order],
+            indptr,
+            (keys % max(len(samples), 1)).astype(np.int32),
+            values,
+        )
+
+    def save(self, path):
+        """
+        Write the matrix to the directory `path`, replacing it atomically.
+        """
+        tmp = f"{path}.{uuid.uuid4().hex}"
+        os.makedirs(tmp)
+        with open(os.path.join(tmp, "labels.json"), "w") as f:
+            json.dump({"genes": self.genes, "samples": self.samples}, f)
+        for name in ["indptr", "indices", "values"]:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a saved matrix; the arrays are memory-mapped, not read.
+        """
+        with open(os.path.join(path, "labels.json")) as f:
+            labels = json.load(f)
+        arrays = [
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ["indptr", "indices", "values"]
+        ]
+        return cls(labels["genes"], labels["samples"], *arrays)
+
+    def altered_samples(self):
+        """
+        Get the number of altered samples per gene.
+        """
+        return pd.Series(np.diff(self.indptr), index=self.genes)
+
+    def slice(self, genes=None, samples=None):
+        """
+        Get the alteration flags of some genes in some samples (all by
+        default) as dense table; unknown genes and samples are ignored. Only
+        the stored entries of the selected genes are read.
+
+        Returns:
+            DataFrame of flags with the genes as rows and samples as columns.
+        """
+        genes = [g for g in genes or self.genes if g in self._gene_rows]
+        samples = [
+            s for s in samples or self.samples if s in self._sample_columns
+        ]
+        rows = np.array([self._gene_rows[g] for g in genes], dtype=np.int64)
+        # column of each sample of the matrix in the table, -1 if not selected
+        columns = np.full(len(self.samples), -1, dtype=np.int64)
+        columns[[self._sample_columns[s] for s in samples]] = np.arange(
+            len(samples)
+        )
+
+        starts = np.asarray(self.indptr[rows])
+        lengths = np.asarray(self.indptr[rows + 1]) - starts
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        entries += np.arange(lengths.sum())
+        table_rows = np.repeat(np.arange(len(rows)), lengths)
+        table_columns = columns[np.asarray(self.indices[entries])]
+        selected = table_columns >= 0
+
+        dense = np.zeros((len(genes), len(samples)), dtype=np.int8)
+        dense[table_rows[selected], table_columns[selected]] = np.asarray(
+            self.values[entries]
+        )[selected]
+        return pd.DataFrame(dense, index=genes, columns=samples)
+
+
+def _copy_number_flags(copies, loh):
+    flags = 0
+    if copies is not None:
+        if copies > 2:
+            flags |= GAIN
+        elif copies < 2:
+            flags |= LOSS
+    if loh not in (None, "", "0", "False", "false") and loh:
+        flags |= LOH
+    return flags
+
+
+def _export_cohort_matrix(path, job=None):
+    """
+    Export the alterations of all genes in all samples from the graph into a
+    cohort matrix and save it to `path`. Runs in a `QueryJob` (see
+    `components.jobs`) with the export timeout, so it must not use the
+    session state.
+
+    Returns:
+        The number of altered gene-sample pairs, or None if cancelled.
+    """
+    genes, samples = {}, {}
+    gene_ids, sample_ids, flags = [], [], []
+
+    def add(gene, sample, flag):
+        gene_ids.append(genes.setdefault(gene, len(genes)))
+        sample_ids.append(samples.setdefault(sample, len(samples)))
+        flags.append(flag)
+
+    for record in _stream_neo4j_query(
+        COHORT_CNA_QUERY,
+        fetch_size=10000,
+        job=job,
+        timeout=KG_EXPORT_TIMEOUT,
+    ):
+        flag = _copy_number_flags(record["copies"], record["loh"])
+        if flag:
+            add(record["gene"], record["sample"], flag)
+    for record in _stream_neo4j_query(
+        COHORT_VARIANT_QUERY,
+        fetch_size=10000,
+        job=job,
+        timeout=KG_EXPORT_TIMEOUT,
+    ):
+        add(record["gene"], record["sample"], VARIANT)
+    if job is not None and job.cancelled:
+        return None
+
+    matrix = CohortMatrix.from_pairs(
+        list(genes),
+        list(samples),
+        np.array(gene_ids, dtype=np.int64),
+        np.array(sample_ids, dtype=np.int64),
+        np.array(flags, dtype=np.int8),
+    )
+    matrix.save(path)
+    return len(matrix.values)
+
+
+def _cohort_path():
+    """
+    Get the directory of the cohort matrix of the connected database and
+    schema.
+    """
+    database = (ss.get("db_ip"), ss.get("db_port"), ss.get("db_name"))
+    key = json.dumps([database, ss.get("schema_fingerprint")], default=str)
+    return os.path.join(COHORT_DIR, hashlib.sha256(key.encode()).hexdigest())
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _open_cohort_matrix(path):
+    """
+    Open a saved cohort matrix once, shared by all sessions.
+    """
+    return CohortMatrix.load(path)
+
+
+def _get_cohort_matrix():
+    """
+    Get the cohort matrix of the connected database, exporting it from the
+    graph in the background if it has not been saved yet.
+
+    Returns:
+        Tuple of whether the matrix is available and the matrix.
+    """
+    path = _cohort_path()
+    if not os.path.exists(path):
+        os.makedirs(COHORT_DIR, exist_ok=True)
+        finished, pairs = run_query_job(
+            "cohort_job",
+            "cohort export",
+            _export_cohort_matrix,
+            path,
+            timeout=KG_EXPORT_TIMEOUT,
+        )
+        if not finished or pairs is None:
+            return False, None
+    return True, _open_cohort_matrix(path)
+
+
+def _rebuild_cohort_matrix():
+    """
+    Discard the saved cohort matrix of the connected database, to export it
+    again (e.g., after the graph was updated).
+    """
+    path = _cohort_path()
+    _open_cohort_matrix.clear()
+    shutil.rmtree(path, ignore_errors=True)
+    discard_job("cohort_job")
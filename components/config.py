@@ -26,3 +26,79 @@ TABS_TO_SHOW = {
     "This Week's Tasks": os.getenv("THIS_WEEKS_TASKS_TAB", "false") == "true",
     "Task Settings": os.getenv("TASK_SETTINGS_PANEL_TAB", "false") == "true",
 }
+
+# Maximum number of concurrent Neo4j fetches and LLM calls when generating
+# project digests for the group and all members
+DIGEST_MAX_WORKERS = int(os.getenv("DIGEST_MAX_WORKERS", "4"))
+
+# Approximate number of prompt tokens per LLM call when digesting project data
+# in map-reduce mode
+DIGEST_TOKEN_BUDGET = int(os.getenv("DIGEST_TOKEN_BUDGET", "3000"))
+
+# Directory for snapshots of the project data and digests of the last run, used
+# for incremental digests
+DIGEST_SNAPSHOT_DIR = os.getenv("DIGEST_SNAPSHOT_DIR", ".digest_snapshots")
+
+# Maximum number of rows of a knowledge graph query result that can be paged
+# through, and the default number of rows per page
+KG_ROW_CAP = int(os.getenv("KG_ROW_CAP", "1000"))
+KG_PAGE_SIZE = int(os.getenv("KG_PAGE_SIZE", "50"))
+
+# Directory for the persistent caches of the knowledge graph panel, and the
+# maximum number of generated queries kept in the query cache
+KG_CACHE_DIR = os.getenv("KG_CACHE_DIR", ".kg_cache")
+KG_QUERY_CACHE_SIZE = int(os.getenv("KG_QUERY_CACHE_SIZE", "1000"))
+
+# Number of previously successful question-query pairs shown to the LLM in fast
+# query generation
+KG_EXAMPLES_PER_QUERY = int(os.getenv("KG_EXAMPLES_PER_QUERY", "3"))
+
+# Estimated number of rows (from EXPLAIN) above which a knowledge graph query is
+# not run without confirmation, and the server-side timeout of these queries in
+# seconds
+KG_MAX_ESTIMATED_ROWS = int(os.getenv("KG_MAX_ESTIMATED_ROWS", "1000000"))
+KG_QUERY_TIMEOUT = int(os.getenv("KG_QUERY_TIMEOUT", "30"))
+
+# Timeout in seconds of bulk exports (cohort matrix, downloads), which read far
+# more rows than interactive queries; 0 disables the timeout
+KG_EXPORT_TIMEOUT = int(os.getenv("KG_EXPORT_TIMEOUT", "3600"))
+
+# Further BioCypher graphs to query together with the connected one, as
+# comma-separated "name=bolt://[user:password@]host[:port][/database]" entries
+KG_GRAPHS = os.getenv("KG_GRAPHS", "")
+
+# Number of worker threads, shared by all sessions, that run knowledge graph and
+# genetics queries in the background
+KG_QUERY_WORKERS = int(os.getenv("KG_QUERY_WORKERS", "8"))
+
+# Maximum number of pooled connections to the PostgreSQL database of the
+# knowledge graph panel (shared by all sessions), and the table of the BioCypher
+# PostgreSQL export that holds the schema info
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", "4"))
+POSTGRES_SCHEMA_INFO_TABLE = os.getenv(
+    "POSTGRES_SCHEMA_INFO_TABLE", "schema_info"
+)
+
+# Approximate number of prompt tokens for the digest of a knowledge graph query
+# result (column statistics and sample rows) from which the LLM answers the
+# question
+KG_ANSWER_TOKEN_BUDGET = int(os.getenv("KG_ANSWER_TOKEN_BUDGET", "2000"))
+
+# Maximum number of genes whose tables are kept in the gene cache of the
+# genetics panel (shared by all sessions), and their time to live in seconds
+GENE_CACHE_SIZE = int(os.getenv("GENE_CACHE_SIZE", "256"))
+GENE_CACHE_TTL = int(os.getenv("GENE_CACHE_TTL", "3600"))
+
+# Number of genes per query when looking up a list of genes
+GENE_LIST_CHUNK_SIZE = int(os.getenv("GENE_LIST_CHUNK_SIZE", "100"))
+
+# Number of rows per page of the alteration tables of the patient view
+PATIENT_PAGE_SIZE = int(os.getenv("PATIENT_PAGE_SIZE", "100"))
+
+# Number of most frequently altered genes shown in the cohort view by default
+COHORT_TOP_GENES = int(os.getenv("COHORT_TOP_GENES", "25"))
+
+# Number of rows per chunk written to downloaded files (Parquet, Arrow IPC or
+# CSV), and the maximum number of rows of a downloaded query result
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "10000"))
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "1000000"))
@@ -162,3 +162,145 @@ SUMMARY_INSTRUCTION_INDIVIDUAL = "You will receive a collection of projects led
 TASKS_INSTRUCTION = "You will receive a collection of projects, and your task is to plan their execution in the next project phase for the group. Prioritise the tasks according to their size, priority, and assigned members, and suggest potentially useful collaborations. Prioritise projects by their priority value and focus on the current iteration. Reserve projects from the following iterations as backup suggestions. Dedicate a section in the beginning to who should talk to whom."
 
 TASKS_INSTRUCTION_INDIVIDUAL = "You will receive a collection of tasks of an individual member of a group, and your task is to plan the next project phase for this member. Prioritise projects by their priority value and focus on the current iteration, taking size into account. Reserve projects from the following iterations as backup suggestions. Suggest potentially useful collaborations in a dedicated section in the beginning."
+
+MEMBERS_QUERY = """MATCH (person:Person)-[:Leads]->(:Project)
+RETURN DISTINCT person.name AS name
+ORDER BY name"""
+
+MAP_INSTRUCTION = "{instruction} You will only receive part {part} of {parts} of the data. Cover this part comprehensively, as your response will later be combined with the responses for the other parts."
+
+REDUCE_INSTRUCTION = "You will receive several partial responses, each generated from one part of the project data according to the following instruction: '{instruction}' Combine them into a single, coherent response that follows this instruction, merging duplicate information."
+
+INCREMENTAL_INSTRUCTION = "{instruction} You already responded to an earlier state of the project data. You will now receive your previous response and the changes to the data since then: new projects, projects that are no longer included (for instance, because they were closed), projects moved to another iteration (given as 'old -> new'), changed fields of projects (given as 'old -> new'), and new comments. Update your previous response according to these changes and return the complete updated response."
+
+FAST_QUERY_PROMPT = "Generate a database query in {query_language} that answers the user's question. The database has the following schema. {schema} Here are examples of similar questions and queries that answered them successfully:\n\n{examples}\n\nOnly return the query, without any additional text, symbols or characters --- just the query statement."
+
+ANSWER_INSTRUCTION = "You will receive a question about a knowledge graph, the database query that was run to answer it, and a digest of the query result: the number of rows, statistics of each column (number of values, distinct values and the most frequent ones, or the range of numeric values), and a sample of the rows. Answer the question concisely from this information. Use the statistics for questions about counts or distributions, and the sample for examples; if the sample does not contain all rows, do not present it as the complete result. If the result does not answer the question, say so."
+
+GENE_QUERY = """MATCH (g:Gene)
+WHERE g.id = $gene_id
+RETURN g
+LIMIT 1"""
+
+GENE_CNA_QUERY = """UNWIND $gene_ids AS gene_id
+MATCH (g:Gene)
+WHERE g.id = gene_id
+MATCH (g)<-[cn:SampleToGeneCopyNumberAlteration]-(cns:Sample)
+RETURN substring(g.id, 5) AS gene,
+       cn.id AS alteration_id,
+       cn.breaksInGene AS breaks_in_gene,
+       cn.nMajor AS n_major,
+       cn.nMinor AS n_minor,
+       cn.purifiedBaf AS purified_baf,
+       cn.purifiedLogR AS purified_logr,
+       cn.minPurifiedLogR AS min_purified_logr,
+       cn.maxPurifiedLogR AS max_purified_logr,
+       cn.purifiedLoh AS purified_loh,
+       collect(DISTINCT cns.id) AS sample_ids"""
+
+GENE_VARIANT_QUERY = """UNWIND $gene_ids AS gene_id
+MATCH (g:Gene)
+WHERE g.id = gene_id
+MATCH (g)<-[vn:VariantToGeneAssociation]-(v:SequenceVariant)<-[:SampleToVariantAssociation]-(vns:Sample)
+{variant_filter}
+RETURN substring(g.id, 5) AS gene,
+       vn.id AS alteration_id,
+       v.`Gene.MANE` AS mane,
+       v.CADD_phred AS cadd_phred,
+       v.`AAChange.MANE` AS aa_mane,
+       v.`Func.MANE` AS func_mane,
+       v.`ExonicFunc.MANE` AS ex_func_mane,
+       v.CLNSIG AS clnsig,
+       v.CLNREVSTAT AS clnrevstat,
+       v.gnomAD_genome_max AS gnomad_max,
+       v.REF AS ref,
+       v.ALT AS alt,
+       v.POS AS pos,
+       v.COSMIC_TOTAL_OCC AS cosmic_total_occ,
+       collect(DISTINCT vns.id) AS sample_ids"""
+
+GENE_IDS_QUERY = """MATCH (g:Gene)
+WHERE g.id STARTS WITH 'hgnc:'
+RETURN g.id AS id"""
+
+GENE_LOCATIONS_QUERY = """MATCH (g:Gene)
+WHERE g.id STARTS WITH 'hgnc:'
+  AND g.chr IS NOT NULL
+  AND g.start IS NOT NULL
+  AND g.end IS NOT NULL
+RETURN g.id AS id, g.chr AS chr, g.start AS start, g.end AS end"""
+
+PATIENT_SAMPLES_QUERY = """MATCH (s:Sample)
+WHERE s.id STARTS WITH $patient_id
+  AND (s.id = $patient_id OR substring(s.id, size($patient_id), 1) IN ['-', '_', '.'])
+RETURN s.id AS id
+ORDER BY id"""
+
+PATIENT_CNA_COUNTS_QUERY = """MATCH (s:Sample)-[cn:SampleToGeneCopyNumberAlteration]->(g:Gene)
+WHERE s.id IN $sample_ids
+RETURN g.chr AS chr,
+       substring(g.id, 5) AS gene,
+       count(cn) AS n"""
+
+PATIENT_VARIANT_COUNTS_QUERY = """MATCH (s:Sample)-[:SampleToVariantAssociation]->(v:SequenceVariant)-[:VariantToGeneAssociation]->(g:Gene)
+WHERE s.id IN $sample_ids
+RETURN g.chr AS chr,
+       substring(g.id, 5) AS gene,
+       v.CLNSIG AS clnsig,
+       count(*) AS n"""
+
+PATIENT_CNA_PAGE_QUERY = """MATCH (s:Sample)-[cn:SampleToGeneCopyNumberAlteration]->(g:Gene)
+WHERE s.id IN $sample_ids
+  AND ($chr IS NULL OR g.chr = $chr)
+  AND ($gene_id IS NULL OR g.id = $gene_id)
+RETURN s.id AS sample_id,
+       substring(g.id, 5) AS gene,
+       g.chr AS chr,
+       cn.id AS alteration_id,
+       cn.breaksInGene AS breaks_in_gene,
+       cn.nMajor AS n_major,
+       cn.nMinor AS n_minor,
+       cn.purifiedBaf AS purified_baf,
+       cn.purifiedLogR AS purified_logr,
+       cn.minPurifiedLogR AS min_purified_logr,
+       cn.maxPurifiedLogR AS max_purified_logr,
+       cn.purifiedLoh AS purified_loh
+ORDER BY chr, g.start, gene, sample_id
+SKIP $skip
+LIMIT $limit"""
+
+PATIENT_VARIANT_PAGE_QUERY = """MATCH (s:Sample)-[:SampleToVariantAssociation]->(v:SequenceVariant)-[vn:VariantToGeneAssociation]->(g:Gene)
+WHERE s.id IN $sample_ids
+  AND ($chr IS NULL OR g.chr = $chr)
+  AND ($gene_id IS NULL OR g.id = $gene_id)
+  AND ($clnsig IS NULL OR v.CLNSIG = $clnsig)
+RETURN s.id AS sample_id,
+       substring(g.id, 5) AS gene,
+       g.chr AS chr,
+       vn.id AS alteration_id,
+       v.`Gene.MANE` AS mane,
+       v.CADD_phred AS cadd_phred,
+       v.`AAChange.MANE` AS aa_mane,
+       v.`Func.MANE` AS func_mane,
+       v.`ExonicFunc.MANE` AS ex_func_mane,
+       v.CLNSIG AS clnsig,
+       v.CLNREVSTAT AS clnrevstat,
+       v.gnomAD_genome_max AS gnomad_max,
+       v.REF AS ref,
+       v.ALT AS alt,
+       v.POS AS pos,
+       v.COSMIC_TOTAL_OCC AS cosmic_total_occ
+ORDER BY chr, pos, gene, sample_id
+SKIP $skip
+LIMIT $limit"""
+
+COHORT_CNA_QUERY = """MATCH (s:Sample)-[cn:SampleToGeneCopyNumberAlteration]->(g:Gene)
+WHERE g.id STARTS WITH 'hgnc:'
+RETURN substring(g.id, 5) AS gene,
+       s.id AS sample,
+       toInteger(cn.nMajor) + toInteger(cn.nMinor) AS copies,
+       cn.purifiedLoh AS loh"""
+
+COHORT_VARIANT_QUERY = """MATCH (s:Sample)-[:SampleToVariantAssociation]->(:SequenceVariant)-[:VariantToGeneAssociation]->(g:Gene)
+WHERE g.id STARTS WITH 'hgnc:'
+RETURN DISTINCT substring(g.id, 5) AS gene, s.id AS sample"""
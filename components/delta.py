@@ -0,0 +1,156 @@
+# DELTA
+# snapshots of digest data and structured differences between them
+import datetime
+import hashlib
+import json
+import os
+
+from .config import DIGEST_SNAPSHOT_DIR
+from .serialize import compact_records
+
+# records of the project queries are identified by these fields together: a
+# project title is only unique per person
+IDENTITY_KEYS = ("person.name", "project.title")
+
+# fields whose change moves a record (e.g., a project carried over to the next
+# iteration), reported separately from other changes
+MOVE_KEYS = ("iteration.title",)
+
+# fields holding comments, either as list or as "; "-separated string
+COMMENT_KEYS = ["concatenated_comments", "comments"]
+
+
+def _snapshot_path(kind, label, query, instruction, database):
+    """
+    Get the snapshot file of a digest. The database, query and instruction
+    are part of the key, since a snapshot cannot be reused for another
+    database or once the query or instruction are modified.
+    """
+    key = hashlib.sha1(
+        json.dumps([kind, label, query, instruction, database]).encode()
+    ).hexdigest()[:16]
+    return os.path.join(DIGEST_SNAPSHOT_DIR, f"{kind}-{key}.json")
+
+
+def _load_snapshot(path):
+    """
+    Load a snapshot of the records and digest of a previous run, if present.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_snapshot(path, records, digest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "timestamp": datetime.datetime.now().isoformat(
+                    timespec="minutes"
+                ),
+                "records": records,
+                "digest": digest,
+            },
+            f,
+            default=str,
+        )
+
+
+def _comments(value):
+    if isinstance(value, list):
+        return [str(c) for c in value if c]
+    if isinstance(value, str):
+        return [c.strip() for c in value.split("; ") if c.strip()]
+    return []
+
+
+def diff_records(previous, current, keys=IDENTITY_KEYS, moves=MOVE_KEYS):
+    """
+    Compute the structured difference between two query results.
+
+    Args:
+        previous: The records of the previous snapshot.
+
+        current: The current records.
+
+        keys: The fields identifying a record together (the person and
+            project by default).
+
+        moves: The fields whose change moves a record (the iteration by
+            default).
+
+    Returns:
+        Dictionary with the lists of "new" and "removed" records (e.g.,
+        projects that were closed or left the scope of the query), of
+        "moved" records, giving for each the identity fields and the moved
+        fields as "old -> new", and of "changed" records, giving for each
+        the identity fields, the changed fields as "old -> new", and the
+        comments that were added. Other changes of moved records are given
+        with them.
+    """
+
+    def identity(record):
+        return tuple(record.get(key) for key in keys)
+
+    before = {identity(record): record for record in previous}
+    after = {identity(record): record for record in current}
+
+    new = [record for k, record in after.items() if k not in before]
+    removed = [record for k, record in before.items() if k not in after]
+
+    moved = []
+    changed = []
+    for k, record in after.items():
+        if k not in before:
+            continue
+        old = before[k]
+        move = {}
+        change = {}
+        new_comments = []
+        for field in record.keys() | old.keys():
+            if record.get(field) == old.get(field):
+                continue
+            if field in COMMENT_KEYS:
+                seen = set(_comments(old.get(field)))
+                new_comments.extend(
+                    c for c in _comments(record.get(field)) if c not in seen
+                )
+            elif field in moves:
+                move[field] = f"{old.get(field)} -> {record.get(field)}"
+            else:
+                change[field] = f"{old.get(field)} -> {record.get(field)}"
+        if move or change or new_comments:
+            entry = {
+                **dict(zip(keys, k)),
+                **move,
+                "changes": change or None,
+                "new_comments": new_comments or None,
+            }
+            (moved if move else changed).append(entry)
+
+    return {"new": new, "removed": removed, "moved": moved, "changed": changed}
+
+
+def is_empty(delta):
+    return not any(delta.values())
+
+
+def format_delta(delta):
+    """
+    Serialise a delta compactly for the LLM prompt.
+    """
+    sections = []
+    for name, title in [
+        ("new", "New projects"),
+        ("removed", "Projects no longer included (e.g., closed)"),
+        ("moved", "Projects moved to another iteration"),
+        ("changed", "Changed projects"),
+    ]:
+        if delta[name]:
+            sections.append(f"{title}:\n{compact_records(delta[name])}")
+    return "\n\n".join(sections)
@@ -0,0 +1,397 @@
+# DIGEST
+# generate project summaries and task plans for the group and its members
+import copy
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streamlit as st
+from loguru import logger
+
+from .config import DIGEST_MAX_WORKERS, DIGEST_TOKEN_BUDGET
+from .constants import (
+    MEMBERS_QUERY,
+    MAP_INSTRUCTION,
+    REDUCE_INSTRUCTION,
+    INCREMENTAL_INSTRUCTION,
+)
+from .delta import (
+    _snapshot_path,
+    _load_snapshot,
+    _save_snapshot,
+    diff_records,
+    format_delta,
+    is_empty,
+)
+from .kg import _connect_to_neo4j
+from .serialize import _estimate_tokens, compact_records, serialize_records
+
+ss = st.session_state
+
+GROUP = "Group"
+
+# records of the project queries are grouped by this key for chunking
+CHUNK_KEY = "iteration.title"
+
+# session state keys of the queries and instructions used per digest kind
+DIGEST_SETTINGS = {
+    "summary": {
+        "query": "summary_query",
+        "query_individual": "summary_query_individual",
+        "instruction": "summary_instruction",
+        "instruction_individual": "summary_instruction_individual",
+    },
+    "tasks": {
+        "query": "tasks_query",
+        "query_individual": "tasks_query_individual",
+        "instruction": "tasks_instruction",
+        "instruction_individual": "tasks_instruction_individual",
+    },
+}
+
+
+def _fork_conversation(conversation):
+    """
+    Create an independent copy of the session conversation. The copy shares
+    the model client (and thus the API key) with the original, but has its own
+    message history, so that several digests can be generated at the same time
+    without interfering with each other or with the chat.
+    """
+    conv = copy.copy(conversation)
+    conv.reset()
+    conv.rag_agents = []
+    conv.correct = False
+    return conv
+
+
+def _team_members():
+    """
+    Get the names of all team members leading a project.
+    """
+    result = ss.neodriver.query(MEMBERS_QUERY)
+
+    if not result[0]:
+        return []
+
+    return [record["name"] for record in result[0]]
+
+
+def _digest_targets(kind, group=True, members=()):
+    """
+    Assemble the (label, query, instruction) triples for the group and the
+    requested members.
+    """
+    settings = DIGEST_SETTINGS[kind]
+    targets = []
+    if group:
+        targets.append(
+            (GROUP, ss.get(settings["query"]), ss.get(settings["instruction"]))
+        )
+    for member in members:
+        targets.append(
+            (
+                member,
+                ss.get(settings["query_individual"]).format(person=member),
+                ss.get(settings["instruction_individual"]),
+            )
+        )
+    return targets
+
+
+def _chunk_records(records, token_budget, key=CHUNK_KEY):
+    """
+    Split query records into chunks that fit the token budget. Records are
+    grouped by `key` (the iteration by default), and groups are kept together
+    as far as possible; groups exceeding the budget are split between records
+    (projects). A single record exceeding the budget forms its own chunk.
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault(record.get(key), []).append(record)
+
+    chunks = []
+    chunk, chunk_tokens = [], 0
+    for group in groups.values():
+        group_tokens = _estimate_tokens(compact_records(group))
+        if chunk_tokens + group_tokens <= token_budget:
+            chunk.extend(group)
+            chunk_tokens += group_tokens
+            continue
+        if chunk:
+            chunks.append(chunk)
+        if group_tokens <= token_budget:
+            # the group fits a chunk of its own
+            chunk, chunk_tokens = list(group), group_tokens
+            continue
+        chunk, chunk_tokens = [], 0
+        for record in group:
+            record_tokens = _estimate_tokens(compact_records([record]))
+            if chunk and chunk_tokens + record_tokens > token_budget:
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(record)
+            chunk_tokens += record_tokens
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+def _ask(conversation, instruction, text, limit):
+    """
+    Run a single LLM call on a fresh fork of the conversation, holding one of
+    the concurrency slots while waiting for the model.
+    """
+    conv = _fork_conversation(conversation)
+    conv.append_system_message(instruction)
+    with limit:
+        msg, _, _ = conv.query(text)
+    return msg
+
+
+def _map_reduce(conversation, instruction, records, token_budget, limit):
+    """
+    Digest records that exceed the token budget: summarise budget-sized chunks
+    in parallel (map), then combine the partial results (reduce). If the
+    partial results themselves exceed the budget, they are combined in several
+    rounds.
+    """
+    chunks = _chunk_records(records, token_budget)
+    if len(chunks) == 1:
+        return _ask(conversation, instruction, compact_records(records), limit)
+
+    with ThreadPoolExecutor(
+        max_workers=min(DIGEST_MAX_WORKERS, len(chunks))
+    ) as executor:
+        partials = list(
+            executor.map(
+                lambda part: _ask(
+                    conversation,
+                    MAP_INSTRUCTION.format(
+                        instruction=instruction,
+                        part=part[0] + 1,
+                        parts=len(chunks),
+                    ),
+                    compact_records(part[1]),
+                    limit,
+                ),
+                enumerate(chunks),
+            )
+        )
+
+    reduce_instruction = REDUCE_INSTRUCTION.format(instruction=instruction)
+    while len(partials) > 1:
+        batches, batch = [], []
+        for partial in partials:
+            if batch and _estimate_tokens(
+                "\n\n".join(batch + [partial])
+            ) > token_budget:
+                batches.append(batch)
+                batch = []
+            batch.append(partial)
+        batches.append(batch)
+        if len(batches) == 1:
+            break
+        if len(batches) == len(partials):
+            # every partial fills the budget on its own; pair them up to make
+            # progress
+            batches = [partials[i : i + 2] for i in range(0, len(partials), 2)]
+        with ThreadPoolExecutor(
+            max_workers=min(DIGEST_MAX_WORKERS, len(batches))
+        ) as executor:
+            partials = list(
+                executor.map(
+                    lambda batch: _ask(
+                        conversation,
+                        reduce_instruction,
+                        "\n\n".join(batch),
+                        limit,
+                    ),
+                    batches,
+                )
+            )
+
+    return _ask(
+        conversation, reduce_instruction, "\n\n".join(partials), limit
+    )
+
+
+def _incremental_digest(
+    conversation, instruction, records, stats, snapshot, token_budget, limit
+):
+    """
+    Update the digest of the previous run with the changes in the data since
+    then. The LLM is not called at all if nothing changed.
+
+    Returns:
+        Tuple of the LLM response and the prompt size statistics, or None if
+        there is no usable snapshot, or if the changes exceed the token budget
+        or the size of the full data.
+    """
+    if not snapshot or not snapshot.get("digest"):
+        return None
+
+    delta = diff_records(snapshot["records"], records)
+    if is_empty(delta):
+        return snapshot["digest"], {
+            **stats,
+            "compact_tokens": 0,
+            "unchanged_since": snapshot["timestamp"],
+        }
+
+    text = (
+        f"Previous response:\n{snapshot['digest']}\n\n"
+        f"Changes since {snapshot['timestamp']}:\n{format_delta(delta)}"
+    )
+    tokens = _estimate_tokens(text)
+    if tokens >= stats["compact_tokens"]:
+        # the full data is not larger than the changes
+        return None
+    if token_budget and tokens > token_budget:
+        return None
+
+    msg = _ask(
+        conversation,
+        INCREMENTAL_INSTRUCTION.format(instruction=instruction),
+        text,
+        limit,
+    )
+    return msg, {
+        **stats,
+        "compact_tokens": tokens,
+        "changes_since": snapshot["timestamp"],
+    }
+
+
+def _run_digest(
+    driver,
+    conversation,
+    query,
+    instruction,
+    limit,
+    token_budget=None,
+    snapshot_path=None,
+):
+    """
+    Fetch the project data and have the LLM digest it. Runs in a worker
+    thread, so it must not access the session state.
+
+    Args:
+        limit: Semaphore limiting the number of concurrent LLM calls.
+
+        token_budget: If given, data exceeding this number of tokens is
+            digested in map-reduce mode.
+
+        snapshot_path: If given, the digest is generated incrementally from
+            the snapshot of the last run stored at this path (if present), and
+            the snapshot is updated afterwards.
+
+    Returns:
+        Tuple of the LLM response (None if the query returned no results) and
+        the prompt size statistics of the serialised data (see
+        `serialize_records`).
+    """
+    result = driver.query(query)
+
+    if not result[0]:
+        return None, None
+
+    # normalise values for comparison with the stored snapshot
+    records = json.loads(json.dumps(result[0], default=str))
+    data, stats = serialize_records(records)
+    logger.info(
+        f"Digest data: {stats['compact_tokens']} tokens "
+        f"({stats['json_tokens']} as JSON)."
+    )
+
+    if snapshot_path:
+        incremental = _incremental_digest(
+            conversation,
+            instruction,
+            records,
+            stats,
+            _load_snapshot(snapshot_path),
+            token_budget,
+            limit,
+        )
+        if incremental:
+            msg, stats = incremental
+            _save_snapshot(snapshot_path, records, msg)
+            return msg, stats
+
+    if token_budget and stats["compact_tokens"] > token_budget:
+        msg = _map_reduce(
+            conversation, instruction, records, token_budget, limit
+        )
+    else:
+        msg = _ask(conversation, instruction, data, limit)
+
+    if snapshot_path and msg:
+        _save_snapshot(snapshot_path, records, msg)
+
+    return msg, stats
+
+
+def generate_digests(kind, group=True, members=None):
+    """
+    Generate digests for the group and/or the given members concurrently, each
+    using its own conversation, and yield them as they finish. If map-reduce
+    mode is enabled in the settings, project data exceeding the token budget
+    is digested in parts; in incremental mode, only the changes since the last
+    run are sent to the LLM, together with the previous digest.
+
+    Args:
+        kind: The kind of digest, "summary" or "tasks".
+
+        group: Whether to generate the digest for the whole group.
+
+        members: The team members to generate individual digests for. If
+            None, individual digests are generated for all team members.
+
+    Yields:
+        Tuples of (label, message, stats); the message is None if the query
+        returned no results or the generation failed, stats are the prompt
+        size statistics of the project data (see `serialize_records`).
+    """
+    _connect_to_neo4j()
+    driver = ss.neodriver
+    if members is None:
+        members = _team_members()
+    targets = _digest_targets(kind, group, members)
+    if not targets:
+        return
+
+    token_budget = None
+    if ss.get("digest_map_reduce"):
+        token_budget = ss.get("digest_token_budget", DIGEST_TOKEN_BUDGET)
+    incremental = ss.get("digest_incremental", False)
+    database = (ss.get("db_ip"), ss.get("db_port"), ss.get("db_name"))
+    limit = threading.BoundedSemaphore(DIGEST_MAX_WORKERS)
+
+    with ThreadPoolExecutor(
+        max_workers=min(DIGEST_MAX_WORKERS, len(targets))
+    ) as executor:
+        futures = {
+            executor.submit(
+                _run_digest,
+                driver,
+                _fork_conversation(ss.conversation),
+                query,
+                instruction,
+                limit,
+                token_budget,
+                (
+                    _snapshot_path(kind, label, query, instruction, database)
+                    if incremental
+                    else None
+                ),
+            ): label
+            for label, query, instruction in targets
+        }
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                yield label, *future.result()
+            except Exception as e:
+                logger.error(f"Digest generation for {label} failed: {e}")
+                yield label, None, None
@@ -0,0 +1,124 @@
+# EXAMPLES
+# store of validated question-query pairs for few-shot query generation
+import contextlib
+import os
+import re
+import sqlite3
+import time
+
+from .config import KG_CACHE_DIR, KG_EXAMPLES_PER_QUERY
+from .constants import FAST_QUERY_PROMPT
+from .query_cache import _normalise_question
+from .schema import format_projection, project_schema
+
+EXAMPLES_PATH = os.path.join(KG_CACHE_DIR, "examples.sqlite")
+
+# minimum similarity of an example to the question to be used
+MIN_SIMILARITY = 0.2
+
+
+@contextlib.contextmanager
+def _connect():
+    """
+    Open the example database in a transaction, creating it if necessary.
+    """
+    os.makedirs(os.path.dirname(EXAMPLES_PATH), exist_ok=True)
+    connection = sqlite3.connect(EXAMPLES_PATH, timeout=10)
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS examples (fingerprint TEXT, "
+                "language TEXT, normalised TEXT, question TEXT, query TEXT, "
+                "created REAL, PRIMARY KEY (fingerprint, language, normalised))"
+            )
+            yield connection
+    finally:
+        connection.close()
+
+
+def record_example(question, fingerprint, query_language, query):
+    """
+    Store a question and a query that answered it successfully on a given
+    schema, replacing a previous query for the same question.
+    """
+    with _connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO examples VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                fingerprint,
+                query_language,
+                _normalise_question(question),
+                question,
+                query,
+                time.time(),
+            ),
+        )
+
+
+def _similarity(a, b):
+    """
+    Lexical similarity (Jaccard index of the words) of two normalised
+    questions.
+    """
+    a, b = set(a.split()), set(b.split())
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_examples(question, fingerprint, query_language, n=None):
+    """
+    Find the stored examples most similar to a question.
+
+    Returns:
+        List of up to `n` (question, query) tuples, most similar first.
+    """
+    normalised = _normalise_question(question)
+    with _connect() as connection:
+        rows = connection.execute(
+            "SELECT normalised, question, query FROM examples "
+            "WHERE fingerprint = ? AND language = ?",
+            (fingerprint, query_language),
+        ).fetchall()
+
+    scored = [
+        (_similarity(normalised, row[0]), row[1], row[2]) for row in rows
+    ]
+    scored = [s for s in scored if s[0] >= MIN_SIMILARITY]
+    scored.sort(key=lambda s: s[0], reverse=True)
+    scored = scored[: n or KG_EXAMPLES_PER_QUERY]
+
+    return [(q, query) for _, q, query in scored]
+
+
+def generate_query_from_examples(
+    prompt_engine, question, examples, query_language
+):
+    """
+    Generate a query for the question in a single LLM call, showing the model
+    the schema and examples of similar questions with queries that answered
+    them, instead of selecting entities, relationships, and properties in
+    separate calls.
+
+    Returns:
+        The generated query.
+    """
+    conversation = prompt_engine.conversation_factory()
+    conversation.reset()
+    conversation.append_system_message(
+        FAST_QUERY_PROMPT.format(
+            query_language=query_language,
+            schema=format_projection(
+                project_schema(
+                    prompt_engine.entities, prompt_engine.relationships
+                )
+            ),
+            examples="\n\n".join(
+                f"Question: {q}\nQuery: {query}" for q, query in examples
+            ),
+        )
+    )
+    msg, _, _ = conversation.query(question)
+
+    # strip a code fence with any language tag (```cypher, ```sql, ...)
+    return re.sub(r"^```\w*\s*|\s*```$", "", msg.strip()).strip()
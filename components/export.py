@@ -0,0 +1,355 @@
+# EXPORT
+# downloads of query results and tables as Parquet, Arrow IPC or compressed
+# CSV, written chunk by chunk
+import contextlib
+import itertools
+import os
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import streamlit as st
+
+from .config import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_MAX_ROWS,
+    KG_CACHE_DIR,
+    KG_EXPORT_TIMEOUT,
+)
+from .jobs import discard_job, run_query_job
+from .kg import _stream_neo4j_query
+from .results import _as_string, records_to_table
+
+ss = st.session_state
+
+# format: (file extension, MIME type)
+FORMATS = {
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": ("arrow", "application/vnd.apache.arrow.file"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+}
+
+EXPORT_DIR = os.path.join(KG_CACHE_DIR, "exports")
+
+# age in seconds after which export files are deleted
+EXPORT_RETENTION = 24 * 3600
+
+
+def _export_schema(schema, fmt):
+    """
+    Derive the schema of an export from the schema of its first chunk:
+    columns without values in the first chunk are strings, and CSV columns
+    are all strings.
+    """
+    return pa.schema(
+        [
+            pa.field(
+                field.name,
+                (
+                    pa.string()
+                    if fmt.startswith("CSV") or pa.types.is_null(field.type)
+                    else field.type
+                ),
+            )
+            for field in schema
+        ]
+    )
+
+
+def _to_strings(column):
+    try:
+        return column.cast(pa.string())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # nested values
+        return pa.array(
+            [_as_string(v) for v in column.to_pylist()], type=pa.string()
+        )
+
+
+def _conform(table, schema):
+    """
+    Conform a chunk to the schema of the export: columns missing from the
+    chunk are null, and columns are cast to the type of the schema.
+
+    Raises:
+        pa.ArrowInvalid: If a column has values of another type than in the
+            first chunk that cannot be cast (e.g., text in a numeric column).
+    """
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table.column(field.name)
+        if column.type != field.type:
+            if pa.types.is_string(field.type):
+                column = _to_strings(column)
+            else:
+                column = column.cast(field.type)
+        columns.append(column)
+    return pa.table(columns, schema=schema)
+
+
+def _open_writer(fmt, path, schema):
+    """
+    Open a writer of the format, returning it with the stream to close after
+    it (if any).
+    """
+    if fmt == "Parquet":
+        return pq.ParquetWriter(path, schema), None
+    if fmt == "Arrow IPC":
+        sink = pa.OSFile(path, "wb")
+        return pa.ipc.new_file(sink, schema), sink
+    sink = pa.CompressedOutputStream(path, "gzip")
+    return pa_csv.CSVWriter(sink, schema), sink
+
+
+def write_export(tables, fmt, path):
+    """
+    Write the chunks of a result into one file, chunk by chunk, so that only
+    one chunk is in memory. The columns and types are those of the first
+    chunk; columns appearing only in later chunks are not exported.
+
+    Args:
+        tables: Iterable of Arrow tables, the chunks of the result.
+
+        fmt: One of `FORMATS`.
+
+        path: The path of the file.
+
+    Returns:
+        Dictionary with the number of exported "rows" and the names of the
+        "dropped" columns.
+    """
+    writer = sink = schema = None
+    failed = False
+    rows = 0
+    dropped = set()
+    try:
+        for table in tables:
+            if writer is None:
+                schema = _export_schema(table.schema, fmt)
+                writer, sink = _open_writer(fmt, path, schema)
+            dropped.update(set(table.column_names) - set(schema.names))
+            writer.write_table(_conform(table, schema))
+            rows += table.num_rows
+    except Exception:
+        failed = True
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+        if failed and os.path.exists(path):
+            # do not leave a partial file
+            os.remove(path)
+    return {"rows": rows, "dropped": sorted(dropped)}
+
+
+def _record_tables(records):
+    """
+    Convert records to Arrow tables of `EXPORT_CHUNK_SIZE` records each, as
+    they arrive.
+    """
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield records_to_table(chunk)
+
+
+def _dataframe_tables(df):
+    """
+    Convert a table to Arrow tables of `EXPORT_CHUNK_SIZE` rows each.
+    """
+    for start in range(0, len(df), EXPORT_CHUNK_SIZE):
+        yield pa.Table.from_pandas(
+            df.iloc[start : start + EXPORT_CHUNK_SIZE], preserve_index=False
+        )
+
+
+def _export_records(records, fmt, path, job=None):
+    """
+    Export records streamed from a query; partial exports of cancelled jobs
+    are deleted.
+
+    Returns:
+        The export statistics (see `write_export`), or None if cancelled.
+    """
+    stats = write_export(_record_tables(records), fmt, path)
+    if job is not None and job.cancelled:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    return stats
+
+
+def _export_neo4j_query(query, fmt, path, job=None, **params):
+    """
+    Export the result of a cypher query, up to `EXPORT_MAX_ROWS` rows, as
+    the records arrive from the server. Runs in a `QueryJob` (see
+    `components.jobs`) with the export timeout.
+    """
+    records = _stream_neo4j_query(
+        query,
+        max_rows=EXPORT_MAX_ROWS,
+        fetch_size=EXPORT_CHUNK_SIZE,
+        job=job,
+        timeout=KG_EXPORT_TIMEOUT,
+        **params,
+    )
+    return _export_records(records, fmt, path, job)
+
+
+def _export_path(fmt):
+    """
+    Get the path of a new export file, deleting old export files.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    now = time.time()
+    for entry in os.scandir(EXPORT_DIR):
+        with contextlib.suppress(FileNotFoundError):
+            if now - entry.stat().st_mtime > EXPORT_RETENTION:
+                os.remove(entry.path)
+    return os.path.join(EXPORT_DIR, f"{uuid.uuid4().hex}.{FORMATS[fmt][0]}")
+
+
+def _table_fingerprint(df):
+    try:
+        return df.shape, int(pd.util.hash_pandas_object(df).sum())
+    except TypeError:
+        # unhashable cells
+        return df.shape, id(df)
+
+
+def _discard_export(key):
+    export = ss.pop(f"{key}_export", None)
+    if export is not None and os.path.exists(export["path"]):
+        os.remove(export["path"])
+    discard_job(f"{key}_job")
+
+
+def _request_query_export(key, fmt, args):
+    _discard_export(key)
+    ss[f"{key}_export"] = {
+        "fmt": fmt,
+        "source": args,
+        "path": _export_path(fmt),
+    }
+
+
+def _write_table_export(key, fmt, df, fingerprint):
+    _discard_export(key)
+    path = _export_path(fmt)
+    stats = write_export(_dataframe_tables(df), fmt, path)
+    ss[f"{key}_export"] = {
+        "fmt": fmt,
+        "source": fingerprint,
+        "path": path,
+        "stats": stats,
+    }
+
+
+def _export_format(key):
+    return st.selectbox(
+        "Download format:", list(FORMATS), key=f"{key}_format"
+    )
+
+
+def _download_button(key, name, export, stats):
+    if not stats["rows"]:
+        st.write("No rows to export.")
+        return
+    if stats["dropped"]:
+        st.caption(
+            "Columns missing from the first rows are not exported: "
+            + ", ".join(stats["dropped"])
+        )
+    extension, mime = FORMATS[export["fmt"]]
+    with open(export["path"], "rb") as f:
+        st.download_button(
+            f"Download {stats['rows']} rows",
+            data=f,
+            file_name=f"{name}.{extension}",
+            mime=mime,
+            key=f"{key}_download",
+        )
+
+
+def export_query_button(key, name, export, *args):
+    """
+    Offer the download of a query result: on request, the result is
+    exported in the background by `export(*args, fmt, path, job=job)`
+    (e.g., `_export_neo4j_query`), chunk by chunk as it is streamed from the
+    database, without building the whole table in memory. The export runs
+    with `KG_EXPORT_TIMEOUT` instead of the interactive query timeout.
+
+    Args:
+        key: The session state key of the export.
+
+        name: The name of the downloaded file, without extension.
+
+        export: The export function.
+
+        args: The arguments of the export function, which identify the
+            result; an export of other arguments is discarded.
+    """
+    fmt = _export_format(key)
+    export_state = ss.get(f"{key}_export")
+    if export_state is not None and (
+        export_state["fmt"] != fmt or export_state["source"] != args
+    ):
+        _discard_export(key)
+        export_state = None
+
+    if export_state is None:
+        st.button(
+            "Prepare download",
+            key=f"{key}_prepare",
+            on_click=_request_query_export,
+            args=(key, fmt, args),
+        )
+        return
+
+    finished, stats = run_query_job(
+        f"{key}_job",
+        f"export of {name}",
+        export,
+        *args,
+        fmt,
+        export_state["path"],
+        timeout=KG_EXPORT_TIMEOUT,
+    )
+    if finished and stats is not None:
+        _download_button(key, name, export_state, stats)
+
+
+def export_table_button(key, name, df):
+    """
+    Offer the download of a table that is already in memory, written chunk
+    by chunk on request.
+    """
+    fmt = _export_format(key)
+    fingerprint = _table_fingerprint(df)
+    export_state = ss.get(f"{key}_export")
+    if export_state is not None and (
+        export_state["fmt"] != fmt or export_state["source"] != fingerprint
+    ):
+        _discard_export(key)
+        export_state = None
+
+    if export_state is None:
+        st.button(
+            "Prepare download",
+            key=f"{key}_prepare",
+            on_click=_write_table_export,
+            args=(key, fmt, df, fingerprint),
+        )
+        return
+
+    _download_button(key, name, export_state, export_state["stats"])
@@ -0,0 +1,85 @@
+# GENE INDEX
+# prefix index of the gene symbols of a graph for suggestions and validation
+import bisect
+import difflib
+
+import neo4j
+import streamlit as st
+from loguru import logger
+
+from .constants import GENE_IDS_QUERY
+from .kg import _stream_neo4j_query
+
+ss = st.session_state
+
+
+class GenePrefixIndex:
+    """
+    Sorted array of gene symbols, answering membership and prefix queries by
+    binary search.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = sorted(set(symbols))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        i = bisect.bisect_left(self.symbols, symbol)
+        return i < len(self.symbols) and self.symbols[i] == symbol
+
+    def complete(self, prefix, n=10):
+        """
+        Get up to `n` symbols starting with `prefix`, in sorted order.
+        """
+        i = bisect.bisect_left(self.symbols, prefix)
+        matches = []
+        for symbol in self.symbols[i : i + n]:
+            if not symbol.startswith(prefix):
+                break
+            matches.append(symbol)
+        return matches
+
+    def suggest(self, name, n=10):
+        """
+        Suggest symbols for a (possibly misspelled) name: its completions, or
+        the most similar symbols if there are none.
+        """
+        return self.complete(name, n) or difflib.get_close_matches(
+            name, self.symbols, n=n, cutoff=0.6
+        )
+
+
+@st.cache_resource(max_entries=4, show_spinner="Loading gene symbols ...")
+def _load_gene_index(database, fingerprint, _driver):
+    """
+    Load the symbols of all genes of a database once per database and schema,
+    shared by all sessions. Failures raise, so that they are not cached.
+    """
+    symbols = [
+        str(record["id"]).removeprefix("hgnc:")
+        for record in _stream_neo4j_query(
+            GENE_IDS_QUERY, fetch_size=10000, driver=_driver
+        )
+    ]
+    return GenePrefixIndex(symbols)
+
+
+def _gene_index():
+    """
+    Get the gene symbol index of the connected database.
+
+    Returns:
+        The index, or None if the gene symbols could not be loaded (they are
+        loaded again on the next call).
+    """
+    try:
+        return _load_gene_index(
+            (ss.get("db_ip"), ss.get("db_port"), ss.get("db_name")),
+            ss.get("schema_fingerprint"),
+            ss.neodriver,
+        )
+    except (neo4j.exceptions.Neo4jError, neo4j.exceptions.DriverError) as e:
+        logger.error(f"Failed to load gene symbols: {e}")
+        return None
@@ -12,8 +12,31 @@ from streamlit.runtime.uploaded_file_manager import (
     UploadedFileRec,
 )
 from streamlit.proto.Common_pb2 import FileURLs
-import pandas as pd
-from .kg import _connect_to_neo4j
+from concurrent.futures import ThreadPoolExecutor
+from .cache import TTLCache
+from .config import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_MAX_ROWS,
+    GENE_CACHE_SIZE,
+    GENE_CACHE_TTL,
+    GENE_LIST_CHUNK_SIZE,
+    KG_EXPORT_TIMEOUT,
+)
+from .constants import (
+    GENE_CNA_QUERY,
+    GENE_QUERY,
+    GENE_VARIANT_QUERY,
+    PATIENT_CNA_COUNTS_QUERY,
+    PATIENT_CNA_PAGE_QUERY,
+    PATIENT_SAMPLES_QUERY,
+    PATIENT_VARIANT_COUNTS_QUERY,
+    PATIENT_VARIANT_PAGE_QUERY,
+)
+from .export import _export_records
+from .jobs import run_query_job
+from .kg import _stream_neo4j_query
+from .results import records_to_table
+from .variant_filters import _cypher_filter
 
 
 def update_api_keys():
@@ -284,6 +307,8 @@ def _rerun_query():
     Rerun the query using the modified query.
     """
     ss.generate_query = False
+    ss.query_from_cache = False
+    _first_page()
 
 
 def _regenerate_query():
@@ -291,34 +316,135 @@ def _regenerate_query():
     Regenerate the query using the new question.
     """
     ss.generate_query = True
+    _first_page()
 
 
-def _get_gene_data(gene_name):
+def _first_page():
     """
-    Get gene data from the API.
+    Show the first page of the query results.
+    """
+    ss.kg_page = 1
+
+
+def _query_gene_data(gene_name, job=None):
     """
-    _connect_to_neo4j()
+    Query a gene, its copy number alterations and its variants with separate
+    queries that run concurrently. The alteration queries aggregate the
+    samples of each alteration on the server, so the number of transferred
+    rows is the number of alterations (instead of the product of copy number
+    alterations and variant samples of a single query). Runs in a `QueryJob`
+    (see `components.jobs`), so it must not use the session state.
 
+    Returns:
+        Tuple of the gene node (None if the gene does not exist) and the
+        records of the copy number alterations and of the variants.
+    """
     gene_id = "hgnc:" + gene_name
 
-    result = ss.neodriver.query(
-        "MATCH (g:Gene) "
-        "WHERE g.id = $gene_id "
-        "OPTIONAL MATCH (g)<-[cn:SampleToGeneCopyNumberAlteration]-(cns:Sample)"
-        "OPTIONAL MATCH (g)<-[vn:VariantToGeneAssociation]-(v:SequenceVariant)<-[ss:SampleToVariantAssociation]-(vns:Sample)"
-        "RETURN g, cns, v, vns, "
-        "cn.id, cn.breaksInGene, cn.nMajor, cn.nMinor, cn.purifiedBaf, cn.purifiedLogR, cn.minPurifiedLogR, cn.maxPurifiedLogR, cn.purifiedLoh, "
-        "vn.id, "
-        "ss.id ",
-        gene_id=gene_id,
+    def run(query):
+        return list(
+            _stream_neo4j_query(
+                query, job=job, gene_id=gene_id, gene_ids=[gene_id]
+            )
+        )
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        gene, cnas, variants = executor.map(
+            run,
+            [
+                GENE_QUERY,
+                GENE_CNA_QUERY,
+                GENE_VARIANT_QUERY.format(variant_filter=""),
+            ],
+        )
+
+    return (gene[0]["g"] if gene else None), cnas, variants
+
+
+# columns of the copy number alteration and variant tables, as returned by the
+# gene queries
+CN_COLUMNS = [
+    "alteration_id",
+    "breaks_in_gene",
+    "n_major",
+    "n_minor",
+    "purified_baf",
+    "purified_logr",
+    "min_purified_logr",
+    "max_purified_logr",
+    "purified_loh",
+    "sample_ids",
+]
+VARIANT_COLUMNS = [
+    "alteration_id",
+    "mane",
+    "cadd_phred",
+    "aa_mane",
+    "func_mane",
+    "ex_func_mane",
+    "clnsig",
+    "clnrevstat",
+    "gnomad_max",
+    "ref",
+    "alt",
+    "pos",
+    "cosmic_total_occ",
+    "sample_ids",
+]
+
+
+@st.cache_resource(show_spinner=False)
+def _gene_cache():
+    """
+    The cache of gene tables, shared by all sessions.
+    """
+    return TTLCache(GENE_CACHE_SIZE, GENE_CACHE_TTL)
+
+
+def _get_gene_data(gene_name):
+    """
+    Get gene data, from the shared gene cache or by running the gene queries
+    in the background (see `_query_gene_data`). Cached genes are kept per
+    database and invalidated when its schema fingerprint changes.
+
+    Returns:
+        Tuple of whether the data is available (False while the queries run
+        or if they failed) and the data: None if the gene does not exist,
+        otherwise a tuple of the gene properties and the tables of copy
+        number alterations and variants.
+    """
+    database = (ss.get("db_ip"), ss.get("db_port"), ss.get("db_name"))
+    fingerprint = ss.get("schema_fingerprint")
+    missing = object()
+    data = _gene_cache().get(database, fingerprint, gene_name, missing)
+    if data is not missing:
+        return True, data
+
+    finished, gene_data = run_query_job(
+        "gene_query_job",
+        f"query for gene {gene_name}",
+        _query_gene_data,
+        gene_name,
     )
+    if not finished or gene_data is None:
+        return False, None
+
+    gene, cnas, variants = gene_data
+    data = None
+    if gene is not None:
+        data = (
+            dict(gene.items()),
+            _alteration_table(cnas, CN_COLUMNS),
+            _alteration_table(variants, VARIANT_COLUMNS),
+        )
+    _gene_cache().put(database, fingerprint, gene_name, data)
+    return True, data
 
-    if not result[0]:
-        return None, None
 
-    patterns = result[0]
-    # header: gene information (should be the same gene in all rows)
-    gene = patterns[0]["g"]
+def _show_gene_header(gene):
+    """
+    Show the header with the gene information.
+    """
     read_name = str(gene["id"]).replace("hgnc:", "")
     st.markdown(
         f"""
@@ -326,119 +452,270 @@ def _get_gene_data(gene_name):
                 chr: {gene['chr']}, start: {gene['start']}, end: {gene['end']}
                 """
     )
-    # format result as dataframe
-    # for each pattern, create row(s) in dataframe
-    cn_df = pd.DataFrame(
-        columns=[
-            "alteration_id",
-            "breaks_in_gene",
-            "n_major",
-            "n_minor",
-            "purified_baf",
-            "purified_logr",
-            "min_purified_logr",
-            "max_purified_logr",
-            "purified_loh",
-            "sample_id",
-        ]
+
+
+def _query_gene_list(gene_names, filters=(), job=None):
+    """
+    Query the copy number alterations and variants of a list of genes, in
+    chunks of `GENE_LIST_CHUNK_SIZE` genes per `UNWIND` query; the queries of
+    all chunks run concurrently. The variant filters (see
+    `components.variant_filters`) are applied by the variant query. Runs in a
+    `QueryJob` (see `components.jobs`), so it must not use the session state.
+
+    Returns:
+        Tuple of the records of the copy number alterations and of the
+        variants of all genes.
+    """
+    gene_ids = ["hgnc:" + gene_name for gene_name in gene_names]
+    chunks = [
+        gene_ids[i : i + GENE_LIST_CHUNK_SIZE]
+        for i in range(0, len(gene_ids), GENE_LIST_CHUNK_SIZE)
+    ]
+
+    variant_filter, params = _cypher_filter(filters)
+    variant_query = GENE_VARIANT_QUERY.format(variant_filter=variant_filter)
+
+    def run(query, chunk):
+        return list(
+            _stream_neo4j_query(query, job=job, gene_ids=chunk, **params)
+        )
+
+    with ThreadPoolExecutor(max_workers=min(4, 2 * len(chunks))) as executor:
+        cnas = executor.map(run, [GENE_CNA_QUERY] * len(chunks), chunks)
+        variants = executor.map(run, [variant_query] * len(chunks), chunks)
+        return (
+            [record for result in cnas for record in result],
+            [record for result in variants for record in result],
+        )
+
+
+def _get_gene_list_data(gene_names, key="gene_list_job", filters=()):
+    """
+    Get the combined tables of copy number alterations and variants of a list
+    of genes, with the gene of each alteration in the "gene" column, by
+    running the gene list queries in the background, as job `key`. Only
+    variants matching the variant filters are fetched.
+
+    Returns:
+        Tuple of whether the data is available (False while the queries run
+        or if they failed) and the two tables.
+    """
+    finished, records = run_query_job(
+        key,
+        f"query for {len(gene_names)} genes",
+        _query_gene_list,
+        tuple(gene_names),
+        filters,
     )
-    vn_df = pd.DataFrame(
-        columns=[
-            "alteration_id",
-            "mane",
-            "cadd_phred",
-            "aa_mane",
-            "func_mane",
-            "ex_func_mane",
-            "clnsig",
-            "clnrevstat",
-            "gnomad_max",
-            "ref",
-            "alt",
-            "pos",
-            "cosmic_total_occ",
-            "sample_id",
-        ]
+    if not finished or records is None:
+        return False, None
+
+    cnas, variants = records
+    return True, (
+        _alteration_table(cnas, ["gene", *CN_COLUMNS]),
+        _alteration_table(variants, ["gene", *VARIANT_COLUMNS]),
+    )
+
+
+def _query_patient_summary(patient_id, job=None):
+    """
+    Query the samples of a patient (whose ids are the patient id, or start
+    with it followed by "-", "_" or ".", so that P1 does not match P10) and
+    the numbers of their copy number alterations and variants, aggregated on
+    the server per chromosome and gene (and clinical significance of
+    variants), so that no alterations are transferred. Runs in a `QueryJob`
+    (see `components.jobs`), so it must not use the session state.
+
+    Returns:
+        Tuple of the sample ids and the records of the copy number alteration
+        and variant counts.
+    """
+    sample_ids = [
+        record["id"]
+        for record in _stream_neo4j_query(
+            PATIENT_SAMPLES_QUERY, job=job, patient_id=patient_id
+        )
+    ]
+    if not sample_ids:
+        return [], [], []
+
+    def run(query):
+        return list(_stream_neo4j_query(query, job=job, sample_ids=sample_ids))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        cna_counts, variant_counts = executor.map(
+            run, [PATIENT_CNA_COUNTS_QUERY, PATIENT_VARIANT_COUNTS_QUERY]
+        )
+
+    return sample_ids, cna_counts, variant_counts
+
+
+def _get_patient_summary(patient_id):
+    """
+    Get the samples of a patient and the counts of their alterations, by
+    running the patient summary queries in the background.
+
+    Returns:
+        Tuple of whether the data is available (False while the queries run
+        or if they failed) and the data: a tuple of the sample ids and the
+        tables of copy number alteration counts (per "chr" and "gene") and of
+        variant counts (per "chr", "gene" and "clnsig").
+    """
+    finished, summary = run_query_job(
+        "patient_summary_job",
+        f"summary of patient {patient_id}",
+        _query_patient_summary,
+        patient_id,
+    )
+    if not finished or summary is None:
+        return False, None
+
+    sample_ids, cna_counts, variant_counts = summary
+    return True, (
+        sample_ids,
+        _records_frame(cna_counts, ["chr", "gene", "n"]),
+        _records_frame(variant_counts, ["chr", "gene", "clnsig", "n"]),
+    )
+
+
+def _stream_patient_alterations(
+    kind,
+    sample_ids,
+    filters,
+    skip,
+    limit,
+    fetch_size=None,
+    job=None,
+    timeout=None,
+):
+    """
+    Stream the copy number alterations ("cna") or variants ("variant") of the
+    samples of a patient, filtered on the server by the "chr", "gene" and
+    (for variants) "clnsig" in `filters` (pairs of filter and value; None
+    values do not filter), skipping the first `skip` rows and up to `limit`
+    rows, with the `timeout` of `_stream_neo4j_query`.
+    """
+    filters = dict(filters)
+    gene = filters.get("gene")
+    query = PATIENT_CNA_PAGE_QUERY
+    if kind == "variant":
+        query = PATIENT_VARIANT_PAGE_QUERY
+    return _stream_neo4j_query(
+        query,
+        fetch_size=fetch_size,
+        job=job,
+        timeout=timeout,
+        sample_ids=list(sample_ids),
+        chr=filters.get("chr"),
+        gene_id=("hgnc:" + gene) if gene else None,
+        clnsig=filters.get("clnsig"),
+        skip=skip,
+        limit=limit,
     )
-    for pattern in patterns:
-        # get copy numbers
-        if pattern.get("cn.id") is not None:
-            if pattern["cn.id"] in cn_df["alteration_id"]:
-                pass
-            else:
-                cn_id = pattern["cn.id"]
-                cn_breaks = pattern["cn.breaksInGene"]
-                cn_n_major = pattern["cn.nMajor"]
-                cn_n_minor = pattern["cn.nMinor"]
-                cn_purified_baf = pattern["cn.purifiedBaf"]
-                cn_purified_logr = pattern["cn.purifiedLogR"]
-                cn_min_purified_logr = pattern["cn.minPurifiedLogR"]
-                cn_max_purified_logr = pattern["cn.maxPurifiedLogR"]
-                cn_purified_loh = pattern["cn.purifiedLoh"]
-                cns = pattern["cns"]["id"]
-                cn_df = cn_df.append(
-                    {
-                        "alteration_id": cn_id,
-                        "breaks_in_gene": cn_breaks,
-                        "n_major": cn_n_major,
-                        "n_minor": cn_n_minor,
-                        "purified_baf": cn_purified_baf,
-                        "purified_logr": cn_purified_logr,
-                        "min_purified_logr": cn_min_purified_logr,
-                        "max_purified_logr": cn_max_purified_logr,
-                        "purified_loh": cn_purified_loh,
-                        "sample_id": cns,
-                    },
-                    ignore_index=True,
-                )
-        # get variants
-        if pattern.get("vn.id") is not None:
-            if pattern["vn.id"] in list(vn_df["alteration_id"]):
-                pass
-            else:
-                vn_id = pattern["vn.id"]
-                v_mane = pattern["v"]["Gene.MANE"]
-                v_cadd = pattern["v"]["CADD_phred"]
-                aa_mane = pattern["v"]["AAChange.MANE"]
-                func_mane = pattern["v"]["Func.MANE"]
-                ex_func_mane = pattern["v"]["ExonicFunc.MANE"]
-                v_clnsig = pattern["v"]["CLNSIG"]
-                v_clnrevstat = pattern["v"]["CLNREVSTAT"]
-                v_gnomad_max = pattern["v"]["gnomAD_genome_max"]
-                v_ref = pattern["v"]["REF"]
-                v_alt = pattern["v"]["ALT"]
-                v_pos = pattern["v"]["POS"]
-                v_totocc = pattern["v"]["COSMIC_TOTAL_OCC"]
-                vns = pattern["vns"]["id"]
-                vn_df = vn_df.append(
-                    {
-                        "alteration_id": vn_id,
-                        "mane": v_mane,
-                        "cadd_phred": v_cadd,
-                        "aa_mane": aa_mane,
-                        "func_mane": func_mane,
-                        "ex_func_mane": ex_func_mane,
-                        "clnsig": v_clnsig,
-                        "clnrevstat": v_clnrevstat,
-                        "gnomad_max": v_gnomad_max,
-                        "ref": v_ref,
-                        "alt": v_alt,
-                        "pos": v_pos,
-                        "cosmic_total_occ": v_totocc,
-                        "sample_id": vns,
-                    },
-                    ignore_index=True,
-                )
-
-    # aggregate cn_df grouping samples in new column "sample_ids", drop
-    # "sample_id" and duplicate rows
-    cn_df["sample_ids"] = cn_df.groupby("alteration_id")["sample_id"].transform(
-        lambda x: ",".join(x)
+
+
+def _query_patient_page(kind, sample_ids, filters, page, page_size, job=None):
+    """
+    Fetch one page of the filtered alterations of a patient (see
+    `_stream_patient_alterations`); only the rows of the page are
+    transferred. Runs in a `QueryJob` (see `components.jobs`).
+
+    Returns:
+        The list of records of the page.
+    """
+    return list(
+        _stream_patient_alterations(
+            kind,
+            sample_ids,
+            filters,
+            page * page_size,
+            page_size,
+            fetch_size=page_size,
+            job=job,
+        )
     )
-    cn_df = cn_df.drop(columns=["sample_id"])
-    cn_df = cn_df.drop_duplicates()
 
-    return cn_df, vn_df
+
+def _export_patient_alterations(kind, sample_ids, filters, fmt, path, job=None):
+    """
+    Export all filtered alterations of a patient, up to `EXPORT_MAX_ROWS`
+    rows, as they arrive from the server (see `components.export`), with the
+    export timeout.
+    """
+    records = _stream_patient_alterations(
+        kind,
+        sample_ids,
+        filters,
+        0,
+        EXPORT_MAX_ROWS,
+        fetch_size=EXPORT_CHUNK_SIZE,
+        job=job,
+        timeout=KG_EXPORT_TIMEOUT,
+    )
+    return _export_records(records, fmt, path, job)
+
+
+def _get_patient_page(kind, sample_ids, filters, page, page_size):
+    """
+    Get one page of the alteration table of a patient (see
+    `_query_patient_page`), fetched in the background.
+
+    Returns:
+        Tuple of whether the page is available and its table.
+    """
+    finished, records = run_query_job(
+        "patient_page_job",
+        "query for the page of patient alterations",
+        _query_patient_page,
+        kind,
+        tuple(sample_ids),
+        tuple(sorted(filters.items())),
+        page,
+        page_size,
+    )
+    if not finished or records is None:
+        return False, None
+
+    return True, _records_frame(records)
+
+
+def _records_frame(records, columns=None):
+    """
+    Build a table from query records in one pass through their Arrow table
+    (see `components.results.records_to_table`).
+
+    Args:
+        records: The query records.
+
+        columns: The columns of the table, in order (by default, all columns
+            of the records); columns missing from the records are empty.
+
+    Returns:
+        DataFrame with one row per record.
+    """
+    df = records_to_table(records).to_pandas()
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    return df
+
+
+def _alteration_table(records, columns):
+    """
+    Build the table of one kind of alteration of one or more genes from the
+    records of its query, which have one row per alteration with the list of
+    its samples.
+
+    Returns:
+        DataFrame with one row per alteration, with the comma-separated ids of
+        its samples in "sample_ids".
+    """
+    rows = []
+    for record in records:
+        row = {column: record[column] for column in columns}
+        row["sample_ids"] = ",".join(map(str, row["sample_ids"]))
+        rows.append(row)
+
+    return _records_frame(rows, columns)
 
 
 def toggle_rag_agent_prompt():
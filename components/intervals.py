@@ -0,0 +1,158 @@
+# INTERVALS
+# per-chromosome interval index of the gene locations of a graph for region
+# queries
+import re
+
+import neo4j
+import numpy as np
+import streamlit as st
+from loguru import logger
+
+from .constants import GENE_LOCATIONS_QUERY
+from .kg import _stream_neo4j_query
+
+ss = st.session_state
+
+UNITS = {"": 1, "bp": 1, "kb": 1_000, "mb": 1_000_000}
+
+REGION = re.compile(
+    r"^(?:chr)?(?P<chr>[0-9]+|[xym]|mt)\s*:\s*"
+    r"(?P<start>[0-9][0-9,.]*)\s*(?P<start_unit>bp|kb|mb)?\s*[-–]\s*"
+    r"(?P<end>[0-9][0-9,.]*)\s*(?P<unit>bp|kb|mb)?$"
+)
+
+
+def _chromosome(name):
+    """
+    Normalise a chromosome name: "chr17", "Chr17" and "17" are all "17".
+    """
+    name = str(name).strip().upper()
+    if name.startswith("CHR"):
+        name = name[3:]
+    return "MT" if name == "M" else name
+
+
+def _position(text, unit):
+    text = text.replace(",", "")
+    return int(round(float(text) * UNITS[unit]))
+
+
+def parse_region(text):
+    """
+    Parse a genomic region like "chr17:7.6-7.7 Mb", "17:7,661,779-7,687,538"
+    or "chrX:100-200 kb"; a unit after the end applies to both positions.
+
+    Returns:
+        Tuple of the chromosome and the start and end positions (inclusive),
+        or None if the text is not a region.
+    """
+    match = REGION.match(text.strip().lower())
+    if match is None:
+        return None
+    unit = match["unit"] or ""
+    try:
+        start = _position(match["start"], match["start_unit"] or unit)
+        end = _position(match["end"], unit)
+    except ValueError:
+        # e.g., "7.6.1"
+        return None
+    if end < start:
+        return None
+    return _chromosome(match["chr"]), start, end
+
+
+class GeneIntervalIndex:
+    """
+    Gene locations per chromosome as arrays sorted by start position. Genes
+    overlapping a region start before its end and at most the longest gene
+    length before its start, so they are found by binary search on the start
+    positions and a vectorised comparison of the end positions of this
+    range.
+    """
+
+    def __init__(self, genes):
+        """
+        Args:
+            genes: Iterable of tuples of gene symbol, chromosome, start and
+                end position.
+        """
+        by_chromosome = {}
+        for gene, chromosome, start, end in genes:
+            by_chromosome.setdefault(_chromosome(chromosome), []).append(
+                (int(start), int(end), gene)
+            )
+
+        self.chromosomes = {}
+        for chromosome, locations in by_chromosome.items():
+            locations.sort()
+            starts = np.array([start for start, _, _ in locations])
+            ends = np.array([end for _, end, _ in locations])
+            self.chromosomes[chromosome] = (
+                starts,
+                ends,
+                np.array([gene for _, _, gene in locations], dtype=object),
+                int((ends - starts).max()),
+            )
+
+    def __len__(self):
+        return sum(len(starts) for starts, *_ in self.chromosomes.values())
+
+    def overlapping(self, chromosome, start, end):
+        """
+        Get the genes overlapping a region, ordered by start position.
+
+        Returns:
+            List of tuples of gene symbol, start and end position.
+        """
+        if _chromosome(chromosome) not in self.chromosomes:
+            return []
+        starts, ends, genes, max_length = self.chromosomes[
+            _chromosome(chromosome)
+        ]
+        first = np.searchsorted(starts, start - max_length, side="left")
+        last = np.searchsorted(starts, end, side="right")
+        hits = first + np.flatnonzero(ends[first:last] >= start)
+        return [
+            (genes[i], int(starts[i]), int(ends[i]))
+            for i in hits.tolist()
+        ]
+
+
+@st.cache_resource(max_entries=4, show_spinner="Loading gene locations ...")
+def _load_interval_index(database, fingerprint, _driver):
+    """
+    Load the locations of all genes of a database once per database and
+    schema, shared by all sessions. Failures raise, so that they are not
+    cached.
+    """
+    genes = [
+        (
+            str(record["id"]).removeprefix("hgnc:"),
+            record["chr"],
+            record["start"],
+            record["end"],
+        )
+        for record in _stream_neo4j_query(
+            GENE_LOCATIONS_QUERY, fetch_size=10000, driver=_driver
+        )
+    ]
+    return GeneIntervalIndex(genes)
+
+
+def _interval_index():
+    """
+    Get the gene interval index of the connected database.
+
+    Returns:
+        The index, or None if the gene locations could not be loaded (it is
+        loaded again on the next call).
+    """
+    try:
+        return _load_interval_index(
+            (ss.get("db_ip"), ss.get("db_port"), ss.get("db_name")),
+            ss.get("schema_fingerprint"),
+            ss.neodriver,
+        )
+    except (neo4j.exceptions.Neo4jError, neo4j.exceptions.DriverError) as e:
+        logger.error(f"Failed to load gene locations: {e}")
+        return None
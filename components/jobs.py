@@ -0,0 +1,193 @@
+# JOBS
+# database queries run in a shared worker pool, with timeout and cancellation
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import neo4j
+import streamlit as st
+from loguru import logger
+
+from .config import KG_QUERY_TIMEOUT, KG_QUERY_WORKERS
+
+ss = st.session_state
+
+# seconds between progress updates of a running query
+POLL_INTERVAL = 0.5
+
+
+class QueryJob:
+    """
+    A database query running in the worker pool. The worker only touches the
+    job (never the session state): it tags its transactions with the job id,
+    so that they can be terminated on the server, counts the received rows,
+    and stops reading as soon as the job is cancelled.
+    """
+
+    def __init__(self, label, args, driver, timeout):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.args = args
+        self.driver = driver
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.rows = 0
+        self.cancelled = False
+        self.future = None
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def query(self, query, timeout=None):
+        """
+        Wrap a query with the timeout (of the job by default, none if 0) and
+        the job id as transaction metadata.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        return neo4j.Query(
+            query, timeout=timeout or None, metadata={"job": self.id}
+        )
+
+
+@st.cache_resource(show_spinner=False)
+def _executor():
+    """
+    The worker pool shared by all sessions.
+    """
+    return ThreadPoolExecutor(
+        max_workers=KG_QUERY_WORKERS, thread_name_prefix="query"
+    )
+
+
+def _terminate(job):
+    """
+    Terminate the transactions of a job on the server, so that the database
+    stops working on an abandoned query.
+    """
+    try:
+        with job.driver.session(database=job.driver.current_db) as session:
+            ids = [
+                record["transactionId"]
+                for record in session.run(
+                    "SHOW TRANSACTIONS YIELD transactionId, metaData "
+                    "WHERE metaData.job = $job RETURN transactionId",
+                    job=job.id,
+                )
+            ]
+            if ids:
+                session.run("TERMINATE TRANSACTIONS $ids", ids=ids).consume()
+    except neo4j.exceptions.Neo4jError as e:
+        logger.error(f"Failed to terminate query {job.id}: {e}")
+
+
+def cancel_job(key):
+    """
+    Cancel the job stored under `key` in the session state.
+    """
+    job = ss.get(key)
+    if job is None or job.future.done():
+        return
+    job.cancelled = True
+    # jobs on other databases than Neo4j stop reading when cancelled
+    if not job.future.cancel() and job.driver is not None:
+        _terminate(job)
+
+
+def discard_job(key):
+    """
+    Cancel and forget the job stored under `key`, e.g., to run it again.
+    """
+    cancel_job(key)
+    ss.pop(key, None)
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def _job_progress(key):
+    """
+    Show the progress of a running job, with a button to cancel it, until it
+    finishes; then rerun the app to show the result.
+    """
+    job = ss.get(key)
+    if job is None or job.future.done():
+        st.rerun()
+    if job.timeout and job.elapsed() > job.timeout + 5:
+        # the server did not honour the timeout
+        cancel_job(key)
+
+    status = "Cancelling" if job.cancelled else "Running"
+    st.info(
+        f"{status} {job.label} ... {job.elapsed():.0f} s, "
+        f"{job.rows} rows received."
+    )
+    st.button(
+        "Cancel",
+        key=f"{key}_cancel",
+        on_click=cancel_job,
+        args=(key,),
+        disabled=job.cancelled,
+    )
+
+
+def run_query_job(key, label, fn, *args, timeout=None, driver=None):
+    """
+    Run `fn(*args, job=job)` in the shared worker pool, once per `args`, and
+    keep the job under `key` in the session state. While the job runs, its
+    progress and a cancel button are shown; a job with other arguments under
+    the same key is cancelled.
+
+    Args:
+        key: The session state key of the job.
+
+        label: Description of the query for the progress message.
+
+        fn: The query function; it receives the job as keyword argument and
+            must not use the session state.
+
+        args: The arguments of the query function.
+
+        timeout: The timeout of the query in seconds (`KG_QUERY_TIMEOUT` by
+            default, 0 for no timeout).
+
+        driver: The driver of the graph to query (the connected graph by
+            default).
+
+    Returns:
+        Tuple of whether the job has finished and its result; the result is
+        None if the job was cancelled or failed.
+    """
+    job = ss.get(key)
+    if job is None or job.args != args:
+        if job is not None:
+            cancel_job(key)
+        if timeout is None:
+            timeout = KG_QUERY_TIMEOUT
+        if driver is None:
+            driver = ss.get("neodriver")
+        job = QueryJob(label, args, driver, timeout)
+        job.future = _executor().submit(fn, *args, job=job)
+        ss[key] = job
+
+    if not job.future.done():
+        _job_progress(key)
+        return False, None
+
+    if job.cancelled:
+        st.warning(f"The {label} was cancelled.")
+    elif job.future.exception() is not None:
+        error = job.future.exception()
+        if "TransactionTimedOut" in str(getattr(error, "code", "")):
+            st.error(
+                f"The {label} took longer than {job.timeout} seconds and was "
+                "stopped. Please try a more specific query."
+            )
+        else:
+            logger.error(f"Query failed: {error}")
+            st.error(f"The {label} failed: {error}")
+    else:
+        return True, job.future.result()
+
+    st.button(
+        "Run again", key=f"{key}_rerun", on_click=discard_job, args=(key,)
+    )
+    return True, None
@@ -1,11 +1,29 @@
+import functools
+import hashlib
 import json
+import math
 import os
+import re
+from urllib.parse import urlsplit
 
+import neo4j
 import neo4j_utils as nu
 import streamlit as st
+from loguru import logger
+
+from .config import KG_GRAPHS, KG_MAX_ESTIMATED_ROWS, KG_QUERY_TIMEOUT
 
 ss = st.session_state
 
+# operators that typically make a query blow up
+EXPENSIVE_OPERATORS = {
+    "AllNodesScan",
+    "CartesianProduct",
+    "NodeByLabelScan",
+    "Expand(All)",
+    "VarLengthExpand(All)",
+}
+
 
 def _connect_to_neo4j():
     """
@@ -67,67 +85,415 @@ def _find_schema_info_node():
     Look for a schema info node in the connected BioCypher graph and load the
     schema info if present.
     """
-    result = ss.neodriver.query("MATCH (n:Schema_info) RETURN n LIMIT 1")
+    schema_dict, fingerprint = _load_schema_info(ss.neodriver)
 
-    if result[0]:
-        schema_info_node = result[0][0]["n"]
-        ss.schema_dict = json.loads(schema_info_node["schema_info"])
+    if schema_dict is not None:
+        ss.schema_dict = schema_dict
+        ss.schema_fingerprint = fingerprint
 
 
-def _summarise():
-    _connect_to_neo4j()
-    if not ss.get("summary_query"):
-        st.error("No summary query found.")
-        return
+def _load_schema_info(driver):
+    """
+    Load the schema info from the schema info node of a BioCypher graph.
+
+    Returns:
+        Tuple of the schema info dictionary and its fingerprint, or (None,
+        None) if the graph has no schema info node.
+    """
+    result = driver.query("MATCH (n:Schema_info) RETURN n LIMIT 1")
 
-    result = ss.neodriver.query(ss.get("summary_query"))
+    if not result[0]:
+        return None, None
+    schema_info = result[0][0]["n"]["schema_info"]
+    return json.loads(schema_info), _schema_fingerprint(schema_info)
 
-    ss["summary_query_result"] = result
 
+def _parse_graph_uri(uri):
+    """
+    Parse the URI of a registered graph, `bolt://[user:password@]host[:port]
+    [/database]`, into connection details. Missing credentials default to the
+    `NEO4J_USER` and `NEO4J_PASSWORD` environment variables.
+    """
+    parts = urlsplit(uri if "://" in uri else f"bolt://{uri}")
+    return {
+        "db_uri": f"{parts.scheme}://{parts.hostname}:{parts.port or 7687}",
+        "db_name": parts.path.strip("/") or "neo4j",
+        "db_user": parts.username or os.getenv("NEO4J_USER", "neo4j"),
+        "db_passwd": parts.password or os.getenv("NEO4J_PASSWORD", "neo4j"),
+    }
 
-def _summarise_individual(person):
-    _connect_to_neo4j()
-    if not ss.get("summary_query_individual"):
-        st.error("No individual summary query found.")
-        return
 
-    result = ss.neodriver.query(
-        ss.get("summary_query_individual").format(person=person)
-    )
+@functools.cache
+def _configured_graphs():
+    """
+    Parse the graphs of the `KG_GRAPHS` environment variable (`name=uri,
+    name=uri`) once; entries with an invalid URI or a duplicate name are
+    skipped.
+    """
+    graphs = {}
+    for entry in KG_GRAPHS.split(","):
+        if "=" not in entry:
+            continue
+        name, uri = (part.strip() for part in entry.split("=", 1))
+        if name in graphs:
+            logger.error(f"Graph {name} is configured twice in KG_GRAPHS.")
+            continue
+        try:
+            graphs[name] = _parse_graph_uri(uri)
+        except ValueError as e:
+            # e.g., a port that is not a number
+            logger.error(f"Invalid URI of graph {name} in KG_GRAPHS: {e}")
+    return graphs
 
-    ss["summary_query_result_individual"] = result
 
+def _registered_graphs():
+    """
+    Get the graphs registered for federated querying, in the `KG_GRAPHS`
+    environment variable and in the panel.
 
-def _plan_tasks():
-    _connect_to_neo4j()
-    if not ss.get("tasks_query"):
-        st.error("No tasks query found.")
-        return
+    Returns:
+        Dictionary of graph name to connection details.
+    """
+    graphs = dict(_configured_graphs())
+    graphs.update(ss.get("kg_graphs", {}))
+    return graphs
+
+
+def _register_graph(name, uri):
+    """
+    Register a graph for federated querying in this session.
+
+    Raises:
+        ValueError: If the URI is invalid (e.g., the port is not a number).
+    """
+    ss.setdefault("kg_graphs", {})[name] = _parse_graph_uri(uri)
 
-    result = ss.neodriver.query(ss.get("tasks_query"))
 
-    ss["tasks_query_result"] = result
+def _unregister_graph(name):
+    ss.get("kg_graphs", {}).pop(name, None)
+    ss.get("kg_graph_connections", {}).pop(name, None)
 
 
-def _plan_tasks_individual(person):
-    _connect_to_neo4j()
-    if not ss.get("tasks_query_individual"):
-        st.error("No individual tasks query found.")
+def _reset_graph_connections():
+    """
+    Forget the connections to the registered graphs, to connect again.
+    """
+    ss.pop("kg_graph_connections", None)
+
+
+def _connect_to_graphs():
+    """
+    Connect to the registered graphs and load their schema info, once per
+    session and connection details (see `_reset_graph_connections`).
+
+    Returns:
+        Dictionary of graph name to connection, with the "driver", the
+        "schema_dict" and its "fingerprint", and an "error" if the graph is
+        not reachable or has no schema info node.
+    """
+    connections = ss.setdefault("kg_graph_connections", {})
+    for name, details in _registered_graphs().items():
+        connection = connections.get(name)
+        if connection is not None and connection["details"] == details:
+            continue
+        driver = nu.Driver(**details)
+        connection = {
+            "details": details,
+            "driver": driver,
+            "schema_dict": None,
+            "fingerprint": None,
+            "error": None,
+        }
+        if driver.status == "no connection":
+            connection["error"] = "Could not connect to the database."
+        else:
+            schema_dict, fingerprint = _load_schema_info(driver)
+            connection["schema_dict"] = schema_dict
+            connection["fingerprint"] = fingerprint
+            if schema_dict is None:
+                connection["error"] = "The graph has no schema info node."
+        connections[name] = connection
+
+    return {
+        name: connections[name]
+        for name in _registered_graphs()
+        if name in connections
+    }
+
+
+def _schema_fingerprint(schema_info):
+    """
+    Get a short fingerprint of the schema info, which changes whenever the
+    schema (and thus the validity of anything derived from it) changes.
+    """
+    return hashlib.sha1(schema_info.encode()).hexdigest()[:16]
+
+
+def _stream_neo4j_query(
+    query,
+    max_rows=None,
+    fetch_size=None,
+    job=None,
+    driver=None,
+    timeout=None,
+    **params,
+):
+    """
+    Run cypher query against the Neo4j database and yield the records (as
+    `neo4j.Record`, keeping nodes and relationships intact) as they arrive;
+    records are fetched from the server in batches of `fetch_size`.
+    After `max_rows` records, the rest of the result is discarded on the
+    server without being transferred. The transaction is terminated by the
+    server after `timeout` seconds (`KG_QUERY_TIMEOUT` by default, 0 for no
+    timeout).
+
+    If run as part of a `QueryJob` (see `components.jobs`), the driver and
+    (by default) the timeout of the job are used instead of the session
+    state, received rows are counted for the progress display, and reading
+    stops when the job is cancelled. Other graphs than the connected one can
+    be queried by passing their `driver`.
+    """
+    if job is not None and job.cancelled:
         return
+    if driver is None:
+        driver = job.driver if job is not None else ss.neodriver
+    with driver.session(
+        database=driver.current_db,
+        fetch_size=fetch_size or 1000,
+        default_access_mode=neo4j.READ_ACCESS,
+    ) as session:
+        if job is not None:
+            query = job.query(query, timeout)
+        else:
+            if timeout is None:
+                timeout = KG_QUERY_TIMEOUT
+            query = neo4j.Query(query, timeout=timeout or None)
+        result = session.run(query, **params)
+        for i, record in enumerate(result):
+            if max_rows is not None and i >= max_rows:
+                break
+            if job is not None:
+                if job.cancelled:
+                    break
+                job.rows += 1
+            yield record
+
 
-    result = ss.neodriver.query(
-        ss.get("tasks_query_individual").format(person=person)
+def _timed_out(error):
+    """
+    Check whether a query failed because its transaction timed out.
+    """
+    return "TransactionTimedOut" in (error.code or "")
+
+
+def _plan_operators(plan):
+    """
+    Yield the operators of an execution plan (as returned by the server) with
+    their estimated number of rows.
+    """
+    args = plan.get("args") or plan.get("arguments") or {}
+    yield (
+        plan.get("operatorType", "").split("@")[0],
+        args.get("EstimatedRows", 0),
     )
+    for child in plan.get("children") or []:
+        yield from _plan_operators(child)
+
+
+def _explain_neo4j_query(query, driver=None):
+    """
+    Estimate the cost of a cypher query with `EXPLAIN`, without running it,
+    on the connected graph or the graph of `driver`.
+
+    Returns:
+        Dictionary with the largest estimated number of rows of any operator
+        ("estimated_rows"), the operators of the plan ("operators"), and the
+        reasons not to run the query without confirmation ("warnings");
+        None if the query could not be planned.
+    """
+    if driver is None:
+        driver = ss.neodriver
+    try:
+        with driver.session(
+            database=driver.current_db,
+            default_access_mode=neo4j.READ_ACCESS,
+        ) as session:
+            summary = session.run(f"EXPLAIN {_subquery(query)}").consume()
+    except neo4j.exceptions.Neo4jError as e:
+        logger.error(f"Failed to explain query: {e}")
+        return None
+    if not summary.plan:
+        return None
+
+    operators = list(_plan_operators(summary.plan))
+    estimated_rows = int(max(rows for _, rows in operators))
+    warnings = []
+    if estimated_rows > KG_MAX_ESTIMATED_ROWS:
+        expensive = sorted(
+            {
+                name
+                for name, rows in operators
+                if name in EXPENSIVE_OPERATORS
+                and rows > KG_MAX_ESTIMATED_ROWS
+            }
+        )
+        warnings.append(
+            f"The database estimates {estimated_rows:,} intermediate rows "
+            f"(limit: {KG_MAX_ESTIMATED_ROWS:,})"
+            + (f", caused by {', '.join(expensive)}" if expensive else "")
+            + "."
+        )
+
+    return {
+        "estimated_rows": estimated_rows,
+        "operators": [name for name, _ in operators],
+        "warnings": warnings,
+    }
+
+
+def _limit_query(query, row_cap):
+    """
+    Add a `LIMIT` to a read query that returns rows without one, so that the
+    server stops after `row_cap` rows even when the query is run as is.
+    Queries with `UNION` or without a final `RETURN` are left unchanged.
+    """
+    query = _subquery(query)
+    if re.search(r"\bUNION\b", query, re.IGNORECASE):
+        return query
+    last_return = list(re.finditer(r"\bRETURN\b", query, re.IGNORECASE))
+    if not last_return:
+        return query
+    tail = query[last_return[-1].end() :]
+    if re.search(r"\bLIMIT\b", tail, re.IGNORECASE) or re.search(
+        r"[}]", tail
+    ):
+        return query
+    return f"{query}\nLIMIT {row_cap}"
+
+
+def _subquery(query):
+    """
+    Strip a query for use in a `CALL { ... }` subquery.
+    """
+    return query.strip().rstrip(";")
+
+
+def _count_neo4j_rows(query, row_cap, job=None):
+    """
+    Count the rows of the result of a cypher query, up to `row_cap`, without
+    transferring them. Queries that are not usable as subquery (e.g., with
+    unaliased expressions in their `RETURN`) are streamed and their rows
+    counted instead.
+
+    Returns:
+        The number of rows (at most `row_cap`), or None if the query failed.
+
+    Raises:
+        neo4j.exceptions.ClientError: If the query timed out.
+    """
+    try:
+        result = list(
+            _stream_neo4j_query(
+                f"CALL {{ {_subquery(query)} }} "
+                "WITH 1 AS row LIMIT $row_cap "
+                "RETURN count(row) AS n",
+                job=job,
+                row_cap=row_cap,
+            )
+        )
+        return result[0]["n"] if result else None
+    except neo4j.exceptions.ClientError as e:
+        if _timed_out(e):
+            raise
+        # not usable as subquery; count the rows of the original query
+        pass
+    except neo4j.exceptions.Neo4jError as e:
+        logger.error(f"Failed to count query results: {e}")
+        return None
+
+    try:
+        return sum(
+            1 for _ in _stream_neo4j_query(query, max_rows=row_cap, job=job)
+        )
+    except neo4j.exceptions.Neo4jError as e:
+        if _timed_out(e):
+            raise
+        logger.error(f"Failed to count query results: {e}")
+        return None
+
+
+def _fetch_neo4j_page(query, page, page_size, row_cap, job=None):
+    """
+    Fetch one page of the result of a cypher query, only transferring the rows
+    of that page. Rows beyond `row_cap` are not accessible.
+
+    Args:
+        query: The cypher query.
+
+        page: The page number, starting at 0.
+
+        page_size: The number of rows per page.
+
+        row_cap: The maximum number of rows of the result.
 
-    ss["tasks_query_result_individual"] = result
+        job: The `QueryJob` this fetch runs in, if any.
 
+    Returns:
+        The list of records of the page, or None if the query failed.
 
-def _run_neo4j_query(query):
+    Raises:
+        neo4j.exceptions.ClientError: If the query timed out.
     """
-    Run cypher query against the Neo4j database.
+    skip = page * page_size
+    limit = max(0, min(page_size, row_cap - skip))
+    try:
+        return list(
+            _stream_neo4j_query(
+                f"CALL {{ {_subquery(query)} }} "
+                "RETURN * SKIP $skip LIMIT $limit",
+                fetch_size=page_size,
+                job=job,
+                skip=skip,
+                limit=limit,
+            )
+        )
+    except neo4j.exceptions.ClientError as e:
+        if _timed_out(e):
+            raise
+        # not usable as subquery (e.g., write clauses); stream the original
+        # query up to the end of the page instead
+        pass
+    except neo4j.exceptions.Neo4jError as e:
+        logger.error(f"Failed to fetch query results: {e}")
+        return None
+
+    try:
+        records = list(
+            _stream_neo4j_query(
+                query, max_rows=skip + limit, fetch_size=page_size, job=job
+            )
+        )
+    except neo4j.exceptions.Neo4jError as e:
+        if _timed_out(e):
+            raise
+        logger.error(f"Failed to fetch query results: {e}")
+        return None
+
+    return records[skip:]
+
+
+def _query_neo4j_page(query, page, page_size, row_cap, n_rows=None, job=None):
     """
-    _connect_to_neo4j()
+    Fetch a page of the result of a cypher query (see `_fetch_neo4j_page`)
+    together with the number of rows of the result, which is only counted if
+    not given. Pages beyond the last page are clamped to the last page.
 
-    result = ss.neodriver.query(query)
+    Returns:
+        Tuple of the records of the page and the number of rows.
+    """
+    if n_rows is None:
+        n_rows = _count_neo4j_rows(query, row_cap, job=job)
+    if n_rows:
+        page = min(page, math.ceil(n_rows / page_size) - 1)
 
-    return result
+    return _fetch_neo4j_page(query, page, page_size, row_cap, job=job), n_rows
@@ -1,29 +1,166 @@
+import math
+import re
+
+import numpy as np
+import pandas as pd
 import streamlit as st
 
 ss = st.session_state
 
+from components.cohort import (
+    ALTERATIONS,
+    _get_cohort_matrix,
+    _rebuild_cohort_matrix,
+)
+from components.config import COHORT_TOP_GENES, PATIENT_PAGE_SIZE
+from components.export import export_query_button, export_table_button
 from components.handlers import (
+    _export_patient_alterations,
     _get_gene_data,
+    _get_gene_list_data,
+    _get_patient_page,
+    _get_patient_summary,
+    _show_gene_header,
+)
+from components.gene_index import _gene_index
+from components.intervals import _interval_index, parse_region
+from components.kg import _connect_to_neo4j
+from components.panels.kg import display_connection_status
+from components.variant_filters import (
+    CLINVAR_SIGNIFICANCE,
+    EXONIC_FUNCTIONS,
+    _apply_variant_filters,
+    variant_filters,
 )
 
 
 def genetics_panel():
-    gene, patient = st.tabs(["Gene view", "Patient view"])
+    filters = variant_filter_controls()
+    gene, gene_list, region, patient, cohort = st.tabs(
+        ["Gene view", "Gene list", "Region", "Patient view", "Cohort"]
+    )
 
     with gene:
-        gene_panel()
+        gene_panel(filters)
+
+    with gene_list:
+        gene_list_panel(filters)
+
+    with region:
+        region_panel(filters)
 
     with patient:
-        st.text_input("Enter patient ID:", key="patient_id")
+        patient_panel()
+
+    with cohort:
+        cohort_panel()
+
+
+def variant_filter_controls():
+    """
+    Show the variant filters of the gene, gene list and region views.
+
+    Returns:
+        The active filters (see `components.variant_filters`).
+    """
+    with st.expander("Variant filters"):
+        cadd, gnomad = st.columns([1, 1])
+        with cadd:
+            cadd_min = st.number_input(
+                "Minimum CADD phred score:",
+                min_value=0.0,
+                value=None,
+                step=5.0,
+                key="filter_cadd_min",
+            )
+        with gnomad:
+            gnomad_max = st.number_input(
+                "Maximum gnomAD allele frequency:",
+                min_value=0.0,
+                max_value=1.0,
+                value=None,
+                step=0.001,
+                format="%.4f",
+                key="filter_gnomad_max",
+            )
+        clnsig = st.multiselect(
+            "ClinVar significance (any of):",
+            CLINVAR_SIGNIFICANCE,
+            key="filter_clnsig",
+        )
+        ex_func = st.multiselect(
+            "Exonic function:", EXONIC_FUNCTIONS, key="filter_ex_func"
+        )
+    return variant_filters(cadd_min, gnomad_max, clnsig, ex_func)
 
 
-def gene_panel():
-    gene_name = st.text_input("Enter gene name (case-insensitive):")
+def gene_known(symbol):
+    """
+    Check a gene symbol against the gene index of the database, without a
+    query; for unknown symbols, suggest completions or similar symbols.
+    """
+    index = _gene_index()
+    if index is None or not len(index) or symbol in index:
+        # without index, let the query decide
+        return True
+
+    suggestions = index.suggest(symbol)
+    if not suggestions:
+        st.write("No data found for this gene.")
+        return False
+
+    st.write(f"Unknown gene symbol {symbol}. Did you mean:")
+    for column, suggestion in zip(
+        st.columns(len(suggestions)), suggestions
+    ):
+        column.button(
+            suggestion,
+            key=f"gene_suggestion_{suggestion}",
+            on_click=choose_gene,
+            args=(suggestion,),
+        )
+    return False
+
+
+def neo4j_connected():
+    """
+    Connect to Neo4j once per session, the connection is kept; show the
+    connection error if the database cannot be reached.
+    """
+    driver = ss.get("neodriver")
+    if driver is not None and driver.status != "no connection":
+        return True
+    if _connect_to_neo4j():
+        return True
+    display_connection_status(False, "Neo4j")
+    return False
+
+
+def choose_gene(symbol):
+    ss.gene_name = symbol
+
+
+def gene_panel(filters=()):
+    gene_name = st.text_input(
+        "Enter gene name (case-insensitive):", key="gene_name"
+    )
 
     # if input, show table
     if gene_name:
+        if not neo4j_connected():
+            return
+        if not gene_known(gene_name.strip().upper()):
+            return
         # get data
-        cn_df, vn_df = _get_gene_data(gene_name.upper())
+        available, gene_data = _get_gene_data(gene_name.strip().upper())
+        if not available:
+            return
+        cn_df, vn_df = None, None
+        if gene_data is not None:
+            gene, cn_df, vn_df = gene_data
+            # the cached table holds all variants of the gene
+            vn_df = _apply_variant_filters(vn_df, filters)
+            _show_gene_header(gene)
 
         cnas = 0
         vnas = 0
@@ -52,7 +189,435 @@ def gene_panel():
         if cn_df is not None:
             st.markdown("#### Copy Number Alterations")
             st.dataframe(cn_df, hide_index=False)
+            export_table_button(
+                "gene_cna_export", f"{gene_name.strip()}_cnas", cn_df
+            )
 
         if vn_df is not None:
             st.markdown("#### Sequence Variants")
             st.dataframe(vn_df, hide_index=False)
+            export_table_button(
+                "gene_variant_export", f"{gene_name.strip()}_variants", vn_df
+            )
+
+
+def parse_gene_list(text):
+    """
+    Get the unique gene symbols of a pasted or uploaded gene list, separated
+    by whitespace, commas or semicolons, in their order of appearance.
+    """
+    symbols = re.split(r"[\s,;]+", text.upper())
+    return list(dict.fromkeys(symbol for symbol in symbols if symbol))
+
+
+def gene_list_panel(filters=()):
+    text = st.text_area(
+        "Enter gene names (case-insensitive), separated by spaces, commas or "
+        "new lines:",
+        key="gene_list",
+    )
+    uploaded = st.file_uploader(
+        "Or upload a gene list:", type=["txt", "csv", "tsv"], key="gene_file"
+    )
+    if uploaded is not None:
+        text += "\n" + uploaded.getvalue().decode("utf-8", errors="ignore")
+
+    gene_names = parse_gene_list(text)
+    if not gene_names:
+        return
+
+    if not neo4j_connected():
+        return
+
+    index = _gene_index()
+    if index is not None and len(index):
+        unknown = [symbol for symbol in gene_names if symbol not in index]
+        if unknown:
+            st.warning(
+                f"{len(unknown)} unknown gene symbols are ignored: "
+                + ", ".join(unknown)
+            )
+        gene_names = [symbol for symbol in gene_names if symbol in index]
+        if not gene_names:
+            return
+
+    show_gene_list_alterations(gene_names, "gene_list_job", filters)
+
+
+def show_gene_list_alterations(gene_names, key, filters=()):
+    """
+    Show the combined alteration tables of a list of genes, queried in the
+    background as job `key`, with the variants matching the filters.
+    """
+    available, gene_list_data = _get_gene_list_data(gene_names, key, filters)
+    if not available:
+        return
+    cn_df, vn_df = gene_list_data
+
+    st.markdown(
+        f"{len(gene_names)} genes: {cn_df.shape[0]} CNAs in "
+        f"{cn_df['gene'].nunique()} genes, {vn_df.shape[0]} variants in "
+        f"{vn_df['gene'].nunique()} genes."
+    )
+
+    name = key.removesuffix("_job")
+    st.markdown("#### Copy Number Alterations")
+    st.dataframe(cn_df, hide_index=False)
+    export_table_button(f"{name}_cna_export", f"{name}_cnas", cn_df)
+
+    st.markdown("#### Sequence Variants")
+    st.dataframe(vn_df, hide_index=False)
+    export_table_button(f"{name}_variant_export", f"{name}_variants", vn_df)
+
+
+def region_panel(filters=()):
+    text = st.text_input(
+        "Enter genomic region (e.g., chr17:7.6-7.7 Mb):", key="region"
+    )
+    if not text:
+        return
+    region = parse_region(text)
+    if region is None:
+        st.write(
+            "Please enter a region as chromosome:start-end, e.g., "
+            "chr17:7661779-7687538 or chr17:7.6-7.7 Mb."
+        )
+        return
+
+    if not neo4j_connected():
+        return
+    index = _interval_index()
+    if index is None:
+        st.error("Could not load the gene locations. Please try again.")
+        return
+    chromosome, start, end = region
+    genes = index.overlapping(chromosome, start, end)
+    if not genes:
+        st.write("No genes found in this region.")
+        return
+
+    st.markdown(
+        f"### Region: chr{chromosome}:{start:,}-{end:,} ({len(genes)} genes)"
+    )
+    st.dataframe(
+        pd.DataFrame(genes, columns=["gene", "start", "end"]),
+        hide_index=True,
+    )
+    show_gene_list_alterations(
+        [gene for gene, _, _ in genes], "region_job", filters
+    )
+
+
+def first_patient_page():
+    ss.patient_page = 1
+
+
+def choose_chromosome():
+    # the gene options depend on the chromosome
+    ss.patient_gene = None
+    first_patient_page()
+
+
+def filter_label(value):
+    return "All" if value is None else str(value)
+
+
+def reset_patient_filters():
+    for key in ["patient_chr", "patient_gene", "patient_clnsig"]:
+        ss.pop(key, None)
+    first_patient_page()
+
+
+def patient_panel():
+    patient_id = st.text_input(
+        "Enter patient ID:",
+        key="patient_id",
+        on_change=reset_patient_filters,
+        help=(
+            "The samples of the patient have the patient ID, or the ID "
+            'followed by "-", "_" or "." as sample ID (e.g., P1-T1).'
+        ),
+    )
+    if not patient_id:
+        return
+
+    if not neo4j_connected():
+        return
+    available, summary = _get_patient_summary(patient_id.strip())
+    if not available:
+        return
+    sample_ids, cna_counts, variant_counts = summary
+    if not sample_ids:
+        st.write("No samples found for this patient.")
+        return
+
+    st.markdown(f"### Patient: {patient_id.strip()}")
+    st.markdown(
+        f"{len(sample_ids)} samples ({', '.join(sample_ids)}): "
+        f"{cna_counts['n'].sum()} CNAs, {variant_counts['n'].sum()} variants."
+    )
+    show_patient_overview(cna_counts, variant_counts)
+    show_patient_alterations(sample_ids, cna_counts, variant_counts)
+
+
+def show_patient_overview(cna_counts, variant_counts):
+    """
+    Show the alteration counts of a patient per chromosome, clinical
+    significance and gene, from the counts aggregated on the server.
+    """
+    per_chromosome = pd.DataFrame(
+        {
+            "CNAs": cna_counts.groupby("chr")["n"].sum(),
+            "variants": variant_counts.groupby("chr")["n"].sum(),
+        }
+    ).fillna(0)
+    st.markdown("#### Alterations per chromosome")
+    st.bar_chart(per_chromosome)
+
+    significance, genes = st.columns([1, 1])
+    with significance:
+        st.markdown("#### Variants per clinical significance")
+        st.dataframe(
+            variant_counts.fillna({"clnsig": "unknown"})
+            .groupby("clnsig")["n"]
+            .sum()
+            .sort_values(ascending=False)
+        )
+    with genes:
+        st.markdown("#### Genes with most variants")
+        st.dataframe(variant_counts.groupby("gene")["n"].sum().nlargest(10))
+
+
+def show_patient_alterations(sample_ids, cna_counts, variant_counts):
+    """
+    Show one page of the copy number alterations or variants of a patient,
+    filtered by chromosome, gene and clinical significance. The filters and
+    the page are applied by the query, so only the rows of the page are
+    fetched; the number of rows comes from the aggregated counts.
+    """
+    kind = st.radio(
+        "Alterations:",
+        ["Sequence variants", "Copy number alterations"],
+        horizontal=True,
+        key="patient_kind",
+        on_change=first_patient_page,
+    )
+    variants = kind == "Sequence variants"
+    counts = variant_counts if variants else cna_counts
+
+    columns = st.columns(3 if variants else 2)
+    with columns[0]:
+        chromosome = st.selectbox(
+            "Chromosome:",
+            [None, *sorted(counts["chr"].dropna().unique(), key=str)],
+            format_func=filter_label,
+            key="patient_chr",
+            on_change=choose_chromosome,
+        )
+    if chromosome is not None:
+        counts = counts[counts["chr"] == chromosome]
+    with columns[1]:
+        genes = counts.groupby("gene")["n"].sum().sort_values(ascending=False)
+        gene = st.selectbox(
+            "Gene:",
+            [None, *genes.index],
+            format_func=filter_label,
+            key="patient_gene",
+            on_change=first_patient_page,
+        )
+    if gene is not None:
+        counts = counts[counts["gene"] == gene]
+    filters = {"chr": chromosome, "gene": gene}
+    if variants:
+        with columns[2]:
+            clnsig = st.selectbox(
+                "Clinical significance:",
+                [None, *sorted(counts["clnsig"].dropna().unique())],
+                format_func=filter_label,
+                key="patient_clnsig",
+                on_change=first_patient_page,
+            )
+        if clnsig is not None:
+            counts = counts[counts["clnsig"] == clnsig]
+        filters["clnsig"] = clnsig
+
+    n_rows = int(counts["n"].sum())
+    if not n_rows:
+        st.write("No alterations found.")
+        return
+
+    kind = "variant" if variants else "cna"
+    page, page_size = patient_pages(n_rows)
+    available, table = _get_patient_page(
+        kind, sample_ids, filters, page - 1, page_size
+    )
+    if available:
+        st.dataframe(table, hide_index=True)
+
+    # all filtered alterations, not only the page
+    export_query_button(
+        "patient_export",
+        f"patient_{kind}s",
+        _export_patient_alterations,
+        kind,
+        tuple(sample_ids),
+        tuple(sorted(filters.items())),
+    )
+
+
+def patient_pages(n_rows):
+    """
+    Show the page selection of the patient alterations.
+
+    Returns:
+        Tuple of the page (starting at 1) and the page size.
+    """
+    page_size = ss.get("patient_page_size", PATIENT_PAGE_SIZE)
+    pages = max(1, math.ceil(n_rows / page_size))
+    if ss.get("patient_page", 1) > pages:
+        ss.patient_page = pages
+    page = ss.get("patient_page", 1)
+
+    st.caption(
+        f"Rows {(page - 1) * page_size + 1}–{min(n_rows, page * page_size)} "
+        f"of {n_rows}."
+    )
+    rows, pager = st.columns([1, 1])
+    with rows:
+        sizes = sorted({25, 50, 100, 250, 1000, PATIENT_PAGE_SIZE})
+        st.selectbox(
+            "Rows per page:",
+            options=sizes,
+            index=sizes.index(page_size),
+            key="patient_page_size",
+            on_change=first_patient_page,
+        )
+    with pager:
+        st.number_input(
+            f"Page (of {pages}):",
+            min_value=1,
+            max_value=pages,
+            key="patient_page",
+        )
+    return page, page_size
+
+
+def alteration_label(flags):
+    return ", ".join(
+        name for flag, name in ALTERATIONS.items() if flags & flag
+    )
+
+
+def cohort_panel():
+    # the export reads all alterations, so only run it on request
+    if not st.toggle("Show cohort overview", key="cohort_view"):
+        return
+
+    if not neo4j_connected():
+        return
+    available, matrix = _get_cohort_matrix()
+    if not available:
+        return
+
+    st.caption(
+        f"{len(matrix.genes)} genes altered in {len(matrix.samples)} samples "
+        f"({len(matrix.values)} altered gene-sample pairs)."
+    )
+    st.button(
+        "Export again",
+        key="cohort_rebuild",
+        help="Export the alterations again after the graph was updated.",
+        on_click=_rebuild_cohort_matrix,
+    )
+
+    text = st.text_area(
+        "Genes (by default, the most frequently altered genes):",
+        key="cohort_genes",
+    )
+    genes = parse_gene_list(text) or list(
+        matrix.altered_samples().nlargest(COHORT_TOP_GENES).index
+    )
+    samples = st.multiselect(
+        "Samples (by default, all):", matrix.samples, key="cohort_samples"
+    )
+    alterations = st.multiselect(
+        "Alterations:",
+        list(ALTERATIONS.values()),
+        default=list(ALTERATIONS.values()),
+        key="cohort_alterations",
+    )
+    shown = sum(
+        flag for flag, name in ALTERATIONS.items() if name in alterations
+    )
+
+    table = matrix.slice(genes, samples) & shown
+    altered = table != 0
+    if not altered.values.any():
+        st.write("No alterations found.")
+        return
+    show_oncoprint(table)
+    export_table_button(
+        "cohort_export",
+        "cohort_alterations",
+        table.rename_axis("gene").reset_index(),
+    )
+
+    st.markdown("#### Altered samples per gene")
+    st.dataframe(
+        altered.sum(axis=1).rename("samples").sort_values(ascending=False)
+    )
+
+
+def show_oncoprint(table):
+    """
+    Show the alterations of genes (rows) in samples (columns) as oncoprint:
+    genes ordered by the number of altered samples, and samples ordered by
+    the genes altered in them, so that co-occurrence and mutual exclusivity
+    are visible.
+    """
+    altered = table != 0
+    table = table.loc[altered.sum(axis=1).sort_values(ascending=False).index]
+    presence = (table != 0).values
+    # samples altered in the first gene first, then in the second gene, ...
+    order = np.lexsort(presence[::-1])[::-1]
+    samples = list(table.columns[order])
+
+    rows, columns = np.nonzero(table.values)
+    cells = pd.DataFrame(
+        {
+            "gene": table.index[rows],
+            "sample": table.columns[columns],
+            "alteration": [
+                alteration_label(flags) for flags in table.values[rows, columns]
+            ],
+        }
+    )
+
+    st.vega_lite_chart(
+        cells,
+        {
+            "mark": "rect",
+            "height": 20 * len(table),
+            "encoding": {
+                "x": {
+                    "field": "sample",
+                    "type": "nominal",
+                    "sort": samples,
+                    "scale": {"domain": samples},
+                    "axis": {"labels": len(samples) <= 100},
+                },
+                "y": {
+                    "field": "gene",
+                    "type": "nominal",
+                    "sort": list(table.index),
+                },
+                "color": {"field": "alteration", "type": "nominal"},
+                "tooltip": [
+                    {"field": "gene"},
+                    {"field": "sample"},
+                    {"field": "alteration"},
+                ],
+            },
+        },
+        use_container_width=True,
+    )
@@ -1,17 +1,73 @@
+import copy
+import functools
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from biochatter.prompts import BioCypherPromptEngine
 import streamlit as st
+from components.config import (
+    KG_PAGE_SIZE,
+    KG_QUERY_WORKERS,
+    KG_ROW_CAP,
+    POSTGRES_SCHEMA_INFO_TABLE,
+)
 from components.handlers import (
     _regenerate_query,
     _rerun_query,
+    _first_page,
+)
+from components.answer import result_digest, synthesise_answer
+from components.digest import _fork_conversation
+from components.jobs import discard_job, run_query_job
+from components.examples import (
+    find_examples,
+    generate_query_from_examples,
+    record_example,
+)
+from components.query_cache import (
+    cache_query,
+    evict_query,
+    get_cached_query,
+)
+from components.postgres import (
+    INSTALL_HINT,
+    _connect_to_postgres,
+    _determine_postgres_connection,
+    _export_postgres_query,
+    _fetch_postgres_page,
+    _query_postgres_page,
+    psycopg,
+)
+from components.export import _export_neo4j_query, export_query_button
+from components.results import records_to_table
+from components.schema import (
+    format_projection,
+    project_schema,
+    prune_projection,
 )
 from components.kg import (
-    _run_neo4j_query,
+    _connect_to_graphs,
     _connect_to_neo4j,
     _determine_neo4j_connection,
+    _explain_neo4j_query,
+    _fetch_neo4j_page,
+    _limit_query,
+    _query_neo4j_page,
+    _register_graph,
+    _registered_graphs,
+    _reset_graph_connections,
+    _schema_fingerprint,
+    _stream_neo4j_query,
+    _unregister_graph,
 )
 
 ss = st.session_state
 
+# result of a query that is still running
+QUERY_RUNNING = object()
+
 def display_info():
     """Display introductory information about the KG panel."""
     st.markdown(
@@ -35,6 +91,22 @@ def setup_dbms_connection(dbms_select, connection, auth, connection_status, sche
             on_change=_regenerate_query,
         )
 
+    if dbms_type == "PostgreSQL":
+        setup_postgres_connection(connection, auth)
+    else:
+        setup_neo4j_connection(connection, auth)
+
+    with auth:
+        success = handle_connection(dbms_type)
+    with connection_status:
+        display_connection_status(success, dbms_type)
+    with schema_status:
+        display_schema_status(dbms_type)
+    
+    return dbms_type, success
+
+def setup_neo4j_connection(connection, auth):
+    """Set up the connection UI for Neo4j."""
     with connection:
         ip, port = st.columns(2)
         _determine_neo4j_connection()
@@ -49,18 +121,30 @@ def setup_dbms_connection(dbms_select, connection, auth, connection_status, sche
         with password:
             st.text_input("Password:", key="db_password")
 
-        success = handle_connection(dbms_type)
-    with connection_status:
-        display_connection_status(success, dbms_type)
-    with schema_status:
-        display_schema_status()
-    
-    return dbms_type, success
+def setup_postgres_connection(connection, auth):
+    """Set up the connection UI for PostgreSQL."""
+    with connection:
+        host, port, dbname = st.columns(3)
+        _determine_postgres_connection()
+        with host:
+            st.text_input("Database host:", key="pg_host")
+        with port:
+            st.text_input("Database port:", key="pg_port")
+        with dbname:
+            st.text_input("Database name:", key="pg_dbname")
+    with auth:
+        user, password = st.columns(2)
+        with user:
+            st.text_input("Username:", key="pg_user")
+        with password:
+            st.text_input("Password:", key="pg_password", type="password")
 
 def handle_connection(dbms_type):
     """Handle database connection based on type."""
     if dbms_type == "Neo4j":
         return _connect_to_neo4j()
+    if dbms_type == "PostgreSQL":
+        return _connect_to_postgres()
     return False
 
 def display_connection_status(success, dbms_type):
@@ -76,20 +160,39 @@ def display_connection_status(success, dbms_type):
                 on_click=_connect_to_neo4j,
                 use_container_width=True,
             )
+        elif dbms_type == "PostgreSQL":
+            if psycopg is None:
+                st.error(INSTALL_HINT)
+            else:
+                st.error(
+                    "Could not connect to the database. Please check your "
+                    "connection settings."
+                )
         else:
             st.error(
                 "This database type is not yet supported. Please select "
-                "Neo4j."
+                "Neo4j or PostgreSQL."
             )
+    elif dbms_type == "PostgreSQL":
+        st.success(
+            f"Connected to PostgreSQL database {ss.get('pg_dbname')} at "
+            f"{ss.get('pg_host')}."
+        )
     else:
         st.success(f"Connected to Neo4j database at {ss.get('db_ip')}.")
 
-def display_schema_status():
+def display_schema_status(dbms_type):
     """Display schema loading status."""
     if ss.get("schema_dict"):
         st.success(
             "Schema configuration loaded from graph!"
         )
+    elif dbms_type == "PostgreSQL":
+        st.error(
+            "Please provide a BioCypher PostgreSQL export with a schema info "
+            f"table (`{POSTGRES_SCHEMA_INFO_TABLE}`), using the BioCypher "
+            "method `write_schema_info(as_node=True)`."
+        )
     else:
         st.error(
             "Please provide a graph with a schema info node, using the "
@@ -102,69 +205,418 @@ def handle_query(dbms_type):
         "Enter your question here:",
         on_change=_regenerate_query,
     )
+    st.checkbox(
+        "Fast query generation (in one step, from previous successful "
+        "queries for similar questions)",
+        key="fast_query_generation",
+        on_change=_regenerate_query,
+    )
 
     if question:
-        prompt_engine = create_prompt_engine()
+        prompt_engine = create_prompt_engine(question)
         result = generate_and_execute_query(prompt_engine, dbms_type, question)
-        display_query_results(result)
+        display_query_results(result, question, dbms_type)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _schema_prompt_engine(schema_fingerprint, backend, _schema_dict):
+    """
+    Build the prompt engine once per schema and conversation backend; the
+    schema-derived entities and relationships are shared by all reruns and
+    sessions. Not to be used directly, since it holds the state of the last
+    question; see `create_prompt_engine`.
+    """
+    return BioCypherPromptEngine(
+        schema_config_or_info_dict=copy.deepcopy(_schema_dict),
+        model_name=backend[1] or "gpt-3.5-turbo",
+    )
 
-def create_prompt_engine():
-    """Create BioCypherPromptEngine instance."""
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _schema_projection(schema_fingerprint, _prompt_engine):
+    """
+    Compute the compact projection of the schema once per schema.
+    """
+    return project_schema(
+        _prompt_engine.entities, _prompt_engine.relationships
+    )
+
+def cached_prompt_engine(schema_dict=None, fingerprint=None):
+    """
+    Get the cached prompt engine of the current schema (or of the given
+    schema of another graph) and conversation backend, together with the
+    schema fingerprint.
+    """
+    conversation = ss.get("conversation")
+    backend = (
+        type(conversation).__name__,
+        getattr(conversation, "model_name", None),
+    )
+    if schema_dict is None:
+        schema_dict = ss.schema_dict
+        fingerprint = ss.get("schema_fingerprint")
+    fingerprint = fingerprint or _schema_fingerprint(
+        json.dumps(schema_dict, sort_keys=True)
+    )
+    return fingerprint, _schema_prompt_engine(
+        fingerprint, backend, schema_dict
+    )
+
+def create_prompt_engine(question=None, schema_dict=None, fingerprint=None):
+    """
+    Create BioCypherPromptEngine instance for a new question from the cached
+    engine of the current schema (or of the given schema of another graph),
+    keeping its preprocessed schema. If a question is given, the engine only
+    sees the part of the schema that is relevant to the question.
+    """
     def conversation_factory():
         if ss.get("conversation"):
             return ss.conversation
 
-    return BioCypherPromptEngine(
-        schema_config_or_info_dict=ss.schema_dict,
-        conversation_factory=conversation_factory,
-    )
+    fingerprint, cached = cached_prompt_engine(schema_dict, fingerprint)
+    engine = copy.copy(cached)
+    if question:
+        projection = prune_projection(
+            _schema_projection(fingerprint, cached), question
+        )
+        engine.entities = {
+            name: cached.entities[name] for name in projection["nodes"]
+        }
+        engine.relationships = {
+            name: cached.relationships[name] for name in projection["edges"]
+        }
+    # per-question state
+    engine.conversation_factory = conversation_factory
+    engine.question = ""
+    engine.selected_entities = []
+    engine.selected_relationships = []
+    engine.selected_relationship_labels = {}
+    engine.selected_properties = {}
+    engine.rel_directions = {}
+
+    return engine
+
+def report_generation_error(error):
+    """
+    Show why a query could not be generated.
+
+    Raises:
+        AttributeError: If the error is not caused by the API key.
+    """
+    if isinstance(error, AttributeError):
+        if "object has no attribute 'chat'" not in str(error):
+            raise error
+        st.error(
+            "Your API key may not be configured correctly. Please check your API key settings."
+        )
+        return
+    error_msg = str(error)
+    if "Entity selection failed" in error_msg:
+        st.error(
+            "Failed to identify relevant entities in your question. Please try to rephrase your "
+            "question to be more specific about which entities you're interested in."
+        )
+    elif "Relationship selection failed" in error_msg:
+        st.error(
+            "Failed to identify relationships between entities in your question. Please try to "
+            "rephrase your question to be more specific about how entities are connected."
+        )
+    elif "Property selection failed" in error_msg:
+        st.error(
+            "Failed to identify which properties you're interested in. Please try to rephrase your "
+            "question to be more specific about what information you want to know about the entities "
+            "or relationships."
+        )
+    else:
+        st.error(f"An unexpected error occurred: {error_msg}")
 
 def generate_and_execute_query(prompt_engine, dbms_type, question):
     """Generate and execute query based on question."""
     if ss.get("generate_query"):
-        with st.spinner("Generating query ..."):
+        cached = get_cached_query(
+            question, ss.get("schema_fingerprint"), dbms_type
+        )
+        if cached:
+            ss.current_query = cached
+            ss.query_from_cache = True
+            ss.generate_query = False
+
+    if ss.get("generate_query") and ss.get("fast_query_generation"):
+        examples = find_examples(
+            question, ss.get("schema_fingerprint"), dbms_type
+        )
+        if examples:
+            with st.spinner("Generating query from examples ..."):
+                try:
+                    ss.current_query = generate_query_from_examples(
+                        prompt_engine, question, examples, dbms_type
+                    )
+                except (AttributeError, ValueError) as e:
+                    report_generation_error(e)
+                    return None
             if dbms_type == "Neo4j":
+                ss.current_query = _limit_query(ss.current_query, KG_ROW_CAP)
+            ss.query_from_cache = False
+            ss.generate_query = False
+
+    if ss.get("generate_query"):
+        with st.spinner("Generating query ..."):
+            if dbms_type in ("Neo4j", "PostgreSQL"):
                 try:
                     ss.current_query = prompt_engine.generate_query(
                         question, dbms_type
                     )
-                except AttributeError as e:
-                    if "object has no attribute 'chat'" in str(e):
-                        st.error(
-                            "Your API key may not be configured correctly. Please check your API key settings."
-                        )
-                        return None
-                    raise e
-                except ValueError as e:
-                    error_msg = str(e)
-                    if "Entity selection failed" in error_msg:
-                        st.error(
-                            "Failed to identify relevant entities in your question. Please try to rephrase your "
-                            "question to be more specific about which entities you're interested in."
+                    if dbms_type == "Neo4j":
+                        ss.current_query = _limit_query(
+                            ss.current_query, KG_ROW_CAP
                         )
-                    elif "Relationship selection failed" in error_msg:
-                        st.error(
-                            "Failed to identify relationships between entities in your question. Please try to "
-                            "rephrase your question to be more specific about how entities are connected."
-                        )
-                    elif "Property selection failed" in error_msg:
-                        st.error(
-                            "Failed to identify which properties you're interested in. Please try to rephrase your "
-                            "question to be more specific about what information you want to know about the entities "
-                            "or relationships."
-                        )
-                    else:
-                        st.error(f"An unexpected error occurred: {error_msg}")
+                    ss.query_from_cache = False
+                except (AttributeError, ValueError) as e:
+                    report_generation_error(e)
                     return None
+            # only generate again if the question changes
+            ss.generate_query = False
 
     if dbms_type == "Neo4j":
-        return _run_neo4j_query(ss.current_query)
+        if not query_cost_accepted(ss.current_query):
+            return (None, None)
+        result = run_neo4j_query_page(ss.current_query)
+        if result is not QUERY_RUNNING:
+            remember_query_outcome(
+                question, dbms_type, ss.current_query, result[0]
+            )
+        return result
     elif dbms_type == "PostgreSQL":
-        return [("Here would be a result if we had a PostgreSQL implementation.")]
+        result = run_postgres_query_page(ss.current_query)
+        remember_query_outcome(question, dbms_type, ss.current_query, result[0])
+        return result
     elif dbms_type == "ArangoDB":
-        return [("Here would be a result if we had an ArangoDB implementation.")]
+        return ("Here would be a result if we had an ArangoDB implementation.", None)
+
+def query_cost_accepted(query, driver=None, key="kg", graph=None):
+    """
+    Check the estimated cost of a query with `EXPLAIN` before running it, once
+    per query. If it exceeds the threshold, warn and only accept the query
+    once the user confirms it.
+
+    Args:
+        query: The cypher query.
+
+        driver: The driver of the graph to query (the connected graph by
+            default).
+
+        key: The prefix of the session state keys of the check, one per
+            graph.
+
+        graph: The name of the graph, for the warning.
+    """
+    if ss.get(f"{key}_explained_query") != query:
+        ss[f"{key}_query_cost"] = _explain_neo4j_query(query, driver)
+        ss[f"{key}_explained_query"] = query
+
+    cost = ss[f"{key}_query_cost"]
+    if not cost or not cost["warnings"]:
+        return True
+    if ss.get(f"{key}_confirmed_query") == query:
+        return True
+
+    subject = f"The query for graph {graph}" if graph else "This query"
+    st.warning(
+        f"{subject} was not run, since it may be very expensive: "
+        + " ".join(cost["warnings"])
+        + " Please refine the question or the query (e.g., add missing "
+        "relationships between the nodes), or run it anyway."
+    )
+    st.button(
+        "Run anyway",
+        key=f"{key}_run_anyway",
+        on_click=confirm_query,
+        args=(query, key),
+    )
+    return False
+
+def confirm_query(query, key="kg"):
+    """Accept running a query despite its estimated cost."""
+    ss[f"{key}_confirmed_query"] = query
+
+def run_neo4j_query_page(query):
+    """
+    Fetch the current page of the query result, and the (capped) number of
+    rows of the result, which is only counted once per query. The query runs
+    in the background, showing its progress and a cancel button.
+
+    Returns:
+        Tuple of the records of the page and the number of rows, or
+        `QUERY_RUNNING` if the query has not finished yet.
+    """
+    n_rows = None
+    if ss.get("kg_counted_query") == query:
+        n_rows = ss.kg_row_count
+
+    finished, result = run_query_job(
+        "kg_query_job",
+        "knowledge graph query",
+        functools.partial(_query_neo4j_page, n_rows=n_rows),
+        query,
+        ss.get("kg_page", 1) - 1,
+        ss.get("kg_page_size", KG_PAGE_SIZE),
+        KG_ROW_CAP,
+    )
+    if not finished:
+        return QUERY_RUNNING
+    if result is None:
+        return (None, None)
 
-def display_query_results(result):
+    records, ss.kg_row_count = result
+    ss.kg_counted_query = query
+    return records, ss.kg_row_count
+
+def run_postgres_query_page(query):
+    """
+    Fetch the current page of the SQL query result, and the (capped) number
+    of rows of the result, which is only counted once per query.
+
+    Returns:
+        Tuple of the records of the page and the number of rows.
+    """
+    n_rows = None
+    if ss.get("kg_counted_query") == query:
+        n_rows = ss.kg_row_count
+
+    records, ss.kg_row_count = _query_postgres_page(
+        query,
+        ss.get("kg_page", 1) - 1,
+        ss.get("kg_page_size", KG_PAGE_SIZE),
+        KG_ROW_CAP,
+        n_rows,
+    )
+    ss.kg_counted_query = query
+    return records, ss.kg_row_count
+
+def remember_query_outcome(question, dbms_type, query, records):
+    """
+    Cache the query of a question only once it ran without error, and store
+    it as example for fast generation if it returned results, once per
+    question and query. A failing query is evicted from the cache, so that
+    it is generated again next time.
+    """
+    fingerprint = ss.get("schema_fingerprint")
+    if records is None:
+        if ss.get("cached_query") == (question, query):
+            ss.pop("cached_query")
+        evict_query(question, fingerprint, dbms_type)
+        return
+    if ss.get("cached_query") != (question, query):
+        cache_query(question, fingerprint, dbms_type, query)
+        ss.cached_query = (question, query)
+    if records and ss.get("recorded_example") != (question, query):
+        record_example(question, fingerprint, dbms_type, query)
+        ss.recorded_example = (question, query)
+
+def regenerate_cached_query(question, dbms_type):
+    """Discard the cached query for the question and generate it again."""
+    evict_query(question, ss.get("schema_fingerprint"), dbms_type)
+    ss.query_from_cache = False
+    _regenerate_query()
+
+def display_result_pages(n_rows):
+    """Display the result size and the page selection."""
+    page_size = ss.get("kg_page_size", KG_PAGE_SIZE)
+    pages = max(1, math.ceil(n_rows / page_size))
+    if ss.get("kg_page", 1) > pages:
+        ss.kg_page = pages
+    page = ss.get("kg_page", 1)
+
+    size = f"{n_rows}"
+    if n_rows >= KG_ROW_CAP:
+        size = f"at least {KG_ROW_CAP} (only the first {KG_ROW_CAP} are shown)"
+    st.caption(
+        f"Rows {min(n_rows, (page - 1) * page_size + 1)}–"
+        f"{min(n_rows, page * page_size)} of {size}."
+    )
+
+    rows, pager = st.columns([1, 1])
+    with rows:
+        sizes = sorted({10, 25, 50, 100, 250, KG_PAGE_SIZE})
+        st.selectbox(
+            "Rows per page:",
+            options=sizes,
+            index=sizes.index(page_size),
+            key="kg_page_size",
+            on_change=_first_page,
+        )
+    with pager:
+        st.number_input(
+            f"Page (of {pages}):",
+            min_value=1,
+            max_value=pages,
+            key="kg_page",
+        )
+
+def display_result_records(result):
+    """Display the records of the current page of the query result."""
+    try:
+        if isinstance(result[0], list) and result[0]:
+            st.dataframe(
+                records_to_table(result[0]), use_container_width=True
+            )
+        elif result[0]:
+            st.write(result[0])
+        else:
+            st.error("No results to display.")
+    except TypeError:
+        st.error("No results to display.")
+    else:
+        if result[1]:
+            display_result_pages(result[1])
+
+def display_result_download(dbms_type, query):
+    """Offer the download of the whole query result."""
+    if dbms_type == "PostgreSQL":
+        export_query_button(
+            "kg_export",
+            "query_result",
+            _export_postgres_query,
+            ss.pgpool,
+            query,
+        )
+    else:
+        export_query_button(
+            "kg_export", "query_result", _export_neo4j_query, query
+        )
+
+def fetch_all_rows(dbms_type, query):
+    """Fetch the rows of the query result, up to the row cap."""
+    if dbms_type == "PostgreSQL":
+        return _fetch_postgres_page(query, 0, KG_ROW_CAP, KG_ROW_CAP) or []
+    return _fetch_neo4j_page(query, 0, KG_ROW_CAP, KG_ROW_CAP) or []
+
+def display_answer(question, query, fetch_records, capped):
+    """
+    Offer to answer the question in natural language from the query result,
+    which is passed to the LLM as a digest of bounded size (column statistics
+    and sample rows) instead of in full. The answer is kept per question and
+    query.
+    """
+    st.markdown("### Answer")
+    key = (question, query)
+    if ss.get("kg_answer_key") != key:
+        if not st.button("Answer the question from the results"):
+            return
+        with st.spinner("Answering the question ..."):
+            digest, stats = result_digest(fetch_records(), capped)
+            ss.kg_answer = synthesise_answer(
+                ss.conversation, question, query, digest
+            )
+        ss.kg_answer_stats = stats
+        ss.kg_answer_key = key
+
+    st.markdown(ss.kg_answer)
+    stats = ss.kg_answer_stats
+    st.caption(
+        f"Answered from the statistics of {stats['rows']} rows and a sample "
+        f"of {stats['sampled']} rows."
+    )
+
+def display_query_results(result, question, dbms_type):
     """Display query results and schema info."""
     st.text_area(
         "Generated query (modify to rerun):",
@@ -172,17 +624,329 @@ def display_query_results(result):
         height=200,
         on_change=_rerun_query,
     )
+    if ss.get("query_from_cache"):
+        st.caption("This query was generated earlier for the same question.")
+        st.button(
+            "Generate again",
+            on_click=regenerate_cached_query,
+            args=(question, dbms_type),
+        )
 
     st.markdown("### Results")
-    try:
-        if result[0]:
-            st.write(result[0])
-    except TypeError:
-        st.error("No results to display.")
+    if result is QUERY_RUNNING:
+        st.caption("Waiting for the query to finish ...")
+    else:
+        display_result_records(result)
+        # None if the query could not be generated
+        if result is not None and isinstance(result[0], list) and result[0]:
+            display_result_download(dbms_type, ss.current_query)
+            display_answer(
+                question,
+                ss.current_query,
+                functools.partial(fetch_all_rows, dbms_type, ss.current_query),
+                (result[1] or 0) >= KG_ROW_CAP,
+            )
 
     if ss.get("schema_dict"):
         st.markdown("### Schema Info")
-        st.write(ss.schema_dict)
+        projection = _schema_projection(*cached_prompt_engine())
+        st.code(format_projection(projection), language=None)
+        if st.checkbox("Show full schema info"):
+            st.json(ss.schema_dict, expanded=False)
+
+def display_graph_registry():
+    """
+    Display the graphs registered for federated querying, and allow
+    registering more graphs in this session.
+    """
+    st.checkbox(
+        "Ask all graphs: generate a query for each graph from its own schema, "
+        "run them at the same time, and merge the results",
+        key="federated_query",
+    )
+    graphs = _registered_graphs()
+    if graphs:
+        for name, details in graphs.items():
+            name_col, uri_col, remove_col = st.columns([1, 3, 1])
+            name_col.write(name)
+            uri_col.write(f"{details['db_uri']}/{details['db_name']}")
+            remove_col.button(
+                "Remove",
+                key=f"remove_graph_{name}",
+                on_click=_unregister_graph,
+                args=(name,),
+                disabled=name not in ss.get("kg_graphs", {}),
+            )
+        st.button("Reconnect", on_click=_reset_graph_connections)
+    else:
+        st.caption(
+            "No further graphs registered. Register graphs below or with the "
+            "`KG_GRAPHS` environment variable."
+        )
+
+    name_col, uri_col = st.columns([1, 3])
+    with name_col:
+        st.text_input("Graph name:", key="new_graph_name")
+    with uri_col:
+        st.text_input(
+            "Graph URI (bolt://[user:password@]host[:port][/database]):",
+            key="new_graph_uri",
+        )
+    st.button(
+        "Register graph",
+        on_click=add_graph,
+        disabled=not (ss.get("new_graph_name") and ss.get("new_graph_uri")),
+    )
+    if ss.get("new_graph_error"):
+        st.error(ss.new_graph_error)
+
+def add_graph():
+    """Register the graph entered in the registry."""
+    name = ss.new_graph_name.strip()
+    if name == ss.get("db_name", "neo4j"):
+        ss.new_graph_error = (
+            f"{name} is the name of the connected graph; please choose "
+            "another name."
+        )
+        return
+    try:
+        _register_graph(name, ss.new_graph_uri.strip())
+    except ValueError as e:
+        ss.new_graph_error = f"Invalid graph URI: {e}"
+        return
+    ss.pop("new_graph_error", None)
+    ss.new_graph_name = ""
+    ss.new_graph_uri = ""
+
+def federated_graphs():
+    """
+    Get the graphs to ask in federated mode: the connected graph and the
+    registered graphs that could be connected. A registered graph with the
+    name of the connected graph is not used, since results are labelled by
+    graph name.
+
+    Returns:
+        Tuple of the usable graphs (name -> driver, schema_dict, fingerprint)
+        and the errors of the unusable ones (name -> error).
+    """
+    primary = ss.get("db_name", "neo4j")
+    graphs = {
+        primary: {
+            "driver": ss.neodriver,
+            "schema_dict": ss.schema_dict,
+            "fingerprint": ss.get("schema_fingerprint"),
+        }
+    }
+    errors = {}
+    for name, connection in _connect_to_graphs().items():
+        if name == primary:
+            errors[name] = (
+                "The connected graph has the same name; please register the "
+                "graph under another name."
+            )
+        elif connection["error"]:
+            errors[name] = connection["error"]
+        else:
+            graphs[name] = connection
+    return graphs, errors
+
+def generate_graph_query(question, name, engine, query):
+    """
+    Generate (unless cached) the query for one graph of a federated question.
+    Runs in a worker thread, so it must not use the session state.
+
+    Returns:
+        Dictionary with the "graph" name, the "query", whether it was
+        "generated", the "seconds" taken, and the "error", if any; the
+        "records" and the total "seconds" are filled in once the query ran
+        (see `run_graph_queries`).
+    """
+    start = time.monotonic()
+    result = {
+        "graph": name,
+        "query": query,
+        "generated": query is None,
+        "records": None,
+        "error": None,
+    }
+    try:
+        if query is None:
+            result["query"] = _limit_query(
+                engine.generate_query(question, "Neo4j"), KG_ROW_CAP
+            )
+    except Exception as e:
+        # one failing graph must not fail the others
+        result["error"] = str(e)
+    result["generation_seconds"] = time.monotonic() - start
+    result["seconds"] = result["generation_seconds"]
+    return result
+
+def generate_federated_queries(question, graphs):
+    """
+    Generate the queries of a question across several graphs: one query per
+    graph is generated from that graph's schema (each with its own copy of
+    the conversation), all at the same time.
+
+    Returns:
+        List of the results of each graph (see `generate_graph_query`).
+    """
+    tasks = []
+    for name, graph in graphs.items():
+        engine = create_prompt_engine(
+            question, graph["schema_dict"], graph["fingerprint"]
+        )
+        if ss.get("conversation"):
+            conversation = _fork_conversation(ss.conversation)
+            engine.conversation_factory = lambda c=conversation: c
+        query = get_cached_query(question, graph["fingerprint"], "Neo4j")
+        tasks.append((question, name, engine, query))
+
+    with st.spinner(f"Generating queries for {len(tasks)} graphs ..."):
+        with ThreadPoolExecutor(
+            max_workers=min(KG_QUERY_WORKERS, len(tasks))
+        ) as executor:
+            return list(
+                executor.map(lambda t: generate_graph_query(*t), tasks)
+            )
+
+def fetch_graph_records(query, job=None):
+    """
+    Run the query of one graph of a federated question, up to `KG_ROW_CAP`
+    rows, in a `QueryJob` on the driver of that graph.
+
+    Returns:
+        Tuple of the records and the seconds taken.
+    """
+    start = time.monotonic()
+    records = list(_stream_neo4j_query(query, max_rows=KG_ROW_CAP, job=job))
+    return records, time.monotonic() - start
+
+def run_graph_queries(question, graphs, results):
+    """
+    Run the generated query of each graph as a background job on that
+    graph's driver, after checking its estimated cost on that graph, so that
+    all graphs are queried at the same time, each with the query timeout.
+    The records of each graph are stored in its result; queries are cached
+    and recorded as examples once they ran.
+
+    Returns:
+        Whether all queries have finished or were not run.
+    """
+    finished_all = True
+    for result in results:
+        name = result["graph"]
+        if result["query"] is None or name not in graphs:
+            continue
+        if result["error"] is not None and "job" not in result:
+            # generation failed
+            continue
+        graph = graphs[name]
+        if not query_cost_accepted(
+            result["query"], graph["driver"], f"federated_{name}", name
+        ):
+            continue
+        key = f"federated_job_{name}"
+        finished, output = run_query_job(
+            key,
+            f"query of graph {name}",
+            fetch_graph_records,
+            result["query"],
+            driver=graph["driver"],
+        )
+        if not finished:
+            finished_all = False
+            continue
+        if result.get("job") == ss[key].id:
+            continue
+        result["job"] = ss[key].id
+        if output is None:
+            job = ss[key]
+            result["error"] = (
+                "The query was cancelled."
+                if job.cancelled
+                else str(job.future.exception())
+            )
+            if not result["generated"]:
+                evict_query(question, graph["fingerprint"], "Neo4j")
+            continue
+        result["records"], seconds = output
+        result["error"] = None
+        result["seconds"] = result["generation_seconds"] + seconds
+        if result["generated"]:
+            cache_query(
+                question, graph["fingerprint"], "Neo4j", result["query"]
+            )
+        if result["records"]:
+            record_example(
+                question, graph["fingerprint"], "Neo4j", result["query"]
+            )
+    return finished_all
+
+def merge_results(results):
+    """
+    Merge the records of all graphs into one list, with the graph each record
+    comes from as first column.
+    """
+    return [
+        {"graph": result["graph"], **dict(record.items())}
+        for result in results
+        if result["records"]
+        for record in result["records"]
+    ]
+
+def handle_federated_query():
+    """Handle a question asked across all graphs."""
+    question = st.text_input("Enter your question for all graphs here:")
+    graphs, errors = federated_graphs()
+    for name, error in errors.items():
+        st.warning(f"Graph {name} is not used: {error}")
+    if not question:
+        return
+
+    if ss.get("federated_question") != question:
+        ss.federated_results = generate_federated_queries(question, graphs)
+        ss.federated_question = question
+    results = ss.federated_results
+    if not run_graph_queries(question, graphs, results):
+        return
+
+    st.markdown("### Results")
+    st.caption(" · ".join(map(graph_summary, results)))
+    merged = merge_results(results)
+    if merged:
+        st.dataframe(records_to_table(merged), use_container_width=True)
+        display_answer(
+            question,
+            tuple(r["query"] for r in results),
+            lambda: merged,
+            any(len(r["records"] or []) >= KG_ROW_CAP for r in results),
+        )
+    else:
+        st.error("No results to display.")
+
+    for result in results:
+        with st.expander(f"Query for {result['graph']}"):
+            if result["query"]:
+                st.code(result["query"], language="cypher")
+            if result["error"]:
+                st.error(result["error"])
+    st.button("Ask again", on_click=ask_again)
+
+def graph_summary(result):
+    """Summarise the outcome of the query of one graph."""
+    if result["error"]:
+        outcome = "failed"
+    elif result["records"] is None:
+        outcome = "not run"
+    else:
+        outcome = f"{len(result['records'])} rows"
+    return f"{result['graph']}: {outcome} in {result['seconds']:.1f} s"
+
+def ask_again():
+    """Generate and run the queries of the federated question again."""
+    ss.pop("federated_question", None)
+    for key in [key for key in ss if key.startswith("federated_job_")]:
+        discard_job(key)
 
 def kg_panel():
     """
@@ -195,5 +959,12 @@ def kg_panel():
     connection_status, schema_status = st.columns([2, 2])
     dbms_type, success = setup_dbms_connection(dbms_select, connection, auth, connection_status, schema_status)
 
+    if dbms_type == "Neo4j" and success:
+        with st.expander("Federated querying of several graphs"):
+            display_graph_registry()
+
     if success and ss.get("schema_dict"):
-        handle_query(dbms_type)
\ No newline at end of file
+        if dbms_type == "Neo4j" and ss.get("federated_query"):
+            handle_federated_query()
+        else:
+            handle_query(dbms_type)
\ No newline at end of file
@@ -1,14 +1,9 @@
 import streamlit as st
-import json
 
 ss = st.session_state
 
-from components.kg import (
-    _summarise,
-    _summarise_individual,
-    _plan_tasks,
-    _plan_tasks_individual,
-)
+from components.config import DIGEST_TOKEN_BUDGET
+from components.digest import generate_digests, GROUP
 
 from components.constants import (
     SUMMARY_INSTRUCTION,
@@ -22,6 +17,85 @@ from components.constants import (
 )
 
 
+NO_RESULTS = (
+    "No results from query. Please check the database or query for errors."
+)
+
+
+def _size_caption(stats):
+    """
+    Describe the prompt size of the project data sent to the LLM.
+    """
+    if stats.get("unchanged_since"):
+        return (
+            "No changes in the project data since "
+            f"{stats['unchanged_since']}; showing the previous response."
+        )
+    saved = 100 * (1 - stats["compact_tokens"] / stats["json_tokens"])
+    if stats.get("changes_since"):
+        return (
+            f"Changes since {stats['changes_since']}: "
+            f"~{stats['compact_tokens']} tokens (~{stats['json_tokens']} for "
+            f"all project data as JSON, {saved:.0f}% saved)."
+        )
+    return (
+        f"Project data: ~{stats['compact_tokens']} tokens "
+        f"(~{stats['json_tokens']} as JSON, {saved:.0f}% saved)."
+    )
+
+
+def _show_digest(title, msg, stats=None):
+    """
+    Display a digest with the prompt size of its data.
+    """
+    st.markdown(f"## {title}\n\n{msg}")
+    if stats:
+        st.caption(_size_caption(stats))
+
+
+def _single_digest(kind, key, group, members):
+    """
+    Generate a single digest and store it, and the prompt size statistics of
+    its data, in the session state under `key` and `key`_stats.
+    """
+    for _, msg, stats in generate_digests(kind, group=group, members=members):
+        if msg:
+            ss[key] = msg
+            ss[f"{key}_stats"] = stats
+        else:
+            st.error(NO_RESULTS)
+
+
+def _all_digests(kind, key, spinner_text, generate):
+    """
+    Generate the digests for the group and all team members concurrently,
+    rendering each one as soon as it is ready, or show the previously generated
+    ones. The group digest is always shown first.
+    """
+    if generate:
+        ss[key] = {}
+        group_slot = st.container()
+        with st.spinner(spinner_text):
+            for label, msg, stats in generate_digests(kind):
+                if not msg:
+                    st.error(f"{label}: {NO_RESULTS}")
+                    continue
+                ss[key][label] = (msg, stats)
+                if label == GROUP:
+                    with group_slot:
+                        _show_digest(GROUP, msg, stats)
+                else:
+                    _show_digest(label, msg, stats)
+        return
+
+    digests = ss.get(key, {})
+    if GROUP in digests:
+        _show_digest(GROUP, *digests[GROUP])
+    for label, (msg, stats) in digests.items():
+        if label != GROUP:
+            _show_digest(label, msg, stats)
+
+
 def summary_panel():
     if not ss.get("summary_query"):
         ss["summary_query"] = SUMMARY_QUERY
@@ -73,62 +147,44 @@ demonstration purposes of this use case, this functionality is not implemented.
     with group:
         summarise = st.button(
             "Summarise for the Group",
-            on_click=_summarise,
             use_container_width=True,
         )
         if summarise:
             with st.spinner("Summarising ..."):
-                conv = ss.get("conversation")
-                conv.reset()
-                conv.correct = False
-                conv.append_system_message(
-                    ss.get("summary_instruction", SUMMARY_INSTRUCTION)
-                )
-                query_return = ss.get("summary_query_result", "")
-                if query_return:
-                    msg, _, _ = conv.query(json.dumps(query_return[0]))
-                    ss["summary"] = msg
-                else:
-                    st.error(
-                        "No results from query. Please check the database or query for errors."
-                    )
+                _single_digest("summary", "summary", group=True, members=[])
 
         if ss.get("summary"):
-            st.markdown("## Group summary\n\n" f'{ss.get("summary")}')
+            _show_digest(
+                "Group summary", ss.get("summary"), ss.get("summary_stats")
+            )
 
     with individual:
         summarise = st.button(
             "Summarise for individual (choose in Settings)",
-            on_click=_summarise_individual(
-                ss.get("individual", "slobentanzer")
-            ),
             use_container_width=True,
         )
         if summarise:
             with st.spinner("Summarising ..."):
-                conv = ss.get("conversation")
-                conv.reset()
-                conv.correct = False
-                conv.append_system_message(
-                    ss.get(
-                        "summary_instruction_individual",
-                        SUMMARY_INSTRUCTION_INDIVIDUAL,
-                    )
+                _single_digest(
+                    "summary",
+                    "summary_individual",
+                    group=False,
+                    members=[ss.get("individual", "slobentanzer")],
                 )
-                query_return = ss.get("summary_query_result_individual", "")
-                if query_return:
-                    msg, _, _ = conv.query(json.dumps(query_return[0]))
-                    ss["summary_individual"] = msg
-                else:
-                    st.error(
-                        "No results from query. Please check the database or query for errors."
-                    )
 
         if ss.get("summary_individual"):
-            st.markdown(
-                "## Individual summary\n\n" f'{ss.get("summary_individual")}'
+            _show_digest(
+                "Individual summary",
+                ss.get("summary_individual"),
+                ss.get("summary_individual_stats"),
             )
 
+    summarise_all = st.button(
+        "Summarise for the Group and all Members",
+        use_container_width=True,
+    )
+    _all_digests("summary", "summary_all", "Summarising ...", summarise_all)
+
 
 def tasks_panel():
     if not ss.get("tasks_query"):
@@ -169,57 +225,43 @@ def tasks_panel():
     with group:
         tasks = st.button(
             "Plan Tasks for the Group",
-            on_click=_plan_tasks,
             use_container_width=True,
         )
         if tasks:
             with st.spinner("Planning ..."):
-                conv = ss.get("conversation")
-                conv.append_system_message(
-                    ss.get("tasks_instruction", TASKS_INSTRUCTION)
-                )
-                query_return = ss.get("tasks_query_result", "")
-                if query_return:
-                    msg, _, _ = conv.query(json.dumps(query_return[0]))
-                    ss["tasks"] = msg
-                else:
-                    st.error(
-                        "No results from query. Please check the database or query for errors."
-                    )
+                _single_digest("tasks", "tasks", group=True, members=[])
 
         if ss.get("tasks"):
-            st.markdown("## Group tasks\n\n" f'{ss.get("tasks")}')
+            _show_digest(
+                "Group tasks", ss.get("tasks"), ss.get("tasks_stats")
+            )
     with individual:
         tasks = st.button(
             "Plan Tasks for individual (choose in Settings)",
-            on_click=_plan_tasks_individual(
-                ss.get("individual", "slobentanzer")
-            ),
             use_container_width=True,
         )
         if tasks:
             with st.spinner("Planning ..."):
-                conv = ss.get("conversation")
-                conv.append_system_message(
-                    ss.get(
-                        "tasks_instruction_individual",
-                        TASKS_INSTRUCTION_INDIVIDUAL,
-                    )
+                _single_digest(
+                    "tasks",
+                    "tasks_individual",
+                    group=False,
+                    members=[ss.get("individual", "slobentanzer")],
                 )
-                query_return = ss.get("tasks_query_result_individual", "")
-                if query_return:
-                    msg, _, _ = conv.query(json.dumps(query_return[0]))
-                    ss["tasks_individual"] = msg
-                else:
-                    st.error(
-                        "No results from query. Please check the database or query for errors."
-                    )
 
         if ss.get("tasks_individual"):
-            st.markdown(
-                "## Individual tasks\n\n" f'{ss.get("tasks_individual")}'
+            _show_digest(
+                "Individual tasks",
+                ss.get("tasks_individual"),
+                ss.get("tasks_individual_stats"),
             )
 
+    tasks_all = st.button(
+        "Plan Tasks for the Group and all Members",
+        use_container_width=True,
+    )
+    _all_digests("tasks", "tasks_all", "Planning ...", tasks_all)
+
 
 def task_settings_panel():
     """
@@ -274,6 +316,46 @@ def task_settings_panel():
                 key="task_instruction_individual1",
             )
 
+        with st.expander("Large Projects"):
+            st.markdown(
+                """
+                If the project data exceeds the token budget, it can be split
+                into parts (by iteration, and by project if necessary) that are
+                summarised in parallel and then combined into a single
+                response (map-reduce). This keeps each request within the
+                context window of the model.
+                """
+            )
+            ss["digest_map_reduce"] = st.checkbox(
+                "Use map-reduce for large project data",
+                ss.get("digest_map_reduce", False),
+                key="digest_map_reduce1",
+            )
+            ss["digest_token_budget"] = st.number_input(
+                "Token budget per request",
+                min_value=500,
+                value=ss.get("digest_token_budget", DIGEST_TOKEN_BUDGET),
+                step=500,
+                key="digest_token_budget1",
+            )
+
+        with st.expander("Weekly Updates"):
+            st.markdown(
+                """
+                In incremental mode, the project data and the response of each
+                run are stored. In the next run, only the changes in the data
+                (new, removed, and changed projects, and new comments) are sent
+                to the LLM together with the previous response, which is then
+                updated. If nothing changed, the previous response is shown
+                without querying the LLM.
+                """
+            )
+            ss["digest_incremental"] = st.checkbox(
+                "Generate digests incrementally",
+                ss.get("digest_incremental", False),
+                key="digest_incremental1",
+            )
+
     with neo4j:
         st.markdown(
             """
@@ -0,0 +1,273 @@
+# POSTGRES
+# PostgreSQL backend of the KG panel: pooled connections, schema info and
+# results streamed from server-side cursors
+import json
+import math
+import os
+import uuid
+
+import streamlit as st
+from loguru import logger
+
+from .config import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_MAX_ROWS,
+    KG_EXPORT_TIMEOUT,
+    KG_QUERY_TIMEOUT,
+    POSTGRES_POOL_SIZE,
+    POSTGRES_SCHEMA_INFO_TABLE,
+)
+from .export import _export_records
+from .kg import _schema_fingerprint, _subquery
+
+try:
+    import psycopg
+    from psycopg import sql
+    from psycopg.conninfo import make_conninfo
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool, PoolTimeout
+except ImportError:
+    psycopg = None
+
+ss = st.session_state
+
+INSTALL_HINT = (
+    "The PostgreSQL backend requires the `psycopg` and `psycopg-pool` "
+    'packages; install them with `pip install "psycopg[binary,pool]"`.'
+)
+
+
+def _determine_postgres_connection():
+    """
+    Determine the connection details for the PostgreSQL database.
+    """
+    defaults = {
+        "pg_host": os.getenv("POSTGRES_HOST") or "localhost",
+        "pg_port": os.getenv("POSTGRES_PORT") or "5432",
+        "pg_dbname": os.getenv("POSTGRES_DB") or "postgres",
+        "pg_user": os.getenv("POSTGRES_USER") or "postgres",
+        "pg_password": os.getenv("POSTGRES_PASSWORD") or "",
+    }
+    for key, value in defaults.items():
+        if ss.get(key) is None:
+            ss[key] = value
+
+
+def _configure_connection(connection):
+    """
+    Make pooled connections read-only; generated queries must not modify the
+    database.
+    """
+    connection.read_only = True
+
+
+@st.cache_resource(show_spinner=False)
+def _postgres_pool(conninfo):
+    """
+    Open a connection pool once per database, shared by all sessions.
+    Queries are cancelled by the server after `KG_QUERY_TIMEOUT` seconds.
+    """
+    pool = ConnectionPool(
+        conninfo,
+        min_size=1,
+        max_size=POSTGRES_POOL_SIZE,
+        kwargs={
+            "options": f"-c statement_timeout={KG_QUERY_TIMEOUT * 1000}",
+            "row_factory": dict_row,
+        },
+        configure=_configure_connection,
+        open=True,
+    )
+    try:
+        pool.wait(timeout=5)
+    except PoolTimeout:
+        pool.close()
+        raise
+    return pool
+
+
+def _connect_to_postgres():
+    """
+    Connect to the PostgreSQL database and load the schema info.
+
+    Returns:
+        True if connected, False otherwise.
+    """
+    if psycopg is None:
+        logger.error(INSTALL_HINT)
+        return False
+
+    _determine_postgres_connection()
+    conninfo = make_conninfo(
+        host=ss.pg_host,
+        port=ss.pg_port,
+        dbname=ss.pg_dbname,
+        user=ss.pg_user,
+        password=ss.pg_password,
+        connect_timeout=5,
+    )
+    try:
+        ss.pgpool = _postgres_pool(conninfo)
+    except (psycopg.Error, PoolTimeout) as e:
+        logger.error(f"Could not connect to PostgreSQL: {e}")
+        return False
+
+    _find_postgres_schema_info()
+    return True
+
+
+def _find_postgres_schema_info():
+    """
+    Load the schema info from the schema info table of the BioCypher
+    PostgreSQL export, if present.
+    """
+    try:
+        with ss.pgpool.connection() as connection:
+            row = connection.execute(
+                sql.SQL("SELECT schema_info FROM {} LIMIT 1").format(
+                    sql.Identifier(POSTGRES_SCHEMA_INFO_TABLE)
+                )
+            ).fetchone()
+    except psycopg.Error as e:
+        logger.error(f"Failed to load schema info: {e}")
+        row = None
+
+    if not row:
+        # do not keep the schema of a previously connected database
+        ss.pop("schema_dict", None)
+        ss.pop("schema_fingerprint", None)
+        return
+
+    schema_info = row["schema_info"]
+    if not isinstance(schema_info, str):
+        # json(b) column
+        schema_info = json.dumps(schema_info)
+    ss.schema_dict = json.loads(schema_info)
+    ss.schema_fingerprint = _schema_fingerprint(schema_info)
+
+
+def _count_postgres_rows(query, row_cap):
+    """
+    Count the rows of the result of a SQL query, up to `row_cap`, without
+    transferring them.
+
+    Returns:
+        The number of rows (at most `row_cap`), or None if the query failed.
+    """
+    try:
+        with ss.pgpool.connection() as connection:
+            row = connection.execute(
+                sql.SQL(
+                    "SELECT count(*) AS n FROM "
+                    "(SELECT 1 FROM ({}) AS q LIMIT {}) AS c"
+                ).format(sql.SQL(_subquery(query)), sql.Literal(row_cap))
+            ).fetchone()
+    except psycopg.Error as e:
+        logger.error(f"Failed to count query results: {e}")
+        return None
+
+    return row["n"]
+
+
+def _fetch_postgres_page(query, page, page_size, row_cap):
+    """
+    Fetch one page of the result of a SQL query through a server-side cursor:
+    the rows before the page are skipped on the server, and only the rows of
+    the page are transferred. Rows beyond `row_cap` are not accessible.
+
+    Args:
+        query: The SQL query.
+
+        page: The page number, starting at 0.
+
+        page_size: The number of rows per page.
+
+        row_cap: The maximum number of rows of the result.
+
+    Returns:
+        The list of records (as dictionaries) of the page, or None if the
+        query failed.
+    """
+    if page_size <= 0:
+        return []
+    skip = page * page_size
+    limit = min(page_size, row_cap - skip)
+    if limit <= 0:
+        # past the row cap; `fetchmany(0)` would fetch `arraysize` rows
+        return []
+    try:
+        with ss.pgpool.connection() as connection:
+            with connection.cursor(name=f"kg_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = page_size
+                cursor.execute(sql.SQL(_subquery(query)))
+                if skip:
+                    cursor.scroll(skip)
+                return cursor.fetchmany(limit)
+    except psycopg.Error as e:
+        logger.error(f"Failed to fetch query results: {e}")
+        return None
+
+
+def _query_postgres_page(query, page, page_size, row_cap, n_rows=None):
+    """
+    Fetch a page of the result of a SQL query together with the number of
+    rows of the result, as `_query_neo4j_page` does for cypher queries.
+
+    Returns:
+        Tuple of the records of the page and the number of rows.
+    """
+    if n_rows is None:
+        n_rows = _count_postgres_rows(query, row_cap)
+    if n_rows and page_size > 0:
+        page = min(page, math.ceil(n_rows / page_size) - 1)
+
+    return _fetch_postgres_page(query, page, page_size, row_cap), n_rows
+
+
+def _stream_postgres_query(
+    pool, query, max_rows=None, fetch_size=1000, job=None, timeout=None
+):
+    """
+    Run a SQL query on a pooled connection and yield the records (as
+    dictionaries) as they are fetched from a server-side cursor, in batches
+    of `fetch_size`. The statement is cancelled by the server after
+    `timeout` seconds (the `KG_QUERY_TIMEOUT` of the pool by default, 0 for
+    no timeout). If run as part of a `QueryJob` (see `components.jobs`),
+    received rows are counted and reading stops when the job is cancelled.
+    """
+    with pool.connection() as connection:
+        if timeout is not None:
+            # only for this transaction
+            connection.execute(
+                sql.SQL("SET LOCAL statement_timeout = {}").format(
+                    sql.Literal(timeout * 1000)
+                )
+            )
+        with connection.cursor(name=f"kg_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = fetch_size
+            cursor.execute(sql.SQL(_subquery(query)))
+            for i, record in enumerate(cursor):
+                if max_rows is not None and i >= max_rows:
+                    break
+                if job is not None:
+                    if job.cancelled:
+                        break
+                    job.rows += 1
+                yield record
+
+
+def _export_postgres_query(pool, query, fmt, path, job=None):
+    """
+    Export the result of a SQL query, up to `EXPORT_MAX_ROWS` rows, as the
+    rows arrive from the server (see `components.export`), with the export
+    timeout.
+    """
+    records = _stream_postgres_query(
+        pool,
+        query,
+        max_rows=EXPORT_MAX_ROWS,
+        fetch_size=EXPORT_CHUNK_SIZE,
+        job=job,
+        timeout=KG_EXPORT_TIMEOUT,
+    )
+    return _export_records(records, fmt, path, job)
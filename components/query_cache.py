@@ -0,0 +1,92 @@
+# QUERY CACHE
+# persistent cache of generated database queries, shared across sessions
+import contextlib
+import os
+import re
+import sqlite3
+import time
+
+from .config import KG_CACHE_DIR, KG_QUERY_CACHE_SIZE
+
+QUERY_CACHE_PATH = os.path.join(KG_CACHE_DIR, "queries.sqlite")
+
+# words that do not change the meaning of a question
+FILLER_WORDS = {"a", "an", "the", "please", "can", "you", "me", "tell"}
+
+
+def _normalise_question(question):
+    """
+    Normalise a question so that trivial rephrasings (case, punctuation,
+    whitespace, filler words) map to the same cache entry.
+    """
+    words = [w.strip(".") for w in re.findall(r"[\w:.-]+", question.lower())]
+    return " ".join(w for w in words if w and w not in FILLER_WORDS)
+
+
+def _cache_key(question, fingerprint, query_language):
+    return f"{fingerprint}:{query_language}:{_normalise_question(question)}"
+
+
+@contextlib.contextmanager
+def _connect():
+    """
+    Open the cache database in a transaction, creating it if necessary.
+    """
+    os.makedirs(os.path.dirname(QUERY_CACHE_PATH), exist_ok=True)
+    connection = sqlite3.connect(QUERY_CACHE_PATH, timeout=10)
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS queries (key TEXT PRIMARY KEY, "
+                "question TEXT, query TEXT, last_used REAL)"
+            )
+            yield connection
+    finally:
+        connection.close()
+
+
+def get_cached_query(question, fingerprint, query_language):
+    """
+    Look up the query generated for a question on a given schema.
+
+    Returns:
+        The cached query, or None if there is none.
+    """
+    key = _cache_key(question, fingerprint, query_language)
+    with _connect() as connection:
+        row = connection.execute(
+            "SELECT query FROM queries WHERE key = ?", (key,)
+        ).fetchone()
+        if row:
+            connection.execute(
+                "UPDATE queries SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+    return row[0] if row else None
+
+
+def cache_query(question, fingerprint, query_language, query):
+    """
+    Store the query generated for a question on a given schema, evicting the
+    least recently used entries beyond the cache size.
+    """
+    key = _cache_key(question, fingerprint, query_language)
+    with _connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)",
+            (key, question, query, time.time()),
+        )
+        connection.execute(
+            "DELETE FROM queries WHERE key NOT IN ("
+            "SELECT key FROM queries ORDER BY last_used DESC LIMIT ?)",
+            (KG_QUERY_CACHE_SIZE,),
+        )
+
+
+def evict_query(question, fingerprint, query_language):
+    """
+    Remove the cached query for a question, e.g., to generate it again.
+    """
+    key = _cache_key(question, fingerprint, query_language)
+    with _connect() as connection:
+        connection.execute("DELETE FROM queries WHERE key = ?", (key,))
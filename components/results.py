@@ -0,0 +1,84 @@
+# RESULTS
+# shape graph query results into columnar (Arrow) tables for display
+import json
+
+import neo4j.graph
+import pyarrow as pa
+
+
+def _cells(key, value):
+    """
+    Flatten a value of a record into (column, cell) pairs. Nodes and
+    relationships are split into their labels or type and their properties,
+    maps into their entries; all other values form a single column.
+    """
+    if isinstance(value, neo4j.graph.Node):
+        yield f"{key}:labels", ":".join(sorted(value.labels))
+        for prop, v in value.items():
+            yield f"{key}.{prop}", v
+    elif isinstance(value, neo4j.graph.Relationship):
+        yield f"{key}:type", value.type
+        for prop, v in value.items():
+            yield f"{key}.{prop}", v
+    elif isinstance(value, neo4j.graph.Path):
+        yield key, " ".join(
+            f"({':'.join(sorted(n.labels))})" for n in value.nodes
+        )
+    elif isinstance(value, dict):
+        for prop, v in value.items():
+            yield f"{key}.{prop}", v
+    else:
+        yield key, value
+
+
+def _as_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _column(values):
+    """
+    Convert a list of cells to an Arrow array, falling back to strings for
+    mixed or unsupported types.
+    """
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.array([_as_string(v) for v in values], type=pa.string())
+
+
+def records_to_table(records):
+    """
+    Convert graph query records (Neo4j records or dictionaries) into an Arrow
+    table in a single pass over the records. Node and relationship properties
+    become individual columns (`<key>.<property>`), together with the node
+    labels (`<key>:labels`) or relationship type (`<key>:type`).
+
+    Args:
+        records: A list of records.
+
+    Returns:
+        A pyarrow Table with one row per record.
+    """
+    columns = {}
+    for i, record in enumerate(records):
+        for key, value in record.items():
+            for column, cell in _cells(key, value):
+                cells = columns.get(column)
+                if cells is None:
+                    cells = columns[column] = [None] * i
+                elif len(cells) > i:
+                    # duplicate column name within the record
+                    continue
+                cells.append(cell)
+        # pad columns missing from this record
+        for cells in columns.values():
+            if len(cells) <= i:
+                cells.append(None)
+
+    return pa.table(
+        {column: _column(cells) for column, cells in columns.items()}
+    )
@@ -0,0 +1,164 @@
+# SCHEMA
+# compact projection of the KG schema and question-driven pruning
+import re
+
+TYPE_ABBREVIATIONS = {
+    "string": "str",
+    "integer": "int",
+    "double": "float",
+    "boolean": "bool",
+}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [v for v in value if v]
+    return [value]
+
+
+def _property_types(values):
+    """
+    Get the property-type signature of an entity or relationship.
+    """
+    properties = values.get("properties") or {}
+    if not isinstance(properties, dict):
+        return {p: "" for p in _as_list(properties)}
+    return {
+        p: TYPE_ABBREVIATIONS.get(str(t).lower(), str(t))
+        for p, t in properties.items()
+    }
+
+
+def project_schema(entities, relationships):
+    """
+    Compute a compact projection of the schema, as processed by the prompt
+    engine: property-type signatures of node and edge types, and the
+    adjacency of node types.
+
+    Args:
+        entities: The entities of the prompt engine.
+
+        relationships: The relationships of the prompt engine.
+
+    Returns:
+        Dictionary with the "nodes" (name -> property types), "edges" (name ->
+        label, source and target lists, property types), and "adjacency" (node
+        name -> set of neighbouring node names).
+    """
+    nodes = {
+        name: _property_types(values) for name, values in entities.items()
+    }
+
+    edges = {}
+    adjacency = {name: set() for name in nodes}
+    for name, values in relationships.items():
+        sources = _as_list(values.get("source"))
+        targets = _as_list(values.get("target"))
+        edges[name] = {
+            "label": values.get("label_as_edge", name),
+            "source": sources,
+            "target": targets,
+            "properties": _property_types(values),
+        }
+        for source in sources:
+            for target in targets:
+                adjacency.setdefault(source, set()).add(target)
+                adjacency.setdefault(target, set()).add(source)
+
+    return {"nodes": nodes, "edges": edges, "adjacency": adjacency}
+
+
+def _words(text):
+    """
+    Split a text or PascalCase name into lower case words without plural s.
+    """
+    words = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", text)
+    return {w.lower().removesuffix("s") for w in words if len(w) > 2}
+
+
+def prune_projection(projection, question):
+    """
+    Keep only the part of the schema that is relevant to a question: node and
+    edge types whose names or properties are mentioned in the question, the
+    direct neighbours of these node types, and the edge types between the
+    kept node types. If nothing is mentioned, the full schema is kept.
+    """
+    words = _words(question)
+    # edge names often contain node names, which should not select the edge
+    node_words = set().union(*map(_words, projection["nodes"]))
+
+    def mentioned(names, properties, ignore=frozenset()):
+        if any((_words(n) - ignore) & words for n in names):
+            return True
+        return any(_words(p) & words for p in properties)
+
+    seeds = {
+        name
+        for name, properties in projection["nodes"].items()
+        if mentioned([name], properties)
+    }
+    edges = {
+        name
+        for name, edge in projection["edges"].items()
+        if mentioned(
+            [name, edge["label"]], edge["properties"], ignore=node_words
+        )
+    }
+    for name in edges:
+        edge = projection["edges"][name]
+        seeds.update(edge["source"] + edge["target"])
+
+    if not seeds and not edges:
+        return projection
+
+    kept = set(seeds)
+    for name in seeds:
+        kept.update(projection["adjacency"].get(name, ()))
+
+    return {
+        "nodes": {
+            name: properties
+            for name, properties in projection["nodes"].items()
+            if name in kept
+        },
+        "edges": {
+            name: edge
+            for name, edge in projection["edges"].items()
+            if name in edges
+            or (
+                edge["source"]
+                and edge["target"]
+                and set(edge["source"] + edge["target"]) <= kept
+            )
+        },
+        "adjacency": {
+            name: projection["adjacency"].get(name, set()) & kept
+            for name in kept
+        },
+    }
+
+
+def _signature(name, properties):
+    if not properties:
+        return name
+    types = ",".join(f"{p}:{t}" if t else p for p, t in properties.items())
+    return f"{name}{{{types}}}"
+
+
+def format_projection(projection):
+    """
+    Render a schema projection as compact text for prompts and display.
+    """
+    nodes = "; ".join(
+        _signature(name, properties)
+        for name, properties in projection["nodes"].items()
+    )
+    edges = "; ".join(
+        f"({'|'.join(edge['source'])})"
+        f"-[{_signature(edge['label'], edge['properties'])}]->"
+        f"({'|'.join(edge['target'])})"
+        for edge in projection["edges"].values()
+    )
+    return f"Nodes: {nodes}\nEdges: {edges}"
@@ -0,0 +1,142 @@
+# SERIALIZE
+# compact, token-efficient representations of query results for LLM prompts
+import json
+from collections import Counter
+
+
+def _estimate_tokens(text):
+    """
+    Roughly estimate the number of tokens of a text (about four characters per
+    token for English text and JSON).
+    """
+    return len(text) // 4 + 1
+
+
+def _drop_nulls(value):
+    """
+    Recursively remove None values from dictionaries and lists.
+    """
+    if isinstance(value, dict):
+        return {k: _drop_nulls(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_drop_nulls(v) for v in value if v is not None]
+    return value
+
+
+def _object_key(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _count_objects(value, counts):
+    """
+    Count the occurrences of all nested objects (dictionaries).
+    """
+    if isinstance(value, dict):
+        counts[_object_key(value)] += 1
+        for v in value.values():
+            _count_objects(v, counts)
+    elif isinstance(value, list):
+        for v in value:
+            _count_objects(v, counts)
+
+
+def _scalar(value):
+    """
+    Render a scalar without quotes, escaping the characters that separate
+    cells and lines.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace("|", "\\|")
+    )
+
+
+def compact_records(records):
+    """
+    Serialise query records (as returned by the Neo4j driver) in a compact,
+    table-like form for LLM prompts. Null values are dropped, the keys are
+    given once as a header instead of repeated for every record, and nested
+    objects that occur several times (e.g., the same `Person` node in many
+    rows) are written out once and then referenced as `@<n>`.
+
+    Args:
+        records: A list of dictionaries.
+
+    Returns:
+        The compact string representation.
+    """
+    records = [_drop_nulls(record) for record in records]
+
+    counts = Counter()
+    for record in records:
+        for value in record.values():
+            _count_objects(value, counts)
+
+    references = {}
+    definitions = []
+
+    def encode(value):
+        if isinstance(value, dict):
+            inline = (
+                "{"
+                + ", ".join(f"{k}: {encode(v)}" for k, v in value.items())
+                + "}"
+            )
+            key = _object_key(value)
+            if counts[key] < 2:
+                return inline
+            if key not in references:
+                references[key] = f"@{len(references) + 1}"
+                definitions.append(f"{references[key]} = {inline}")
+            return references[key]
+        if isinstance(value, list):
+            return "[" + "; ".join(encode(v) for v in value) + "]"
+        return _scalar(value)
+
+    columns = []
+    for record in records:
+        for key in record:
+            if key not in columns:
+                columns.append(key)
+
+    rows = [
+        " | ".join(
+            encode(record[column]) if column in record else ""
+            for column in columns
+        )
+        for record in records
+    ]
+
+    legend = (
+        f"{len(records)} records; columns separated by '|', empty cells are "
+        "null"
+    )
+    if definitions:
+        legend += "; '@<n>' refers to the objects defined at the end"
+    lines = [legend + ".", " | ".join(columns)]
+    lines.extend(rows)
+    lines.extend(definitions)
+
+    return "\n".join(lines)
+
+
+def serialize_records(records):
+    """
+    Serialise query records compactly and report the prompt size saved in
+    comparison to plain JSON.
+
+    Returns:
+        Tuple of the compact string and a dictionary with the estimated token
+        counts of the JSON ("json_tokens") and compact ("compact_tokens")
+        representations.
+    """
+    compact = compact_records(records)
+    stats = {
+        "json_tokens": _estimate_tokens(json.dumps(records, default=str)),
+        "compact_tokens": _estimate_tokens(compact),
+    }
+    return compact, stats
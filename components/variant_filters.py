@@ -0,0 +1,124 @@
+# VARIANT FILTERS
+# variant filters, compiled to cypher predicates for the variant queries and
+# to vectorised masks for cached variant tables
+import re
+
+import pandas as pd
+
+# ClinVar significance terms; a variant matches a term if its significance
+# contains it (e.g., "Pathogenic/Likely_pathogenic" matches "Pathogenic")
+CLINVAR_SIGNIFICANCE = [
+    "Pathogenic",
+    "Likely_pathogenic",
+    "Uncertain_significance",
+    "Conflicting_interpretations_of_pathogenicity",
+    "Likely_benign",
+    "Benign",
+    "drug_response",
+    "risk_factor",
+]
+
+# ANNOVAR exonic functions
+EXONIC_FUNCTIONS = [
+    "frameshift_deletion",
+    "frameshift_insertion",
+    "nonframeshift_deletion",
+    "nonframeshift_insertion",
+    "nonsynonymous_SNV",
+    "stopgain",
+    "stoploss",
+    "startloss",
+    "synonymous_SNV",
+    "unknown",
+]
+
+# filter name: (variant table column, cypher predicate on the variant `v`)
+FILTERS = {
+    "cadd_min": (
+        "cadd_phred",
+        "toFloat(v.CADD_phred) >= $filter_cadd_min",
+    ),
+    "gnomad_max": (
+        "gnomad_max",
+        # variants without frequency are not observed in gnomAD
+        "coalesce(toFloat(v.gnomAD_genome_max), 0.0) <= $filter_gnomad_max",
+    ),
+    "clnsig": (
+        "clnsig",
+        "any(term IN $filter_clnsig WHERE v.CLNSIG CONTAINS term)",
+    ),
+    "ex_func": (
+        "ex_func_mane",
+        "v.`ExonicFunc.MANE` IN $filter_ex_func",
+    ),
+}
+
+
+def variant_filters(cadd_min=None, gnomad_max=None, clnsig=(), ex_func=()):
+    """
+    Collect the active variant filters.
+
+    Args:
+        cadd_min: The minimum CADD phred score.
+
+        gnomad_max: The maximum allele frequency in gnomAD genomes.
+
+        clnsig: ClinVar significance terms, any of which must match.
+
+        ex_func: Exonic functions, one of which the variant must have.
+
+    Returns:
+        Tuple of pairs of filter name and value, usable as argument of cached
+        functions and query jobs; empty if no filter is active.
+    """
+    filters = {
+        "cadd_min": cadd_min,
+        "gnomad_max": gnomad_max,
+        "clnsig": tuple(clnsig) or None,
+        "ex_func": tuple(ex_func) or None,
+    }
+    return tuple(
+        (name, value) for name, value in filters.items() if value is not None
+    )
+
+
+def _cypher_filter(filters):
+    """
+    Compile variant filters to a `WHERE` clause on the variant `v` of a
+    variant query, with the filter values as query parameters.
+
+    Returns:
+        Tuple of the clause (empty without filters) and the parameters.
+    """
+    if not filters:
+        return "", {}
+    predicates = [FILTERS[name][1] for name, _ in filters]
+    params = {
+        f"filter_{name}": list(value) if isinstance(value, tuple) else value
+        for name, value in filters
+    }
+    return "WHERE " + "\n  AND ".join(predicates), params
+
+
+def _apply_variant_filters(df, filters):
+    """
+    Apply variant filters to a variant table with vectorised comparisons,
+    with the same semantics as the cypher predicates.
+
+    Returns:
+        The rows of the table matching all filters.
+    """
+    mask = pd.Series(True, index=df.index)
+    for name, value in filters:
+        column = df[FILTERS[name][0]]
+        if name == "cadd_min":
+            mask &= pd.to_numeric(column, errors="coerce") >= value
+        elif name == "gnomad_max":
+            frequency = pd.to_numeric(column, errors="coerce").fillna(0.0)
+            mask &= frequency <= value
+        elif name == "clnsig":
+            pattern = "|".join(map(re.escape, value))
+            mask &= column.astype("string").str.contains(pattern).fillna(False)
+        elif name == "ex_func":
+            mask &= column.isin(value)
+    return df[mask]
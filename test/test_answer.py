@@ -0,0 +1,72 @@
+import pyarrow as pa
+
+from components.answer import (
+    _column_profile,
+    _sample_rows,
+    _spread,
+    result_digest,
+)
+from components.serialize import _estimate_tokens
+
+RECORDS = [
+    {
+        "gene": f"GENE{i}",
+        "chromosome": str(i % 3 + 1),
+        "length": 1000 + i,
+        "driver": i % 4 == 0,
+    }
+    for i in range(200)
+]
+
+
+def test_spread():
+    assert _spread(10, 1) == [0]
+    assert _spread(10, 5) == [0, 2, 4, 6, 8]
+    assert _spread(3, 3) == [0, 1, 2]
+
+
+def test_column_profile():
+    assert _column_profile("length", pa.chunked_array([[1, 3, None, 8]])) == (
+        "length: 3 values, 1 null, min 1, max 8, mean 4"
+    )
+    assert _column_profile(
+        "chromosome", pa.chunked_array([["1", "2", "1", "1"]])
+    ) == "chromosome: 4 values, 2 distinct, most frequent: 1 (3), 2 (1)"
+    assert _column_profile("gene", pa.chunked_array([["TP53", "EGFR"]])) == (
+        "gene: 2 values, 2 distinct"
+    )
+    assert _column_profile(
+        "driver", pa.chunked_array([[True, False, True]])
+    ) == ("driver: 3 values, 2 true")
+    assert _column_profile("empty", pa.chunked_array([[None]], pa.int64())) == (
+        "empty: 0 values, 1 null"
+    )
+
+
+def test_sample_fits_budget():
+    table = pa.Table.from_pylist(RECORDS)
+    sample, sampled = _sample_rows(table, 300)
+    assert 0 < sampled < table.num_rows
+    assert _estimate_tokens(sample) <= 300
+    assert "GENE0" in sample
+    assert _sample_rows(table, 0) == ("", 0)
+
+
+def test_small_result_is_digested_whole():
+    digest, stats = result_digest(RECORDS[:5], token_budget=2000)
+    assert stats == {"rows": 5, "sampled": 5}
+    assert digest.startswith("The query returned 5 rows.")
+    assert "All rows:" in digest
+    assert "length: 5 values, min 1000, max 1004" in digest
+
+
+def test_large_result_is_sampled_within_budget():
+    digest, stats = result_digest(RECORDS, capped=True, token_budget=500)
+    assert stats["rows"] == 200
+    assert 0 < stats["sampled"] < 200
+    assert _estimate_tokens(digest) <= 500
+    assert digest.startswith(
+        "The query returned more than 200 rows; only the first 200 were "
+        "analysed."
+    )
+    assert f"Sample of {stats['sampled']} rows" in digest
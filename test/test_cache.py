@@ -0,0 +1,26 @@
+from components.cache import TTLCache
+
+
+def test_ttl_cache_invalidates_namespace_on_new_version():
+    cache = TTLCache(10, 60)
+    cache.put("db", "v1", "TP53", 1)
+    cache.put("other", "v1", "TP53", 2)
+    assert cache.get("db", "v1", "TP53") == 1
+    assert cache.get("db", "v2", "TP53") is None
+    assert cache.get("other", "v1", "TP53") == 2
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(2, 60)
+    cache.put("db", "v1", "a", 1)
+    cache.put("db", "v1", "b", 2)
+    cache.get("db", "v1", "a")
+    cache.put("db", "v1", "c", 3)
+    assert cache.get("db", "v1", "b", "missing") == "missing"
+    assert cache.get("db", "v1", "a") == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(2, 0)
+    cache.put("db", "v1", "a", 1)
+    assert cache.get("db", "v1", "a") is None
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from components.cohort import (
+    GAIN,
+    LOH,
+    LOSS,
+    VARIANT,
+    CohortMatrix,
+    _copy_number_flags,
+)
+
+GENES = ["TP53", "BRCA1", "EGFR", "KRAS", "MYC"]
+SAMPLES = ["S3", "S1", "S4", "S2"]
+
+
+@pytest.fixture
+def pairs():
+    rng = np.random.default_rng(0)
+    n = 40
+    return (
+        rng.integers(0, len(GENES), n),
+        rng.integers(0, len(SAMPLES), n),
+        rng.choice([VARIANT, GAIN, LOSS, LOH], n).astype(np.int8),
+    )
+
+
+def dense_reference(gene_ids, sample_ids, flags):
+    """
+    The flags of all gene-sample pairs, combined bitwise, by gene and sample.
+    """
+    reference = {}
+    for gene, sample, flag in zip(gene_ids, sample_ids, flags):
+        key = (GENES[gene], SAMPLES[sample])
+        reference[key] = reference.get(key, 0) | int(flag)
+    return reference
+
+
+def test_from_pairs_matches_reference(pairs):
+    matrix = CohortMatrix.from_pairs(GENES, SAMPLES, *pairs)
+    assert matrix.genes == sorted(GENES)
+    assert matrix.samples == sorted(SAMPLES)
+
+    table = matrix.slice()
+    reference = dense_reference(*pairs)
+    for gene in GENES:
+        for sample in SAMPLES:
+            assert table.loc[gene, sample] == reference.get((gene, sample), 0)
+
+    altered = matrix.altered_samples()
+    for gene in GENES:
+        assert altered[gene] == sum(g == gene for g, _ in reference)
+
+
+def test_slice_selects_genes_and_samples(pairs):
+    matrix = CohortMatrix.from_pairs(GENES, SAMPLES, *pairs)
+    reference = dense_reference(*pairs)
+    table = matrix.slice(genes=["MYC", "TP53", "NOPE"], samples=["S2", "S9"])
+    assert list(table.index) == ["MYC", "TP53"]
+    assert list(table.columns) == ["S2"]
+    for gene in table.index:
+        assert table.loc[gene, "S2"] == reference.get((gene, "S2"), 0)
+
+
+def test_save_and_load(tmp_path, pairs):
+    matrix = CohortMatrix.from_pairs(GENES, SAMPLES, *pairs)
+    path = str(tmp_path / "matrix")
+    matrix.save(path)
+    # saving again replaces the matrix
+    matrix.save(path)
+    loaded = CohortMatrix.load(path)
+    assert isinstance(loaded.indices, np.memmap)
+    assert loaded.genes == matrix.genes
+    assert loaded.samples == matrix.samples
+    assert loaded.slice().equals(matrix.slice())
+
+
+def test_empty_matrix():
+    matrix = CohortMatrix.from_pairs(
+        [], [], *(np.array([], dtype=np.int64) for _ in range(3))
+    )
+    assert matrix.slice().shape == (0, 0)
+    assert matrix.altered_samples().empty
+
+
+@pytest.mark.parametrize(
+    "copies, loh, flags",
+    [
+        (2, None, 0),
+        (3, None, GAIN),
+        (0, "1", LOSS | LOH),
+        (None, "True", LOH),
+        (2, "false", 0),
+    ],
+)
+def test_copy_number_flags(copies, loh, flags):
+    assert _copy_number_flags(copies, loh) == flags
@@ -0,0 +1,102 @@
+from components.delta import (
+    _snapshot_path,
+    diff_records,
+    format_delta,
+    is_empty,
+)
+
+
+def project(person, title, iteration, **fields):
+    return {
+        "person.name": person,
+        "project.title": title,
+        "iteration.title": iteration,
+        **fields,
+    }
+
+
+def test_unchanged_records():
+    records = [project("Ada", "Parser", "Q1", **{"project.status": "Todo"})]
+    assert is_empty(diff_records(records, list(records)))
+
+
+def test_new_removed_and_changed():
+    previous = [
+        project("Ada", "Parser", "Q1", **{"project.status": "Todo"}),
+        project("Bob", "Docs", "Q1"),
+    ]
+    current = [
+        project("Ada", "Parser", "Q1", **{"project.status": "Done"}),
+        project("Eve", "Tests", "Q2"),
+    ]
+    delta = diff_records(previous, current)
+    assert delta["new"] == [current[1]]
+    assert delta["removed"] == [previous[1]]
+    assert delta["moved"] == []
+    assert delta["changed"] == [
+        {
+            "person.name": "Ada",
+            "project.title": "Parser",
+            "changes": {"project.status": "Todo -> Done"},
+            "new_comments": None,
+        }
+    ]
+    assert "New projects" in format_delta(delta)
+
+
+def test_same_title_of_different_people():
+    previous = [
+        project("Ada", "Planning", "Q1", **{"project.size": "S"}),
+        project("Bob", "Planning", "Q1", **{"project.size": "M"}),
+    ]
+    current = [dict(record) for record in previous]
+    current[1]["project.size"] = "XL"
+    delta = diff_records(previous, current)
+    assert delta["new"] == delta["removed"] == delta["moved"] == []
+    assert len(delta["changed"]) == 1
+    assert delta["changed"][0]["person.name"] == "Bob"
+    assert delta["changed"][0]["changes"] == {"project.size": "M -> XL"}
+
+
+def test_moved_to_next_iteration():
+    previous = [project("Ada", "Parser", "Q1", **{"project.status": "Todo"})]
+    current = [project("Ada", "Parser", "Q2", **{"project.status": "Done"})]
+    delta = diff_records(previous, current)
+    assert delta["new"] == delta["removed"] == delta["changed"] == []
+    assert delta["moved"] == [
+        {
+            "person.name": "Ada",
+            "project.title": "Parser",
+            "iteration.title": "Q1 -> Q2",
+            "changes": {"project.status": "Todo -> Done"},
+            "new_comments": None,
+        }
+    ]
+    assert "moved to another iteration" in format_delta(delta)
+
+
+def test_new_comments():
+    previous = [project("Ada", "Parser", "Q1", concatenated_comments="; a")]
+    current = [project("Ada", "Parser", "Q1", concatenated_comments="; a; b")]
+    (change,) = diff_records(previous, current)["changed"]
+    assert change["new_comments"] == ["b"]
+    assert change["changes"] is None
+
+
+def test_custom_identity():
+    previous = [{"id": 1, "value": "a"}]
+    current = [{"id": 1, "value": "b"}]
+    (change,) = diff_records(previous, current, keys=("id",))["changed"]
+    assert change == {
+        "id": 1,
+        "changes": {"value": "a -> b"},
+        "new_comments": None,
+    }
+
+
+def test_snapshot_path_depends_on_database():
+    args = ("summary", "Group", "MATCH (n) RETURN n", "Summarise.")
+    first = _snapshot_path(*args, ("localhost", "7687", "neo4j"))
+    other = _snapshot_path(*args, ("localhost", "7687", "projects"))
+    assert first != other
+    assert first == _snapshot_path(*args, ("localhost", "7687", "neo4j"))
@@ -0,0 +1,197 @@
+import threading
+import time
+
+import pytest
+
+from components import digest
+from components.digest import _chunk_records, _digest_targets
+from components.serialize import _estimate_tokens, compact_records
+
+
+class State(dict):
+    """
+    Stand-in for the session state, with attribute access to its keys.
+    """
+
+    __getattr__ = dict.__getitem__
+
+
+class FakeConversation:
+    """
+    Conversation answering each query with the instruction and the size of
+    the text, so that the inputs of a digest can be checked.
+    """
+
+    def __init__(self):
+        self.reset()
+        self.rag_agents = ["agent"]
+        self.correct = True
+
+    def reset(self):
+        self.messages = []
+
+    def append_system_message(self, message):
+        self.messages.append(message)
+
+    def query(self, text):
+        return f"{self.messages[-1]} ({len(text)} characters)", None, None
+
+
+class FakeDriver:
+    """
+    Driver returning the projects of the person in the query, or failing for
+    the person "Mallory".
+    """
+
+    def __init__(self, projects):
+        self.projects = projects
+
+    def query(self, query):
+        if "Mallory" in query:
+            raise RuntimeError("connection lost")
+        person = query.split(":", 1)[1]
+        return [
+            p for p in self.projects if person in ("all", p["person.name"])
+        ], None
+
+
+@pytest.fixture
+def state(monkeypatch):
+    state = State(
+        conversation=FakeConversation(),
+        neodriver=FakeDriver(
+            [
+                {"person.name": "Ada", "project.title": "Parser"},
+                {"person.name": "Bob", "project.title": "Docs"},
+            ]
+        ),
+        summary_query="projects:all",
+        summary_query_individual="projects:{person}",
+        summary_instruction="Summarise the group.",
+        summary_instruction_individual="Summarise the member.",
+    )
+    monkeypatch.setattr(digest, "ss", state)
+    monkeypatch.setattr(digest, "_connect_to_neo4j", lambda: None)
+    monkeypatch.setattr(digest, "_team_members", lambda: ["Ada", "Bob"])
+    return state
+
+
+def iteration(name, n):
+    return [
+        {"iteration.title": name, "project.title": f"{name} project {i:02d}"}
+        for i in range(n)
+    ]
+
+
+def tokens(records):
+    return _estimate_tokens(compact_records(records))
+
+
+def iterations(chunks):
+    return [sorted({r["iteration.title"] for r in chunk}) for chunk in chunks]
+
+
+def test_groups_fitting_together_share_a_chunk():
+    q1, q2 = iteration("Q1", 3), iteration("Q2", 3)
+    chunks = _chunk_records(q1 + q2, tokens(q1) + tokens(q2))
+    assert chunks == [q1 + q2]
+
+
+def test_first_group_is_kept_whole():
+    q1, q2 = iteration("Q1", 3), iteration("Q2", 3)
+    chunks = _chunk_records(q1 + q2, max(tokens(q1), tokens(q2)))
+    assert chunks == [q1, q2]
+
+
+def test_group_after_flush_is_kept_whole():
+    q1, q2, q3 = iteration("Q1", 3), iteration("Q2", 4), iteration("Q3", 2)
+    # Q2 fits the budget alone, but not together with Q1 or Q3
+    chunks = _chunk_records(q1 + q2 + q3, tokens(q2))
+    assert chunks == [q1, q2, q3]
+
+
+def test_large_group_is_split_between_records():
+    q1 = iteration("Q1", 10)
+    budget = tokens(q1[:3])
+    chunks = _chunk_records(q1, budget)
+    assert len(chunks) > 1
+    assert [r for chunk in chunks for r in chunk] == q1
+    assert all(tokens(chunk) <= budget for chunk in chunks)
+
+
+def test_record_exceeding_budget_forms_its_own_chunk():
+    records = iteration("Q1", 3)
+    chunks = _chunk_records(records, 1)
+    assert chunks == [[record] for record in records]
+
+
+def test_records_keep_their_order_within_groups():
+    records = iteration("Q1", 4) + iteration("Q2", 4)
+    chunks = _chunk_records(records, tokens(records[:5]))
+    assert iterations(chunks) == [["Q1"], ["Q2"]]
+
+
+def test_digest_targets(state):
+    assert _digest_targets("summary", members=["Ada"]) == [
+        ("Group", "projects:all", "Summarise the group."),
+        ("Ada", "projects:Ada", "Summarise the member."),
+    ]
+    assert _digest_targets("summary", group=False) == []
+
+
+def test_forked_conversations_are_independent(state):
+    fork = digest._fork_conversation(state.conversation)
+    fork.append_system_message("Summarise.")
+    assert state.conversation.messages == []
+    assert fork.rag_agents == [] and not fork.correct
+    assert state.conversation.rag_agents == ["agent"]
+
+
+def test_generate_digests_for_group_and_members(state):
+    digests = {
+        label: msg for label, msg, _ in digest.generate_digests("summary")
+    }
+    assert set(digests) == {"Group", "Ada", "Bob"}
+    assert digests["Group"].startswith("Summarise the group.")
+    assert digests["Ada"].startswith("Summarise the member.")
+    # the session conversation is not used for the digests
+    assert state.conversation.messages == []
+
+
+def test_failed_or_empty_digest_does_not_stop_the_others(state):
+    digests = {
+        label: (msg, stats)
+        for label, msg, stats in digest.generate_digests(
+            "summary", group=False, members=["Mallory", "Eve", "Bob"]
+        )
+    }
+    assert digests["Mallory"] == (None, None)
+    assert digests["Eve"] == (None, None)
+    assert digests["Bob"][0].startswith("Summarise the member.")
+    assert digests["Bob"][1]["compact_tokens"] > 0
+
+
+def test_concurrent_llm_calls_are_limited(state, monkeypatch):
+    monkeypatch.setattr(digest, "DIGEST_MAX_WORKERS", 2)
+    state["summary_query_individual"] = "projects:all"
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    ask = digest._ask
+
+    def counting_ask(*args):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        try:
+            time.sleep(0.01)
+            return ask(*args)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(digest, "_ask", counting_ask)
+    members = [f"Member {i}" for i in range(6)]
+    results = list(digest.generate_digests("summary", members=members))
+    assert len(results) == len(members) + 1
+    assert all(msg for _, msg, _ in results)
+    assert peak[0] == 2
@@ -0,0 +1,84 @@
+import pytest
+
+from components import examples
+from components.examples import (
+    find_examples,
+    generate_query_from_examples,
+    record_example,
+)
+
+
+@pytest.fixture(autouse=True)
+def examples_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        examples, "EXAMPLES_PATH", str(tmp_path / "examples.sqlite")
+    )
+
+
+def test_most_similar_examples_first():
+    record_example("How many genes are there?", "abc", "Cypher", "Q1")
+    record_example("How many proteins are there?", "abc", "Cypher", "Q2")
+    record_example("Which drugs target EGFR?", "abc", "Cypher", "Q3")
+    found = find_examples("How many genes are in the graph?", "abc", "Cypher")
+    assert found[0] == ("How many genes are there?", "Q1")
+    assert ("Which drugs target EGFR?", "Q3") not in found
+
+
+def test_examples_are_per_schema_and_language():
+    record_example("How many genes are there?", "abc", "Cypher", "Q1")
+    assert find_examples("How many genes are there?", "def", "Cypher") == []
+    assert find_examples("How many genes are there?", "abc", "SQL") == []
+
+
+def test_example_is_replaced_and_limited():
+    record_example("Count genes", "abc", "Cypher", "old")
+    record_example("count genes?", "abc", "Cypher", "new")
+    record_example("Count all genes", "abc", "Cypher", "other")
+    assert find_examples("Count genes", "abc", "Cypher", n=1) == [
+        ("count genes?", "new")
+    ]
+
+
+class FakeConversation:
+    def __init__(self, response):
+        self.response = response
+        self.messages = []
+
+    def reset(self):
+        self.messages = []
+
+    def append_system_message(self, message):
+        self.messages.append(message)
+
+    def query(self, text):
+        return self.response, None, None
+
+
+class FakePromptEngine:
+    def __init__(self, response):
+        self.conversation = FakeConversation(response)
+        self.entities = {"Gene": {"properties": {"name": "string"}}}
+        self.relationships = {}
+
+    def conversation_factory(self):
+        return self.conversation
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        "MATCH (g:Gene) RETURN g",
+        "```cypher\nMATCH (g:Gene) RETURN g\n```",
+        "```\nMATCH (g:Gene) RETURN g```",
+        " ```Cypher MATCH (g:Gene) RETURN g\n``` ",
+    ],
+)
+def test_generated_query_without_code_fence(response):
+    engine = FakePromptEngine(response)
+    query = generate_query_from_examples(
+        engine, "Which genes?", [("All genes", "MATCH (n) RETURN n")], "Cypher"
+    )
+    assert query == "MATCH (g:Gene) RETURN g"
+    (prompt,) = engine.conversation.messages
+    assert "Gene{name:str}" in prompt
+    assert "Question: All genes\nQuery: MATCH (n) RETURN n" in prompt
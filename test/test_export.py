@@ -0,0 +1,102 @@
+import gzip
+import io
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from components import export
+from components.export import (
+    FORMATS,
+    _conform,
+    _export_records,
+    _export_schema,
+    write_export,
+)
+
+CHUNKS = [
+    [{"gene": "TP53", "n": 1, "score": None}],
+    [{"gene": "EGFR", "n": 2, "score": 0.5, "extra": "x"}],
+    [{"gene": "KRAS", "score": 0.1}],
+]
+
+
+def tables():
+    return [pa.Table.from_pylist(chunk) for chunk in CHUNKS]
+
+
+def read(fmt, path):
+    if fmt == "Parquet":
+        return pq.read_table(path).to_pandas()
+    if fmt == "Arrow IPC":
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    with gzip.open(path) as f:
+        return pd.read_csv(io.BytesIO(f.read()), dtype=str)
+
+
+def test_export_schema():
+    schema = tables()[0].schema
+    assert _export_schema(schema, "Parquet") == pa.schema(
+        [("gene", pa.string()), ("n", pa.int64()), ("score", pa.string())]
+    )
+    assert set(_export_schema(schema, "CSV (gzip)").types) == {pa.string()}
+
+
+def test_conform_fills_and_casts_columns():
+    schema = pa.schema([("gene", pa.string()), ("n", pa.float64())])
+    table = pa.Table.from_pylist([{"n": 3, "other": True}])
+    conformed = _conform(table, schema)
+    assert conformed.schema == schema
+    assert conformed.to_pylist() == [{"gene": None, "n": 3.0}]
+    # nested values become strings
+    nested = pa.Table.from_pylist([{"gene": ["TP53", "EGFR"]}])
+    assert _conform(nested, schema).column("gene").to_pylist() == [
+        '["TP53", "EGFR"]'
+    ]
+
+
+def test_conform_rejects_incompatible_values():
+    schema = pa.schema([("n", pa.int64())])
+    with pytest.raises(pa.ArrowInvalid):
+        _conform(pa.Table.from_pylist([{"n": "many"}]), schema)
+
+
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_write_export(tmp_path, fmt):
+    path = str(tmp_path / f"export.{FORMATS[fmt][0]}")
+    stats = write_export(tables(), fmt, path)
+    assert stats == {"rows": 3, "dropped": ["extra"]}
+    df = read(fmt, path)
+    assert list(df.columns) == ["gene", "n", "score"]
+    assert df["gene"].tolist() == ["TP53", "EGFR", "KRAS"]
+    assert df["score"].isna().tolist() == [True, False, False]
+
+
+def test_failed_export_leaves_no_file(tmp_path):
+    path = str(tmp_path / "export.parquet")
+    chunks = tables() + [pa.Table.from_pylist([{"n": "many"}])]
+    with pytest.raises(pa.ArrowInvalid):
+        write_export(chunks, "Parquet", path)
+    assert not os.path.exists(path)
+
+
+def test_export_records_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CHUNK_SIZE", 2)
+    path = str(tmp_path / "export.arrow")
+    records = ({"i": i} for i in range(5))
+    assert _export_records(records, "Arrow IPC", path) == {
+        "rows": 5,
+        "dropped": [],
+    }
+    assert read("Arrow IPC", path)["i"].tolist() == list(range(5))
+
+
+def test_cancelled_export_is_deleted(tmp_path):
+    path = str(tmp_path / "export.parquet")
+    job = SimpleNamespace(cancelled=True)
+    assert _export_records([{"i": 1}], "Parquet", path, job) is None
+    assert not os.path.exists(path)
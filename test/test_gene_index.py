@@ -0,0 +1,71 @@
+import neo4j
+import pytest
+
+from components import gene_index
+from components.gene_index import GenePrefixIndex, _gene_index
+
+SYMBOLS = ["TP53", "TP53BP1", "TP63", "TP73", "BRCA1", "BRCA2", "EGFR"]
+
+
+class State(dict):
+    """
+    Stand-in for the session state, with attribute access to its keys.
+    """
+
+    __getattr__ = dict.__getitem__
+
+
+def test_membership():
+    index = GenePrefixIndex(SYMBOLS + ["TP53"])
+    assert len(index) == len(SYMBOLS)
+    assert "TP53" in index
+    assert "TP5" not in index
+    assert "ZZZ" not in index
+    assert "" not in GenePrefixIndex([])
+
+
+def test_complete():
+    index = GenePrefixIndex(SYMBOLS)
+    assert index.complete("TP5") == ["TP53", "TP53BP1"]
+    assert index.complete("TP", n=2) == ["TP53", "TP53BP1"]
+    assert index.complete("BRCA3") == []
+    assert index.complete("ZZ") == []
+
+
+def test_suggest():
+    index = GenePrefixIndex(SYMBOLS)
+    assert index.suggest("BRC") == ["BRCA1", "BRCA2"]
+    # no completions: similar symbols
+    assert "EGFR" in index.suggest("EGRF")
+    assert index.suggest("XYZ123") == []
+
+
+@pytest.fixture
+def database(request, monkeypatch):
+    """
+    Database whose gene query fails once, and then returns the genes.
+    """
+    calls = []
+
+    def stream(query, fetch_size=None, driver=None):
+        calls.append(query)
+        if len(calls) == 1:
+            raise neo4j.exceptions.ServiceUnavailable("connection refused")
+        return iter([{"id": f"hgnc:{symbol}"} for symbol in SYMBOLS])
+
+    monkeypatch.setattr(gene_index, "_stream_neo4j_query", stream)
+    monkeypatch.setattr(
+        gene_index,
+        "ss",
+        # one database per test, since the indices are cached across tests
+        State(db_name=request.node.name, neodriver=None),
+    )
+    return calls
+
+
+def test_failed_load_is_not_cached(database):
+    assert _gene_index() is None
+    index = _gene_index()
+    assert "BRCA1" in index
+    assert _gene_index() is index
+    assert len(database) == 2
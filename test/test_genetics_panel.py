@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("biochatter")
+
+from components.panels.genetics import parse_gene_list  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "text, genes",
+    [
+        ("TP53 EGFR", ["TP53", "EGFR"]),
+        ("tp53,egfr;\nKRAS\tmyc", ["TP53", "EGFR", "KRAS", "MYC"]),
+        ("TP53, tp53\nEGFR TP53", ["TP53", "EGFR"]),
+        (" ,;\n", []),
+        ("", []),
+    ],
+)
+def test_parse_gene_list(text, genes):
+    assert parse_gene_list(text) == genes
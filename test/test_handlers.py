@@ -0,0 +1,214 @@
+import re
+
+import pytest
+
+pytest.importorskip("biochatter")
+
+from components import handlers  # noqa: E402
+from components.constants import (  # noqa: E402
+    GENE_CNA_QUERY,
+    GENE_QUERY,
+    PATIENT_CNA_PAGE_QUERY,
+    PATIENT_SAMPLES_QUERY,
+    PATIENT_VARIANT_PAGE_QUERY,
+)
+from components.handlers import (  # noqa: E402
+    CN_COLUMNS,
+    _alteration_table,
+    _query_gene_data,
+    _query_gene_list,
+    _query_patient_page,
+    _query_patient_summary,
+    _records_frame,
+)
+
+
+def cna(alteration_id, sample_ids, **values):
+    return {
+        **{column: None for column in CN_COLUMNS},
+        "alteration_id": alteration_id,
+        "sample_ids": sample_ids,
+        **values,
+    }
+
+
+def test_records_frame_keeps_column_order():
+    records = [{"gene": "TP53", "n": 2}, {"chr": "17", "gene": "EGFR"}]
+    df = _records_frame(records, ["chr", "gene", "n", "clnsig"])
+    assert list(df.columns) == ["chr", "gene", "n", "clnsig"]
+    assert df["gene"].tolist() == ["TP53", "EGFR"]
+    assert df["clnsig"].isna().all()
+    assert list(_records_frame(records).columns) == ["gene", "n", "chr"]
+
+
+def test_empty_records_frame():
+    df = _records_frame([], ["chr", "gene", "n"])
+    assert df.shape == (0, 3)
+
+
+def test_alteration_table_joins_sample_ids():
+    records = [
+        cna("cna1", ["S1", "S2"], n_major=2),
+        cna("cna2", [3], n_major=1, extra="ignored"),
+    ]
+    df = _alteration_table(records, CN_COLUMNS)
+    assert list(df.columns) == CN_COLUMNS
+    assert df["sample_ids"].tolist() == ["S1,S2", "3"]
+    assert df["n_major"].tolist() == [2, 1]
+
+
+def test_empty_alteration_table():
+    df = _alteration_table([], ["gene", *CN_COLUMNS])
+    assert list(df.columns) == ["gene", *CN_COLUMNS]
+    assert df.empty
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """
+    Replace the query stream with one returning a record per query, and
+    record the queries and their parameters.
+    """
+    queries = []
+
+    def stream(query, job=None, **params):
+        queries.append((query, params))
+        if query == GENE_QUERY:
+            if params["gene_id"] == "hgnc:NOPE":
+                return iter([])
+            return iter([{"g": {"id": params["gene_id"]}}])
+        if query == GENE_CNA_QUERY:
+            return iter([cna("cna1", ["S1"])])
+        return iter([{"alteration_id": "var1"}])
+
+    monkeypatch.setattr(handlers, "_stream_neo4j_query", stream)
+    return queries
+
+
+def test_query_gene_data(queries):
+    gene, cnas, variants = _query_gene_data("TP53")
+    assert gene == {"id": "hgnc:TP53"}
+    assert [r["alteration_id"] for r in cnas] == ["cna1"]
+    assert [r["alteration_id"] for r in variants] == ["var1"]
+    # one query each for the gene, its copy number alterations and variants
+    assert len(queries) == 3
+    assert {q for q, _ in queries} >= {GENE_QUERY, GENE_CNA_QUERY}
+    for query, params in queries:
+        assert "{variant_filter}" not in query
+        assert params == {"gene_id": "hgnc:TP53", "gene_ids": ["hgnc:TP53"]}
+
+
+def test_query_missing_gene(queries):
+    gene, _, _ = _query_gene_data("NOPE")
+    assert gene is None
+
+
+def test_query_gene_list_in_chunks(queries, monkeypatch):
+    monkeypatch.setattr(handlers, "GENE_LIST_CHUNK_SIZE", 2)
+    genes = ["TP53", "EGFR", "KRAS", "MYC", "BRCA1"]
+    cnas, variants = _query_gene_list(
+        genes, filters=(("clnsig", ("Pathogenic",)),)
+    )
+    # one query per chunk and kind of alteration
+    assert len(cnas) == len(variants) == 3
+    chunks = [
+        params["gene_ids"]
+        for query, params in queries
+        if query == GENE_CNA_QUERY
+    ]
+    assert sorted(chunks) == [
+        ["hgnc:BRCA1"],
+        ["hgnc:KRAS", "hgnc:MYC"],
+        ["hgnc:TP53", "hgnc:EGFR"],
+    ]
+    for query, params in queries:
+        if query != GENE_CNA_QUERY:
+            assert "$filter_clnsig" in query
+            assert params["filter_clnsig"] == ["Pathogenic"]
+
+
+def sample_of_patient(sample_id, patient_id):
+    """
+    Evaluate the sample condition of `PATIENT_SAMPLES_QUERY`, with the
+    delimiters of the query.
+    """
+    delimiters = re.search(r"IN \[(.*?)\]", PATIENT_SAMPLES_QUERY).group(1)
+    delimiters = re.findall(r"'(.)'", delimiters)
+    return sample_id.startswith(patient_id) and (
+        sample_id == patient_id
+        or sample_id[len(patient_id) : len(patient_id) + 1] in delimiters
+    )
+
+
+@pytest.mark.parametrize(
+    "sample_id, matched",
+    [
+        ("P1", True),
+        ("P1-T1", True),
+        ("P1_N", True),
+        ("P1.2", True),
+        ("P10", False),
+        ("P10-T1", False),
+        ("XP1", False),
+    ],
+)
+def test_samples_of_patient(sample_id, matched):
+    assert sample_of_patient(sample_id, "P1") == matched
+
+
+@pytest.fixture
+def patient(monkeypatch):
+    """
+    Replace the query stream with one for a patient with two samples, and
+    record the queries and their parameters.
+    """
+    queries = []
+
+    def stream(query, job=None, **params):
+        queries.append((query, params))
+        if query == PATIENT_SAMPLES_QUERY:
+            samples = ["P1-T", "P1-N", "P10-T"]
+            return iter(
+                {"id": s}
+                for s in samples
+                if sample_of_patient(s, params["patient_id"])
+            )
+        return iter([{"chr": "17", "gene": "TP53", "n": 1}])
+
+    monkeypatch.setattr(handlers, "_stream_neo4j_query", stream)
+    return queries
+
+
+def test_query_patient_summary(patient):
+    sample_ids, cna_counts, variant_counts = _query_patient_summary("P1")
+    assert sample_ids == ["P1-T", "P1-N"]
+    assert len(cna_counts) == len(variant_counts) == 1
+    for _, params in patient[1:]:
+        assert params == {"sample_ids": ["P1-T", "P1-N"]}
+
+
+def test_unknown_patient_is_not_counted(patient):
+    assert _query_patient_summary("P2") == ([], [], [])
+    assert len(patient) == 1
+
+
+def test_query_patient_page(patient):
+    _query_patient_page(
+        "variant", ("P1-T",), (("gene", "TP53"), ("chr", None)), 2, 50
+    )
+    _query_patient_page("cna", ("P1-T",), (), 0, 25)
+    (variant_query, variant_params), (cna_query, cna_params) = patient
+    assert variant_query == PATIENT_VARIANT_PAGE_QUERY
+    assert variant_params == {
+        "fetch_size": 50,
+        "timeout": None,
+        "sample_ids": ["P1-T"],
+        "chr": None,
+        "gene_id": "hgnc:TP53",
+        "clnsig": None,
+        "skip": 100,
+        "limit": 50,
+    }
+    assert cna_query == PATIENT_CNA_PAGE_QUERY
+    assert cna_params["gene_id"] is None
+    assert (cna_params["skip"], cna_params["limit"]) == (0, 25)
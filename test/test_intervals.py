@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from components.intervals import GeneIntervalIndex, parse_region
+
+
+@pytest.mark.parametrize(
+    "text, region",
+    [
+        ("chr17:7661779-7687538", ("17", 7661779, 7687538)),
+        ("17:7,661,779-7,687,538", ("17", 7661779, 7687538)),
+        ("chr17:7.6-7.7 Mb", ("17", 7600000, 7700000)),
+        ("chrX:100-200 kb", ("X", 100000, 200000)),
+        ("chrM:1-100", ("MT", 1, 100)),
+        ("Chr1 : 5 kb - 1 mb", ("1", 5000, 1000000)),
+    ],
+)
+def test_parse_region(text, region):
+    assert parse_region(text) == region
+
+
+@pytest.mark.parametrize(
+    "text", ["TP53", "chr17:200-100", "chr17:7.6.1-8", "chr99x:1-2", ""]
+)
+def test_parse_invalid_region(text):
+    assert parse_region(text) is None
+
+
+def test_overlapping_matches_brute_force():
+    rng = np.random.default_rng(0)
+    genes = []
+    for i in range(300):
+        start = int(rng.integers(0, 1_000_000))
+        length = int(rng.integers(1, 50_000))
+        chromosome = rng.choice(["chr1", "1", "2"])
+        genes.append((f"G{i}", chromosome, start, start + length))
+    index = GeneIntervalIndex(genes)
+    assert len(index) == len(genes)
+
+    for _ in range(50):
+        start = int(rng.integers(0, 1_000_000))
+        end = start + int(rng.integers(0, 100_000))
+        expected = sorted(
+            (g_start, name)
+            for name, chromosome, g_start, g_end in genes
+            if chromosome in ("chr1", "1") and g_start <= end and g_end >= start
+        )
+        hits = index.overlapping("chr1", start, end)
+        assert sorted((s, name) for name, s, _ in hits) == expected
+
+
+def test_overlapping_unknown_chromosome():
+    index = GeneIntervalIndex([("TP53", "17", 7661779, 7687538)])
+    assert index.overlapping("Y", 0, 10**9) == []
+    assert index.overlapping("17", 7687538, 7700000) == [
+        ("TP53", 7661779, 7687538)
+    ]
@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+
+import pytest
+
+from components import jobs
+from components.jobs import QueryJob, cancel_job, discard_job
+
+
+class FakeResult(list):
+    def consume(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def run(self, query, **params):
+        self.driver.queries.append((query.split()[0], params))
+        if query.startswith("SHOW TRANSACTIONS"):
+            return FakeResult(
+                {"transactionId": t}
+                for t, job in self.driver.transactions
+                if job == params["job"]
+            )
+        return FakeResult()
+
+
+class FakeDriver:
+    current_db = "neo4j"
+
+    def __init__(self, transactions=()):
+        self.transactions = list(transactions)
+        self.queries = []
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+
+@pytest.fixture
+def state(monkeypatch):
+    state = {}
+    monkeypatch.setattr(jobs, "ss", state)
+    return state
+
+
+def job_with(future, driver=None):
+    job = QueryJob("query", (), driver, 30)
+    job.future = future
+    return job
+
+
+def running():
+    future = Future()
+    future.set_running_or_notify_cancel()
+    return future
+
+
+def test_query_metadata_and_timeout():
+    job = QueryJob("query", (), None, 30)
+    query = job.query("MATCH (n) RETURN n")
+    assert query.metadata == {"job": job.id}
+    assert query.timeout == 30
+    assert job.query("MATCH (n) RETURN n", timeout=5).timeout == 5
+    # no timeout
+    assert job.query("MATCH (n) RETURN n", timeout=0).timeout is None
+
+
+def test_cancel_pending_job(state):
+    driver = FakeDriver()
+    state["kg"] = job = job_with(Future(), driver)
+    cancel_job("kg")
+    assert job.cancelled
+    assert job.future.cancelled()
+    # nothing to terminate on the server
+    assert driver.queries == []
+
+
+def test_cancel_running_job_terminates_its_transactions(state):
+    driver = FakeDriver()
+    state["kg"] = job = job_with(running(), driver)
+    driver.transactions = [
+        ("tx-1", job.id),
+        ("tx-2", "other job"),
+        ("tx-3", job.id),
+    ]
+    cancel_job("kg")
+    assert job.cancelled
+    assert driver.queries[-1] == ("TERMINATE", {"ids": ["tx-1", "tx-3"]})
+
+
+def test_cancel_running_job_without_driver(state):
+    state["kg"] = job = job_with(running())
+    cancel_job("kg")
+    assert job.cancelled
+
+
+def test_finished_job_is_not_cancelled(state):
+    future = Future()
+    future.set_result([])
+    state["kg"] = job = job_with(future, FakeDriver())
+    cancel_job("kg")
+    assert not job.cancelled
+    # missing jobs are ignored
+    cancel_job("other")
+
+
+def test_discard_job(state):
+    state["kg"] = job = job_with(Future(), FakeDriver())
+    discard_job("kg")
+    assert job.cancelled
+    assert "kg" not in state
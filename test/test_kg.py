@@ -0,0 +1,238 @@
+import re
+from types import SimpleNamespace
+
+import neo4j
+import pytest
+
+from components import kg
+from components.jobs import QueryJob
+from components.kg import (
+    _configured_graphs,
+    _count_neo4j_rows,
+    _explain_neo4j_query,
+    _limit_query,
+    _parse_graph_uri,
+    _plan_operators,
+    _register_graph,
+    _registered_graphs,
+    _unregister_graph,
+)
+
+ROWS = [{"name": f"gene {i}", "count(v)": i} for i in range(7)]
+
+
+class FakeSession:
+    """
+    Session returning `ROWS` for any query, except that, like Neo4j, it
+    rejects subqueries returning expressions without alias.
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def run(self, query, **params):
+        text = query.text
+        self.queries.append(text)
+        if text.startswith("CALL {"):
+            inner = text[text.index("{") + 1 : text.rindex("}")]
+            returned = inner[inner.upper().rindex("RETURN") + 6 :]
+            if any(
+                " AS " not in item.upper() and ("." in item or "(" in item)
+                for item in returned.split(",")
+            ):
+                raise neo4j.exceptions.Neo4jError.hydrate(
+                    message="Expression in CALL { RETURN ... } must be "
+                    "aliased (use AS)",
+                    code="Neo.ClientError.Statement.SyntaxError",
+                )
+            return iter([{"n": min(len(ROWS), params["row_cap"])}])
+        return iter(ROWS)
+
+
+class FakeDriver:
+    current_db = "neo4j"
+
+    def __init__(self):
+        self.queries = []
+
+    def session(self, **kwargs):
+        return FakeSession(self.queries)
+
+
+def count(query, row_cap):
+    driver = FakeDriver()
+    job = QueryJob("count", (), driver, 30)
+    return _count_neo4j_rows(query, row_cap, job=job), driver.queries
+
+
+def test_count_aliased_return_in_subquery():
+    n, queries = count("MATCH (g:Gene) RETURN g.name AS name", 100)
+    assert n == len(ROWS)
+    assert len(queries) == 1
+
+
+def test_count_unaliased_return_falls_back_to_streaming():
+    query = "MATCH (g:Gene)<-[v]-() RETURN g.name, count(v)"
+    n, queries = count(query, 100)
+    assert n == len(ROWS)
+    assert queries[-1] == query
+
+
+def test_count_unaliased_return_is_capped():
+    n, _ = count("MATCH (g:Gene)<-[v]-() RETURN g.name, count(v)", 3)
+    assert n == 3
+
+
+def test_limit_query():
+    assert _limit_query("MATCH (n) RETURN n;", 10).endswith("LIMIT 10")
+    assert _limit_query("MATCH (n) RETURN n LIMIT 5", 10) == (
+        "MATCH (n) RETURN n LIMIT 5"
+    )
+    union = "MATCH (a) RETURN a UNION MATCH (b) RETURN b"
+    assert _limit_query(union, 10) == union
+    assert not re.search(r"LIMIT", _limit_query("CREATE (n)", 10))
+
+
+def operator(name, rows, *children):
+    return {
+        "operatorType": f"{name}@neo4j",
+        "args": {"EstimatedRows": rows},
+        "children": list(children),
+    }
+
+
+class PlanDriver(FakeDriver):
+    """
+    Driver returning an execution plan for `EXPLAIN`, or failing to plan.
+    """
+
+    def __init__(self, plan):
+        super().__init__()
+        self.plan = plan
+
+    def session(self, **kwargs):
+        driver = self
+
+        class Session(FakeSession):
+            def run(self, query, **params):
+                self.queries.append(query)
+                if driver.plan is None:
+                    raise neo4j.exceptions.Neo4jError.hydrate(
+                        message="Invalid input",
+                        code="Neo.ClientError.Statement.SyntaxError",
+                    )
+                summary = SimpleNamespace(plan=driver.plan)
+                return SimpleNamespace(consume=lambda: summary)
+
+        return Session(self.queries)
+
+
+def test_plan_operators():
+    plan = operator(
+        "ProduceResults",
+        10,
+        operator("Filter", 10, operator("Expand(All)", 50)),
+    )
+    assert list(_plan_operators(plan)) == [
+        ("ProduceResults", 10),
+        ("Filter", 10),
+        ("Expand(All)", 50),
+    ]
+
+
+@pytest.fixture
+def max_rows(monkeypatch):
+    monkeypatch.setattr(kg, "KG_MAX_ESTIMATED_ROWS", 1000)
+
+
+def test_cheap_query_has_no_warnings(max_rows):
+    driver = PlanDriver(
+        operator("ProduceResults", 10, operator("NodeByLabelScan", 1000))
+    )
+    cost = _explain_neo4j_query("MATCH (g:Gene) RETURN g;", driver)
+    assert cost == {
+        "estimated_rows": 1000,
+        "operators": ["ProduceResults", "NodeByLabelScan"],
+        "warnings": [],
+    }
+    assert driver.queries == ["EXPLAIN MATCH (g:Gene) RETURN g"]
+
+
+def test_expensive_operators_are_named(max_rows):
+    plan = operator(
+        "ProduceResults",
+        5000,
+        operator(
+            "CartesianProduct",
+            5000,
+            operator("NodeByLabelScan", 100),
+            operator("AllNodesScan", 2000),
+        ),
+    )
+    (warning,) = _explain_neo4j_query("MATCH ...", PlanDriver(plan))[
+        "warnings"
+    ]
+    assert "5,000 intermediate rows (limit: 1,000)" in warning
+    assert warning.endswith("caused by AllNodesScan, CartesianProduct.")
+
+
+def test_unplanned_query_is_not_estimated(max_rows):
+    assert _explain_neo4j_query("MATCH", PlanDriver(None)) is None
+
+
+def test_parse_graph_uri(monkeypatch):
+    monkeypatch.setenv("NEO4J_USER", "reader")
+    monkeypatch.setenv("NEO4J_PASSWORD", "secret")
+    assert _parse_graph_uri("bolt://ada:pw@graph.org:7688/genes") == {
+        "db_uri": "bolt://graph.org:7688",
+        "db_name": "genes",
+        "db_user": "ada",
+        "db_passwd": "pw",
+    }
+    assert _parse_graph_uri("localhost") == {
+        "db_uri": "bolt://localhost:7687",
+        "db_name": "neo4j",
+        "db_user": "reader",
+        "db_passwd": "secret",
+    }
+
+
+@pytest.fixture
+def graphs(monkeypatch):
+    monkeypatch.setattr(
+        kg,
+        "KG_GRAPHS",
+        "genes=bolt://genes:7687, bad=bolt://host:port,"
+        "genes=bolt://other:7687,drugs=neo4j://drugs/chembl,invalid",
+    )
+    monkeypatch.setattr(kg, "ss", {})
+    _configured_graphs.cache_clear()
+    yield
+    _configured_graphs.cache_clear()
+
+
+def test_configured_graphs(graphs):
+    configured = _configured_graphs()
+    assert list(configured) == ["genes", "drugs"]
+    assert configured["genes"]["db_uri"] == "bolt://genes:7687"
+    assert configured["drugs"]["db_uri"] == "neo4j://drugs:7687"
+    assert configured["drugs"]["db_name"] == "chembl"
+
+
+def test_registered_graphs(graphs):
+    _register_graph("variants", "bolt://variants:7687")
+    _register_graph("genes", "bolt://local:7687")
+    registered = _registered_graphs()
+    assert list(registered) == ["genes", "drugs", "variants"]
+    # graphs registered in the panel take precedence
+    assert registered["genes"]["db_uri"] == "bolt://local:7687"
+    with pytest.raises(ValueError):
+        _register_graph("bad", "bolt://host:port")
+    _unregister_graph("variants")
+    assert "variants" not in _registered_graphs()
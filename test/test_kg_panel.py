@@ -0,0 +1,124 @@
+import pytest
+
+pytest.importorskip("biochatter")
+
+from components.panels import kg as kg_panel  # noqa: E402
+
+ENTITIES = {
+    "Gene": {"properties": {"name": "string"}},
+    "Protein": {"properties": {"length": "integer"}},
+    "Disease": {"properties": {"name": "string"}},
+}
+RELATIONSHIPS = {
+    "GeneToProteinAssociation": {
+        "source": "Gene",
+        "target": "Protein",
+        "label_as_edge": "ENCODES",
+    },
+    "GeneToDiseaseAssociation": {
+        "source": "Gene",
+        "target": "Disease",
+        "label_as_edge": "CAUSES",
+    },
+}
+
+
+class State(dict):
+    """
+    Stand-in for the session state, with attribute access to its keys.
+    """
+
+    __getattr__ = dict.__getitem__
+
+
+class FakePromptEngine:
+    """
+    Prompt engine counting how often the schema is processed.
+    """
+
+    built = 0
+
+    def __init__(self, schema_config_or_info_dict, model_name):
+        FakePromptEngine.built += 1
+        self.entities = dict(ENTITIES)
+        self.relationships = dict(RELATIONSHIPS)
+        self.question = "previous question"
+        self.selected_entities = ["Disease"]
+        self.selected_relationships = []
+        self.selected_relationship_labels = {}
+        self.selected_properties = {}
+        self.rel_directions = {}
+
+
+@pytest.fixture
+def state(request, monkeypatch):
+    state = State(
+        conversation=object(),
+        schema_dict={"Gene": {}},
+        # one schema per test, since the engines are cached across tests
+        schema_fingerprint=request.node.name,
+    )
+    monkeypatch.setattr(kg_panel, "ss", state)
+    monkeypatch.setattr(kg_panel, "BioCypherPromptEngine", FakePromptEngine)
+    FakePromptEngine.built = 0
+    return state
+
+
+def test_schema_is_processed_once(state):
+    first = kg_panel.create_prompt_engine()
+    second = kg_panel.create_prompt_engine()
+    assert FakePromptEngine.built == 1
+    assert first is not second
+    assert first.entities == ENTITIES
+
+
+def test_engine_has_fresh_question_state(state):
+    engine = kg_panel.create_prompt_engine()
+    engine.selected_entities.append("Gene")
+    engine = kg_panel.create_prompt_engine()
+    assert engine.question == ""
+    assert engine.selected_entities == []
+    assert engine.conversation_factory() is state.conversation
+
+
+def test_engine_sees_schema_relevant_to_question(state):
+    engine = kg_panel.create_prompt_engine("Which proteins are encoded?")
+    assert set(engine.entities) == {"Protein", "Gene"}
+    assert set(engine.relationships) == {"GeneToProteinAssociation"}
+    # the cached engine keeps the full schema
+    _, cached = kg_panel.cached_prompt_engine()
+    assert cached.entities == ENTITIES
+
+
+def graph_result(graph, records, error=None, seconds=1.25):
+    return {
+        "graph": graph,
+        "records": records,
+        "error": error,
+        "seconds": seconds,
+    }
+
+
+def test_merge_results_adds_provenance():
+    results = [
+        graph_result("genes", [{"name": "TP53"}, {"name": "EGFR"}]),
+        graph_result("drugs", None, error="unreachable"),
+        graph_result("variants", [{"name": "KRAS"}]),
+    ]
+    assert kg_panel.merge_results(results) == [
+        {"graph": "genes", "name": "TP53"},
+        {"graph": "genes", "name": "EGFR"},
+        {"graph": "variants", "name": "KRAS"},
+    ]
+
+
+def test_graph_summary():
+    assert kg_panel.graph_summary(graph_result("genes", [{}, {}])) == (
+        "genes: 2 rows in 1.2 s"
+    )
+    assert kg_panel.graph_summary(graph_result("genes", None)) == (
+        "genes: not run in 1.2 s"
+    )
+    assert kg_panel.graph_summary(
+        graph_result("genes", None, error="unreachable")
+    ) == ("genes: failed in 1.2 s")
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from components import postgres
+from components.jobs import QueryJob
+
+# connection string of a test database, e.g., "postgresql://localhost/test";
+# libpq also reads the connection from the PG* variables (PGHOST, ...)
+DSN = os.getenv("PG_DSN", "")
+
+requires_postgres = pytest.mark.skipif(
+    postgres.psycopg is None or not (DSN or os.getenv("PGHOST")),
+    reason="no PostgreSQL database configured (PG_DSN or PGHOST)",
+)
+
+ROWS_QUERY = "SELECT i FROM generate_series(1, 25) AS i ORDER BY i"
+
+
+@pytest.fixture
+def pool():
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+
+    with ConnectionPool(
+        DSN, min_size=1, max_size=2, kwargs={"row_factory": dict_row}
+    ) as pool:
+        postgres.ss.pgpool = pool
+        yield pool
+        del postgres.ss.pgpool
+
+
+def values(records):
+    return [record["i"] for record in records]
+
+
+@pytest.mark.parametrize("page_size", [0, -5])
+def test_page_without_rows(page_size):
+    # no connection needed
+    assert postgres._fetch_postgres_page(ROWS_QUERY, 1, page_size, 100) == []
+
+
+@requires_postgres
+def test_pages(pool):
+    assert values(postgres._fetch_postgres_page(ROWS_QUERY, 0, 10, 100)) == (
+        list(range(1, 11))
+    )
+    assert values(postgres._fetch_postgres_page(ROWS_QUERY, 2, 10, 100)) == (
+        list(range(21, 26))
+    )
+
+
+@requires_postgres
+def test_pages_stop_at_row_cap(pool):
+    assert values(postgres._fetch_postgres_page(ROWS_QUERY, 1, 10, 15)) == (
+        list(range(11, 16))
+    )
+    assert postgres._fetch_postgres_page(ROWS_QUERY, 2, 10, 15) == []
+
+
+@requires_postgres
+def test_count_and_last_page(pool):
+    records, n_rows = postgres._query_postgres_page(ROWS_QUERY, 9, 10, 100)
+    assert n_rows == 25
+    assert values(records) == list(range(21, 26))
+    assert postgres._count_postgres_rows(ROWS_QUERY, 20) == 20
+
+
+@requires_postgres
+def test_stream_counts_rows(pool):
+    job = QueryJob("stream", (), None, 30)
+    records = postgres._stream_postgres_query(
+        pool, ROWS_QUERY, max_rows=12, fetch_size=5, job=job, timeout=30
+    )
+    assert values(records) == list(range(1, 13))
+    assert job.rows == 12
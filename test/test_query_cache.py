@@ -0,0 +1,42 @@
+import pytest
+
+from components import query_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        query_cache, "QUERY_CACHE_PATH", str(tmp_path / "queries.sqlite")
+    )
+
+
+def test_rephrased_question_hits_the_cache():
+    query_cache.cache_query(
+        "How many genes are there?", "abc", "Neo4j", "MATCH (g:Gene) ..."
+    )
+    for question in [
+        "how many genes are there",
+        "Please tell me how many genes are there?",
+    ]:
+        cached = query_cache.get_cached_query(question, "abc", "Neo4j")
+        assert cached == "MATCH (g:Gene) ..."
+
+
+def test_cache_is_per_schema_and_language():
+    query_cache.cache_query("Count genes", "abc", "Neo4j", "MATCH ...")
+    assert query_cache.get_cached_query("Count genes", "def", "Neo4j") is None
+    assert query_cache.get_cached_query("Count genes", "abc", "SQL") is None
+
+
+def test_evict_query():
+    query_cache.cache_query("Count genes", "abc", "Neo4j", "MATCH ...")
+    query_cache.evict_query("count genes", "abc", "Neo4j")
+    assert query_cache.get_cached_query("Count genes", "abc", "Neo4j") is None
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    monkeypatch.setattr(query_cache, "KG_QUERY_CACHE_SIZE", 2)
+    for question in ["one", "two", "three"]:
+        query_cache.cache_query(question, "abc", "Neo4j", question.upper())
+    assert query_cache.get_cached_query("one", "abc", "Neo4j") is None
+    assert query_cache.get_cached_query("three", "abc", "Neo4j") == "THREE"
@@ -0,0 +1,90 @@
+from components.schema import (
+    format_projection,
+    project_schema,
+    prune_projection,
+)
+
+ENTITIES = {
+    "Gene": {"properties": {"name": "string", "chromosome": "string"}},
+    "Protein": {"properties": {"length": "integer"}},
+    "Disease": {"properties": {"name": "string"}},
+    "Drug": {"properties": ["name"]},
+    "Pathway": {},
+}
+RELATIONSHIPS = {
+    "GeneToProteinAssociation": {
+        "source": "Gene",
+        "target": "Protein",
+        "label_as_edge": "ENCODES",
+    },
+    "GeneToDiseaseAssociation": {
+        "source": ["Gene"],
+        "target": ["Disease"],
+        "label_as_edge": "ASSOCIATED_WITH",
+        "properties": {"score": "double"},
+    },
+    "DrugTargetsProtein": {
+        "source": "Drug",
+        "target": "Protein",
+        "label_as_edge": "TARGETS",
+    },
+    "ProteinInPathway": {
+        "source": "Protein",
+        "target": "Pathway",
+        "label_as_edge": "MEMBER_OF",
+    },
+}
+
+
+def projection():
+    return project_schema(ENTITIES, RELATIONSHIPS)
+
+
+def test_project_schema():
+    p = projection()
+    assert p["nodes"]["Gene"] == {"name": "str", "chromosome": "str"}
+    assert p["nodes"]["Drug"] == {"name": ""}
+    assert p["nodes"]["Pathway"] == {}
+    assert p["edges"]["GeneToDiseaseAssociation"] == {
+        "label": "ASSOCIATED_WITH",
+        "source": ["Gene"],
+        "target": ["Disease"],
+        "properties": {"score": "float"},
+    }
+    assert p["adjacency"]["Protein"] == {"Gene", "Drug", "Pathway"}
+
+
+def test_prune_keeps_mentioned_types_and_neighbours():
+    pruned = prune_projection(projection(), "Which drugs are there?")
+    assert set(pruned["nodes"]) == {"Drug", "Protein"}
+    assert set(pruned["edges"]) == {"DrugTargetsProtein"}
+
+
+def test_prune_by_property_and_edge_label():
+    pruned = prune_projection(projection(), "Show the highest scores")
+    assert "GeneToDiseaseAssociation" in pruned["edges"]
+    assert set(pruned["nodes"]) == {"Gene", "Disease", "Protein"}
+    pruned = prune_projection(projection(), "What targets EGFR?")
+    assert "DrugTargetsProtein" in pruned["edges"]
+
+
+def test_node_name_in_edge_name_does_not_select_the_edge():
+    pruned = prune_projection(projection(), "List the pathways")
+    assert set(pruned["nodes"]) == {"Pathway", "Protein"}
+    assert set(pruned["edges"]) == {"ProteinInPathway"}
+
+
+def test_nothing_mentioned_keeps_full_schema():
+    p = projection()
+    assert prune_projection(p, "Hello?") is p
+
+
+def test_format_projection():
+    p = project_schema(
+        {"Gene": ENTITIES["Gene"], "Disease": ENTITIES["Disease"]},
+        {"GeneToDiseaseAssociation": RELATIONSHIPS["GeneToDiseaseAssociation"]},
+    )
+    assert format_projection(p) == (
+        "Nodes: Gene{name:str,chromosome:str}; Disease{name:str}\n"
+        "Edges: (Gene)-[ASSOCIATED_WITH{score:float}]->(Disease)"
+    )
@@ -0,0 +1,81 @@
+import re
+
+from components.serialize import compact_records, serialize_records
+
+
+def parse_compact(text):
+    """
+    Read the records of a compact serialisation back, with references to
+    defined objects left as `@<n>` and scalars as strings.
+    """
+    lines = text.split("\n")
+    n = int(lines[0].split(" ", 1)[0])
+    columns = lines[1].split(" | ")
+    records = []
+    for line in lines[2 : 2 + n]:
+        cells = re.split(r"(?<!\\) \| ", line)
+        records.append(
+            {
+                column: unescape(cell)
+                for column, cell in zip(columns, cells)
+                if cell != ""
+            }
+        )
+    definitions = dict(
+        line.split(" = ", 1) for line in lines[2 + n :] if line
+    )
+    return records, definitions
+
+
+def unescape(cell):
+    return re.sub(
+        r"\\(.)",
+        lambda m: "\n" if m.group(1) == "n" else m.group(1),
+        cell,
+    )
+
+
+def test_round_trip_of_scalars():
+    records = [
+        {"project.title": "Parser", "project.size": 3, "done": True},
+        {"project.title": "a | b", "project.size": None, "done": False},
+        {"project.title": "line\nbreak \\ slash", "extra": 1.5},
+    ]
+    parsed, definitions = parse_compact(compact_records(records))
+    assert definitions == {}
+    assert parsed == [
+        {"project.title": "Parser", "project.size": "3", "done": "true"},
+        {"project.title": "a | b", "done": "false"},
+        {"project.title": "line\nbreak \\ slash", "extra": "1.5"},
+    ]
+
+
+def test_repeated_objects_are_defined_once():
+    person = {"name": "Ada", "role": "lead"}
+    records = [
+        {"person": person, "project": {"title": "A"}},
+        {"person": person, "project": {"title": "B"}},
+    ]
+    parsed, definitions = parse_compact(compact_records(records))
+    assert [r["person"] for r in parsed] == ["@1", "@1"]
+    assert definitions == {"@1": "{name: Ada, role: lead}"}
+    assert [r["project"] for r in parsed] == ["{title: A}", "{title: B}"]
+
+
+def test_nulls_are_dropped_from_nested_values():
+    text = compact_records([{"tags": ["a", None, "b"], "meta": {"x": None}}])
+    parsed, _ = parse_compact(text)
+    assert parsed == [{"tags": "[a; b]", "meta": "{}"}]
+
+
+def test_compact_is_smaller_than_json():
+    records = [
+        {
+            "person.name": "Ada",
+            "project.title": f"Project {i}",
+            "project.status": "In Progress",
+        }
+        for i in range(20)
+    ]
+    _, stats = serialize_records(records)
+    assert stats["compact_tokens"] < stats["json_tokens"]
@@ -0,0 +1,124 @@
+import re
+
+import pandas as pd
+import pytest
+
+from components.variant_filters import (
+    FILTERS,
+    _apply_variant_filters,
+    _cypher_filter,
+    variant_filters,
+)
+
+# variant properties as stored in the graph, and their table columns
+VARIANTS = [
+    {
+        "CADD_phred": "25.3",
+        "gnomAD_genome_max": "0.0001",
+        "CLNSIG": "Pathogenic",
+        "ExonicFunc.MANE": "stopgain",
+    },
+    {
+        "CADD_phred": "12",
+        "gnomAD_genome_max": None,
+        "CLNSIG": "Pathogenic/Likely_pathogenic",
+        "ExonicFunc.MANE": "nonsynonymous_SNV",
+    },
+    {
+        "CADD_phred": ".",
+        "gnomAD_genome_max": "0.2",
+        "CLNSIG": None,
+        "ExonicFunc.MANE": None,
+    },
+    {
+        "CADD_phred": None,
+        "gnomAD_genome_max": ".",
+        "CLNSIG": "Benign",
+        "ExonicFunc.MANE": "synonymous_SNV",
+    },
+]
+
+PROPERTIES = {
+    "cadd_min": "CADD_phred",
+    "gnomad_max": "gnomAD_genome_max",
+    "clnsig": "CLNSIG",
+    "ex_func": "ExonicFunc.MANE",
+}
+
+
+def to_float(value):
+    """Cypher `toFloat`: null for values that are not numbers."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def cypher_matches(variant, filters):
+    """
+    Evaluate the cypher predicates of the filters on a variant, with the
+    cypher semantics of null (a comparison with null does not match).
+    """
+    for name, value in filters:
+        prop = variant[PROPERTIES[name]]
+        if name == "cadd_min":
+            score = to_float(prop)
+            matched = score is not None and score >= value
+        elif name == "gnomad_max":
+            frequency = to_float(prop)
+            matched = (0.0 if frequency is None else frequency) <= value
+        elif name == "clnsig":
+            matched = prop is not None and any(term in prop for term in value)
+        elif name == "ex_func":
+            matched = prop is not None and prop in value
+        if not matched:
+            return False
+    return True
+
+
+def variant_table():
+    return pd.DataFrame(
+        [
+            {FILTERS[name][0]: v[prop] for name, prop in PROPERTIES.items()}
+            for v in VARIANTS
+        ]
+    )
+
+
+FILTER_CASES = [
+    variant_filters(cadd_min=20),
+    variant_filters(gnomad_max=0.01),
+    variant_filters(clnsig=["Pathogenic"]),
+    variant_filters(clnsig=["Likely_pathogenic", "Benign"]),
+    variant_filters(ex_func=["stopgain", "synonymous_SNV"]),
+    variant_filters(cadd_min=10, gnomad_max=0.05, clnsig=["Pathogenic"]),
+    variant_filters(),
+]
+
+
+@pytest.mark.parametrize("filters", FILTER_CASES)
+def test_table_filter_matches_cypher(filters):
+    expected = [i for i, v in enumerate(VARIANTS) if cypher_matches(v, filters)]
+    filtered = _apply_variant_filters(variant_table(), filters)
+    assert list(filtered.index) == expected
+
+
+@pytest.mark.parametrize("filters", FILTER_CASES)
+def test_cypher_clause(filters):
+    clause, params = _cypher_filter(filters)
+    if not filters:
+        assert (clause, params) == ("", {})
+        return
+    assert clause.startswith("WHERE ")
+    for name, _ in filters:
+        assert FILTERS[name][1] in clause
+    # every parameter of the clause is passed, and nothing else
+    assert set(re.findall(r"\$(\w+)", clause)) == set(params)
+    for name, value in filters:
+        expected = list(value) if isinstance(value, tuple) else value
+        assert params[f"filter_{name}"] == expected
+
+
+def test_inactive_filters_are_omitted():
+    assert variant_filters(cadd_min=None, clnsig=[]) == ()
+    assert variant_filters(clnsig=["Benign"]) == (("clnsig", ("Benign",)),)